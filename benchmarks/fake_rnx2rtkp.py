@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+Stand-in for rnx2rtkp in end-to-end benchmarks. It accepts the arguments used by the
+processor (-k, -o, -ts/-te, -x, -y, obs and nav files) and writes a synthetic solution for
+the day in the name of the obs file (e.g. onrj0061.15o), without reading any input.
+"""
+import os
+import sys
+import pandas as pd
+from synthetic import synthetic_solution, write_pos
+
+OPTIONS_WITH_VALUE = ["-k", "-o", "-x", "-y", "-ti", "-tu"]
+OPTIONS_WITH_TIME = ["-ts", "-te"]
+
+
+def parse_args(args: list) -> dict:
+    parsed = {"files": []}
+    i = 0
+    while i < len(args):
+        if args[i] in OPTIONS_WITH_VALUE:
+            parsed[args[i]] = args[i + 1]
+            i += 2
+        elif args[i] in OPTIONS_WITH_TIME:
+            parsed[args[i]] = pd.Timestamp(f"{args[i + 1]} {args[i + 2]}")
+            i += 3
+        else:
+            parsed["files"].append(args[i])
+            i += 1
+    return parsed
+
+
+def main(args: list) -> int:
+    if "--help" in args or "-?" in args:
+        print("rnx2rtkp (benchmarks/fake_rnx2rtkp.py): synthetic solutions, no processing")
+        return 0
+    parsed = parse_args(args)
+    obs = [f for f in parsed["files"] if f.lower().endswith("o")]
+    if len(obs) == 0:
+        print("error : no obs file", file=sys.stderr)
+        return 1
+    obs = obs[0]
+    nav = [f for f in parsed["files"] if f != obs]
+    name = os.path.basename(obs)
+    day = pd.Timestamp(2000 + int(name[-3:-1]), 1, 1) + pd.Timedelta(days=int(name[4:7]) - 1)
+    df = synthetic_solution(day, start=parsed.get("-ts"), end=parsed.get("-te"))
+    write_pos(parsed["-o"], df, obs, nav[0] if nav else "")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,281 @@
+"""
+Times the stages of a processing run on synthetic data: parse, transform and write of the
+rtklib solutions, IONEX reading, similarity metrics, plot preparation and, optionally, an
+end-to-end run of the processor with benchmarks/fake_rnx2rtkp.py.
+
+    python benchmarks/run_benchmarks.py --days 365 --save-baseline
+    python benchmarks/run_benchmarks.py --days 365
+
+The second command compares every stage with benchmarks/baseline.json and exits with 1
+when one of them is slower than the baseline by more than --tolerance.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import contextlib
+import numpy as np
+import pandas as pd
+
+BENCHMARKS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_FOLDER, "..", "ppp_processor"))
+sys.path.insert(0, os.path.join(BENCHMARKS_FOLDER, "..", "extras"))
+
+from synthetic import (
+    REFERENCE_POSITION,
+    synthetic_solution,
+    write_pos,
+    write_ionex,
+    write_day_archive,
+)
+from pos_reader import read_pos
+from station_frame import StationFrame
+from result_store import PartitionedResultStore
+from ionex import IonexStore, read_ionex
+from pyramid import build_pyramid
+from result_schema import RESULT_COLUMNS
+from results_loader import load_results, clear_cache, POSITION_COLUMNS
+from similarity import SimilarityEngine
+from aggregation import grouped_statistics
+from streaming_stats import norm_summary
+
+STATION = "onrj"
+
+
+def generate(folder: str, days: pd.DatetimeIndex) -> dict:
+    """Writes (or reuses) the .pos and IONEX files of every day."""
+    pos_folder = os.path.join(folder, "pos")
+    ionex_folder = os.path.join(folder, "ionex")
+    os.makedirs(pos_folder, exist_ok=True)
+    os.makedirs(ionex_folder, exist_ok=True)
+    pos_files, ionex_files = [], []
+    for day in days:
+        y2d = day.year % 100
+        pos_file = os.path.join(pos_folder, f"{STATION}{day.day_of_year:03}1.pos")
+        ionex_file = os.path.join(ionex_folder, f"pred{day.day_of_year:03}0.{y2d:02}i")
+        if not os.path.exists(pos_file):
+            write_pos(pos_file, synthetic_solution(day))
+        if not os.path.exists(ionex_file):
+            write_ionex(ionex_file, day)
+        pos_files.append(pos_file)
+        ionex_files.append(ionex_file)
+
+    # Reference for the metrics: another realization of the same days
+    reference = os.path.join(folder, "reference.parquet")
+    if not os.path.exists(reference):
+        frame = StationFrame(*REFERENCE_POSITION)
+        ref = pd.concat([synthetic_solution(day, seed=1) for day in days])
+        ref = frame.transform(ref)[RESULT_COLUMNS].set_index("datetime")
+        ref.to_parquet(reference)
+    return {
+        "pos_files": pos_files,
+        "ionex_files": ionex_files,
+        "ionex_folder": ionex_folder,
+        "reference": reference,
+    }
+
+
+def stage_parse(context: dict):
+    return [read_pos(f) for f in context["pos_files"]]
+
+
+def stage_transform(context: dict):
+    frame = StationFrame(*REFERENCE_POSITION)
+    return [frame.transform(df)[RESULT_COLUMNS] for df in context["parse"]]
+
+
+def stage_write(context: dict):
+    results_folder = os.path.join(context["folder"], "results")
+    shutil.rmtree(results_folder, ignore_errors=True)
+    store = PartitionedResultStore(results_folder, STATION)
+    for day, df in zip(context["days"], context["transform"]):
+        store.commit(day, df)
+    save_as = os.path.join(context["folder"], f"{STATION}.parquet")
+    store.compact(context["days"], save_as)
+    return save_as
+
+
+def stage_ionex_parse(context: dict):
+    return [read_ionex(f) for f in context["ionex_files"]]
+
+
+def stage_ionex_store(context: dict):
+    store_folder = os.path.join(context["folder"], "ionex_store")
+    shutil.rmtree(store_folder, ignore_errors=True)
+    store = IonexStore(store_folder)
+    store.convert_folder(context["ionex_folder"])
+    return store.load(context["days"][0], context["days"][-1])
+
+
+def stage_metrics(context: dict):
+    engine = SimilarityEngine(context["reference"])
+    engine.add("synthetic", context["write"])
+    return engine.similarity()
+
+
+def stage_plot_preparation(context: dict):
+    clear_cache()
+    df = load_results(context["write"], POSITION_COLUMNS)
+    resampled = df.resample("1D").mean()
+    build_pyramid(df, context["write"])
+    df["norm"] = np.linalg.norm(df[POSITION_COLUMNS].to_numpy(), axis=1)
+    quantiles = grouped_statistics(df, "1D", ["norm"])
+    histogram = norm_summary(context["write"], POSITION_COLUMNS, 20, [0, 10])
+    return resampled, quantiles, histogram
+
+
+def stage_end_to_end(context: dict):
+    from omegaconf import OmegaConf
+    from ppp_batch_processor import PPPBatchProcessor
+
+    run_folder = os.path.join(context["folder"], "run")
+    days = context["days"][: context["end_to_end_days"]]
+    for day in days:
+        write_day_archive(run_folder, STATION, day)
+    shutil.rmtree(os.path.join(run_folder, "benchmark"), ignore_errors=True)
+    shutil.rmtree(os.path.join(run_folder, "unpacked"), ignore_errors=True)
+    shutil.rmtree(os.path.join(run_folder, "result_cache"), ignore_errors=True)
+    fake = f"{sys.executable} {os.path.join(BENCHMARKS_FOLDER, 'fake_rnx2rtkp.py')}"
+    config = OmegaConf.create(
+        {
+            "process": {
+                "experiment_name": "benchmark",
+                "run_folder": run_folder,
+                "ppp_solution": "rtklib",
+                "ppp_executable": fake,
+                "ppp_executable_test": f"{fake} --help",
+                "ppp_template_conf": os.path.join(
+                    BENCHMARKS_FOLDER, "..", "templates", "rtklib_template_ionex.conf"
+                ),
+                "start_date": str(days[0].date()),
+                "end_date": str(days[-1].date()),
+                "station": STATION,
+                "reference_position": REFERENCE_POSITION,
+                "save_array_as": os.path.join(run_folder, "benchmark", f"{STATION}.parquet"),
+                "ionex_pattern": "pred{doy:03}0.{y2d:02}i",
+                "ionex_folder": context["ionex_folder"],
+                "update_pos": False,
+                "workers": context["workers"],
+                "shared_inputs": {"prefetch": 0},
+            }
+        }
+    )
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        PPPBatchProcessor(config).main()
+
+
+STAGES = {
+    "parse": stage_parse,
+    "transform": stage_transform,
+    "write": stage_write,
+    "ionex_parse": stage_ionex_parse,
+    "ionex_store": stage_ionex_store,
+    "metrics": stage_metrics,
+    "plot_preparation": stage_plot_preparation,
+    "end_to_end": stage_end_to_end,
+}
+
+
+def run_stages(context: dict, stages: list, repeat: int) -> dict:
+    timings = {}
+    for name in stages:
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            context[name] = STAGES[name](context)
+            runs.append(time.perf_counter() - start)
+        timings[name] = {"min": min(runs), "median": float(np.median(runs)), "runs": runs}
+        print(f"{name:>18}: {min(runs):8.3f} s (median {np.median(runs):.3f} s)")
+    return timings
+
+
+def compare(timings: dict, baseline: dict, tolerance: float) -> list:
+    """Stages slower than the baseline by more than tolerance (a fraction)."""
+    regressions = []
+    for name, timing in timings.items():
+        if name not in baseline["stages"]:
+            continue
+        reference = baseline["stages"][name]["min"]
+        ratio = timing["min"] / reference
+        status = "REGRESSION" if ratio > 1 + tolerance else "ok"
+        print(f"{name:>18}: {ratio:6.2f}x baseline ({reference:.3f} s) {status}")
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=365, help="days of synthetic data")
+    parser.add_argument("--start", default="2015-01-01")
+    parser.add_argument("--folder", default=os.path.join(BENCHMARKS_FOLDER, "work"))
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--end-to-end-days", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--baseline", default=os.path.join(BENCHMARKS_FOLDER, "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("-o", "--output", help="json file with the timings of this run")
+    args = parser.parse_args()
+
+    days = pd.date_range(args.start, periods=args.days, freq="D")
+    os.makedirs(args.folder, exist_ok=True)
+    start = time.perf_counter()
+    context = generate(args.folder, days)
+    print(f"Synthetic data of {len(days)} days ready in {time.perf_counter() - start:.1f} s")
+    context.update(
+        {
+            "folder": args.folder,
+            "days": days,
+            "end_to_end_days": args.end_to_end_days,
+            "workers": args.workers,
+        }
+    )
+
+    # Stages read the outputs of the ones before them
+    needed = {"transform": ["parse"], "write": ["parse", "transform"]}
+    needed["metrics"] = needed["write"] + ["write"]
+    needed["plot_preparation"] = needed["write"] + ["write"]
+    stages = [
+        name
+        for name in STAGES
+        if name in args.stages or any(name in needed.get(s, []) for s in args.stages)
+    ]
+
+    result = {
+        "meta": {
+            "days": args.days,
+            "repeat": args.repeat,
+            "end_to_end_days": args.end_to_end_days,
+            "workers": args.workers,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "date": pd.Timestamp.now().isoformat(timespec="seconds"),
+        },
+        "stages": run_stages(context, stages, args.repeat),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=1)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=1)
+        print(f"Baseline saved in {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        stages = dict(result["stages"])
+        if baseline["meta"]["end_to_end_days"] != args.end_to_end_days:
+            stages.pop("end_to_end", None)
+        if baseline["meta"]["days"] != args.days:
+            print(f"The baseline has {baseline['meta']['days']} days. Timings are not comparable.")
+        elif len(compare(stages, baseline, args.tolerance)) > 0:
+            sys.exit(1)
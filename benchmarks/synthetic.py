@@ -0,0 +1,195 @@
+import os
+import sys
+import zipfile
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ppp_processor"))
+from station_frame import StationFrame
+
+# ONRJ, the station of the default configurations
+REFERENCE_POSITION = [4283638.36882, -4026028.90763, -2466096.66472]
+EPOCHS_PER_DAY = 2880
+
+POS_HEADER = """% program   : RTKLIB ver.demo5 b34
+% inp file  : {obs}
+% inp file  : {nav}
+% obs start : {start} GPST
+% obs end   : {end} GPST
+% pos mode  : single
+% elev mask : 10.0 deg
+% ionos opt : ionex tec
+% tropo opt : saastamoinen
+% ephemeris : broadcast
+%
+% (x/y/z-ecef=WGS84,Q=1:fix,2:float,3:sbas,4:dgps,5:single,6:ppp,ns=# of satellites)
+%  GPST                      x-ecef(m)      y-ecef(m)      z-ecef(m)   Q  ns   sdx(m)   sdy(m)   sdz(m)  sdxy(m)  sdyz(m)  sdzx(m) age(s)  ratio
+"""
+
+
+def day_seed(day: pd.Timestamp, seed: int = 0) -> int:
+    return seed * 100000 + day.year * 1000 + day.day_of_year
+
+
+def synthetic_solution(
+    day: pd.Timestamp,
+    reference_position: list = REFERENCE_POSITION,
+    epochs: int = EPOCHS_PER_DAY,
+    seed: int = 0,
+    start: pd.Timestamp | None = None,
+    end: pd.Timestamp | None = None,
+) -> pd.DataFrame:
+    """
+    One day of single point positions with the look of rtklib's SPP: ENU errors of a few
+    meters with a diurnal ionospheric term on the up component, a slow random walk and white
+    noise, 6 to 11 satellites and standard deviations that grow with fewer satellites.
+    The same day and seed always give the same values. start and end (inclusive) keep
+    only a window of the day, like rnx2rtkp -ts/-te.
+    """
+    rng = np.random.default_rng(day_seed(day, seed))
+    interval = 86400 / epochs
+    seconds = np.arange(epochs) * interval
+    times = day.to_datetime64() + (seconds * 1e9).astype("timedelta64[ns]")
+    hour = seconds / 3600
+
+    diurnal = np.clip(np.cos((hour - 14) / 24 * 2 * np.pi), 0, None)
+    walk = np.cumsum(rng.normal(0, 0.02, (epochs, 3)), axis=0)
+    enu = walk + rng.normal(0, [0.9, 1.2, 2.5], (epochs, 3))
+    enu[:, 2] += 3.0 * diurnal
+    enu[:, 1] += 0.8 * diurnal
+
+    frame = StationFrame(*reference_position)
+    xyz = enu @ frame.rotation + frame.origin
+
+    ns = rng.integers(6, 12, epochs)
+    scale = 8.0 / ns
+    sd = np.column_stack(
+        [
+            1.2 * scale,
+            1.1 * scale,
+            1.0 * scale,
+            -0.5 * scale,
+            0.7 * scale,
+            -0.6 * scale,
+        ]
+    ) * rng.uniform(0.9, 1.1, (epochs, 1))
+
+    df = pd.DataFrame(
+        {
+            "datetime": times,
+            "X(m)": xyz[:, 0],
+            "Y(m)": xyz[:, 1],
+            "Z(m)": xyz[:, 2],
+            "Q": 5,
+            "ns": ns,
+            "sdx(m)": sd[:, 0],
+            "sdy(m)": sd[:, 1],
+            "sdz(m)": sd[:, 2],
+            "sdxy(m)": sd[:, 3],
+            "sdyz(m)": sd[:, 4],
+            "sdzx(m)": sd[:, 5],
+            "age(s)": 0.0,
+            "ratio": 0.0,
+        }
+    )
+    if start is not None:
+        df = df[df["datetime"] >= start]
+    if end is not None:
+        df = df[df["datetime"] <= end]
+    return df.reset_index(drop=True)
+
+
+def write_pos(path: str, df: pd.DataFrame, obs: str = "", nav: str = "") -> None:
+    """Writes a solution with the header, widths and precisions of rnx2rtkp (-y 0)."""
+    if len(df) == 0:
+        start = end = ""
+    else:
+        start = pd.Timestamp(df["datetime"].iloc[0]).strftime("%Y/%m/%d %H:%M:%S.0")
+        end = pd.Timestamp(df["datetime"].iloc[-1]).strftime("%Y/%m/%d %H:%M:%S.0")
+    times = pd.DatetimeIndex(df["datetime"]).strftime("%Y/%m/%d %H:%M:%S.000").to_numpy()
+    values = df[
+        ["X(m)", "Y(m)", "Z(m)", "Q", "ns", "sdx(m)", "sdy(m)", "sdz(m)"]
+        + ["sdxy(m)", "sdyz(m)", "sdzx(m)", "age(s)", "ratio"]
+    ].to_numpy()
+    with open(path, "w") as f:
+        f.write(POS_HEADER.format(obs=obs, nav=nav, start=start, end=end))
+        for time, row in zip(times, values):
+            f.write(
+                f"{time} {row[0]:14.4f} {row[1]:14.4f} {row[2]:14.4f} {int(row[3]):3d} "
+                f"{int(row[4]):3d} {row[5]:8.4f} {row[6]:8.4f} {row[7]:8.4f} {row[8]:8.4f} "
+                f"{row[9]:8.4f} {row[10]:8.4f} {row[11]:6.2f} {row[12]:6.1f}\n"
+            )
+
+
+def write_ionex(path: str, day: pd.Timestamp, seed: int = 0, interval: int = 7200) -> None:
+    """
+    Writes a day of TEC maps in the layout of the predicted GIMs (data/unet/pred*.15i):
+    2.5 x 5 degrees, 13 maps every 2 hours including 00:00 of the next day, exponent -1 and
+    no RMS maps. The TEC follows the sun with an equatorial anomaly, plus noise.
+    """
+    rng = np.random.default_rng(day_seed(day, seed))
+    lat = np.arange(87.5, -87.6, -2.5)
+    lon = np.arange(-180.0, 180.1, 5.0)
+    maps = 86400 // interval + 1
+    epochs = [day + pd.Timedelta(seconds=interval * k) for k in range(maps)]
+
+    lines = [
+        "     1.0            IONOSPHERE MAPS     GNSS                IONEX VERSION / TYPE",
+        "synthetic           benchmarks          01-JAN-15 00:00     PGM / RUN BY / DATE ",
+        "Synthetic global ionosphere maps for benchmarks.            DESCRIPTION         ",
+        f"{_epoch(epochs[0])}                        EPOCH OF FIRST MAP  ",
+        f"{_epoch(epochs[-1])}                        EPOCH OF LAST MAP   ",
+        f"{interval:6d}                                                      INTERVAL            ",
+        f"{maps:6d}                                                      # OF MAPS IN FILE   ",
+        "  NONE                                                      MAPPING FUNCTION    ",
+        "10.0                                                        ELEVATION CUTOFF    ",
+        "One-way carrier phase leveled to code                       OBSERVABLES USED    ",
+        "  6371.0                                                    BASE RADIUS         ",
+        " 2                                                          MAP DIMENSION       ",
+        "   450.0 450.0   0.0                                        HGT1 / HGT2 / DHGT  ",
+        "    87.5 -87.5  -2.5                                        LAT1 / LAT2 / DLAT  ",
+        "  -180.0 180.0   5.0                                        LON1 / LON2 / DLON  ",
+        "    -1                                                      EXPONENT            ",
+        "                                                            END OF HEADER       ",
+    ]
+    lat_rad = np.radians(lat)[:, None]
+    for k, epoch in enumerate(epochs):
+        ut = interval * k / 3600
+        local_time = (ut + lon[None, :] / 15) % 24
+        daylight = np.clip(np.cos((local_time - 14) / 24 * 2 * np.pi), 0, None)
+        anomaly = 1 + 0.5 * np.exp(-(((np.abs(lat_rad) - np.radians(15)) / 0.15) ** 2))
+        tec = 5 + 45 * daylight * np.cos(lat_rad) ** 2 * anomaly
+        tec = np.round((tec + rng.normal(0, 1.0, tec.shape)) * 10).clip(0).astype(int)
+        lines.append(f"{k + 1:6d}                                                      START OF TEC MAP    ")
+        lines.append(f"{_epoch(epoch)}                        EPOCH OF CURRENT MAP")
+        for i, row_lat in enumerate(lat):
+            lines.append(f"  {row_lat:6.1f}-180.0 180.0   5.0 450.0                            LAT/LON1/LON2/DLON/H")
+            for j in range(0, len(lon), 16):
+                lines.append("".join(f"{v:5d}" for v in tec[i, j : j + 16]).ljust(80))
+        lines.append(f"{k + 1:6d}                                                      END OF TEC MAP      ")
+    lines.append("                                                            END OF FILE         ")
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _epoch(time: pd.Timestamp) -> str:
+    return (
+        f"{time.year:6d}{time.month:6d}{time.day:6d}"
+        f"{time.hour:6d}{time.minute:6d}{time.second:6d}"
+    )
+
+
+def write_day_archive(run_folder: str, station: str, day: pd.Timestamp) -> str:
+    """
+    Writes {run_folder}/{station}/{year}/{station}{doy}1.zip with placeholder obs and nav
+    files, enough for the processor to run a day with benchmarks/fake_rnx2rtkp.py.
+    """
+    year_folder = os.path.join(run_folder, station, str(day.year))
+    os.makedirs(year_folder, exist_ok=True)
+    name = f"{station}{day.day_of_year:03}1"
+    archive = os.path.join(year_folder, f"{name}.zip")
+    y2d = day.year % 100
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr(f"{name}.{y2d:02}o", f"synthetic observations of {day.date()}\n")
+        z.writestr(f"{name}.{y2d:02}n", f"synthetic navigation of {day.date()}\n")
+    return archive
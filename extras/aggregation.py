@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+QUANTILES = [0.05, 0.2, 0.5, 0.8, 0.95]
+MOMENTS = ["min", "max", "mean", "std", "count"]
+
+
+def quantile_name(q: float) -> str:
+    return f"q{q:g}"
+
+
+def grouped_statistics(
+    df: pd.DataFrame,
+    frequency: str = "1D",
+    columns: list | None = None,
+    quantiles: list = QUANTILES,
+    moments: list = MOMENTS,
+) -> pd.DataFrame:
+    """
+    Quantiles (linear interpolation, as pandas) and moments of every column of df (indexed by
+    datetime) in the bins of resample(frequency), computed from a single sort of each column
+    by (bin, value). Returns a tidy frame with datetime, column, statistic and value, where
+    the statistic is one of the moments or quantile_name(q). std has ddof 1, as pandas.
+    """
+    columns = list(df.columns) if columns is None else list(columns)
+    if len(df) == 0:
+        return pd.DataFrame(columns=["datetime", "column", "statistic", "value"])
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+
+    # Rows of a bin are contiguous once the index is sorted
+    sizes = df[columns[0]].resample(frequency).size()
+    labels = sizes.index
+    starts = np.concatenate([[0], np.cumsum(sizes.to_numpy())[:-1]])
+    codes = np.repeat(np.arange(len(sizes)), sizes.to_numpy())
+
+    frames = []
+    for column in columns:
+        values = df[column].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(values)
+        # NaN values go to the end of their bin, after the valid ones
+        order = np.lexsort((values, codes))
+        ordered = values[order]
+        n = np.bincount(codes[valid], minlength=len(sizes))
+        sums = np.bincount(codes[valid], values[valid], minlength=len(sizes))
+        has_values = n > 0
+        last = starts + np.maximum(n - 1, 0)
+
+        statistics = {}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = sums / n
+            if "min" in moments:
+                first_value = ordered[np.minimum(starts, len(ordered) - 1)]
+                statistics["min"] = np.where(has_values, first_value, np.nan)
+            if "max" in moments:
+                last_value = ordered[np.minimum(last, len(ordered) - 1)]
+                statistics["max"] = np.where(has_values, last_value, np.nan)
+            if "mean" in moments:
+                statistics["mean"] = mean
+            if "std" in moments:
+                deviations = np.where(valid, values - mean[codes], 0.0)
+                squares = np.bincount(codes, deviations**2, minlength=len(sizes))
+                statistics["std"] = np.sqrt(squares / (n - 1))
+            if "count" in moments:
+                statistics["count"] = n.astype(np.float64)
+            for q in quantiles:
+                position = q * np.maximum(n - 1, 0)
+                lower = np.floor(position).astype(np.int64)
+                upper = np.ceil(position).astype(np.int64)
+                low_value = ordered[np.minimum(starts + lower, len(ordered) - 1)]
+                high_value = ordered[np.minimum(starts + upper, len(ordered) - 1)]
+                statistics[quantile_name(q)] = np.where(
+                    has_values, low_value + (position - lower) * (high_value - low_value), np.nan
+                )
+
+        for statistic, value in statistics.items():
+            frames.append(
+                pd.DataFrame(
+                    {"datetime": labels, "column": column, "statistic": statistic, "value": value}
+                )
+            )
+    return pd.concat(frames, ignore_index=True)
+
+
+def statistics_table(tidy: pd.DataFrame, column: str) -> pd.DataFrame:
+    """One row per bin and one column per statistic of the given column of a tidy frame."""
+    selected = tidy[tidy["column"] == column]
+    return selected.pivot(index="datetime", columns="statistic", values="value")
@@ -0,0 +1,232 @@
+import os
+import sys
+import glob
+import argparse
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ppp_processor"))
+from ionex import IonexMaps, IonexStore, read_ionex
+
+
+class GimSource:
+    """
+    Daily IONEX maps of a model or of the reference. Days converted with ppp_processor/ionex.py
+    are read from {folder}/store, the others are parsed from the text files of the folder
+    (e.g. pred0060.15i or codg0060.15i.Z).
+    """
+
+    def __init__(self, folder: str, store: str | None = None) -> None:
+        self.folder = folder
+        self.store = IonexStore(store or os.path.join(folder, "store"))
+
+    def day(self, day: pd.Timestamp) -> IonexMaps | None:
+        maps = self.store.load_day(day)
+        if maps is not None:
+            return maps
+        files = sorted(
+            glob.glob(
+                os.path.join(self.folder, f"*{day.day_of_year:03}0.{day.strftime('%y')}i*")
+            )
+        )
+        if len(files) == 0:
+            return None
+        return read_ionex(files[0])
+
+
+class GimComparison:
+    """
+    Streams the days of a range and accumulates the TEC error (prediction - reference) of
+    every valid pixel: totals, per pixel, per latitude band, per epoch of the day and per day.
+    Only one day of maps is in memory at any time.
+    """
+
+    def __init__(self, lat_bands: list) -> None:
+        self.lat_bands = np.asarray(lat_bands, dtype=float)
+        self.daily = []
+        self.pixel_sum = None
+        self.pixel_sum2 = None
+        self.pixel_count = None
+        self.band_sum = np.zeros(len(self.lat_bands) - 1)
+        self.band_sum2 = np.zeros(len(self.lat_bands) - 1)
+        self.band_count = np.zeros(len(self.lat_bands) - 1)
+        self.hour_sum = np.zeros(24)
+        self.hour_sum2 = np.zeros(24)
+        self.hour_count = np.zeros(24)
+        self.lat = None
+        self.lon = None
+
+    def add_day(self, day: pd.Timestamp, pred: IonexMaps, ref: IonexMaps) -> None:
+        if pred.tec.shape[1:] != ref.tec.shape[1:]:
+            raise ValueError(f"The grids of {day.date()} are different.")
+
+        # Epochs of the day present in both files (the 00:00 map of the next day is skipped)
+        start = np.datetime64(day, "s")
+        end = np.datetime64(day + pd.Timedelta(days=1), "s")
+        epochs, i_pred, i_ref = np.intersect1d(pred.epochs, ref.epochs, return_indices=True)
+        in_day = (epochs >= start) & (epochs < end)
+        epochs, i_pred, i_ref = epochs[in_day], i_pred[in_day], i_ref[in_day]
+        if len(epochs) == 0:
+            return
+
+        diff = IonexMaps.scale(pred.tec[i_pred], pred.exponent[i_pred]) - IonexMaps.scale(
+            ref.tec[i_ref], ref.exponent[i_ref]
+        )
+        valid = ~np.isnan(diff)
+        diff = np.where(valid, diff, 0.0).astype(np.float64)
+        diff2 = diff**2
+
+        if self.pixel_sum is None:
+            self.lat = pred.lat
+            self.lon = pred.lon
+            self.pixel_sum = np.zeros(diff.shape[1:])
+            self.pixel_sum2 = np.zeros(diff.shape[1:])
+            self.pixel_count = np.zeros(diff.shape[1:])
+        self.pixel_sum += diff.sum(axis=0)
+        self.pixel_sum2 += diff2.sum(axis=0)
+        self.pixel_count += valid.sum(axis=0)
+
+        # Latitude bands, including the upper edge in the last one. Other rows are ignored
+        n_bands = len(self.band_sum)
+        band = np.searchsorted(self.lat_bands, pred.lat, side="right") - 1
+        band[pred.lat == self.lat_bands[-1]] = n_bands - 1
+        rows = (band >= 0) & (band < n_bands)
+        self.band_sum += np.bincount(band[rows], diff.sum(axis=(0, 2))[rows], n_bands)
+        self.band_sum2 += np.bincount(band[rows], diff2.sum(axis=(0, 2))[rows], n_bands)
+        self.band_count += np.bincount(band[rows], valid.sum(axis=(0, 2))[rows], n_bands)
+
+        hour = ((epochs - start) // np.timedelta64(1, "h")).astype(int)
+        self.hour_sum += np.bincount(hour, diff.sum(axis=(1, 2)), 24)
+        self.hour_sum2 += np.bincount(hour, diff2.sum(axis=(1, 2)), 24)
+        self.hour_count += np.bincount(hour, valid.sum(axis=(1, 2)), 24)
+
+        count = valid.sum()
+        self.daily.append(
+            {
+                "date": day,
+                "bias": diff.sum() / count,
+                "rmse": np.sqrt(diff2.sum() / count),
+                "mae": np.abs(diff).sum() / count,
+                "max": np.abs(diff).max(),
+                "maps": len(epochs),
+                "pixels": int(count),
+            }
+        )
+
+    @staticmethod
+    def _stats(s, s2, n) -> tuple:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            bias = s / n
+            rmse = np.sqrt(s2 / n)
+            std = np.sqrt(np.maximum(s2 / n - bias**2, 0.0))
+        return bias, rmse, std
+
+    def summary(self) -> pd.DataFrame:
+        rows = []
+        n = self.pixel_count.sum()
+        bias, rmse, std = self._stats(self.pixel_sum.sum(), self.pixel_sum2.sum(), n)
+        rows.append({"group": "global", "bias": bias, "rmse": rmse, "std": std, "pixels": n})
+        bias, rmse, std = self._stats(self.band_sum, self.band_sum2, self.band_count)
+        for i in range(len(self.band_sum)):
+            rows.append(
+                {
+                    "group": f"lat {self.lat_bands[i]:g} to {self.lat_bands[i + 1]:g}",
+                    "bias": bias[i],
+                    "rmse": rmse[i],
+                    "std": std[i],
+                    "pixels": self.band_count[i],
+                }
+            )
+        bias, rmse, std = self._stats(self.hour_sum, self.hour_sum2, self.hour_count)
+        for h in np.flatnonzero(self.hour_count):
+            rows.append(
+                {
+                    "group": f"{h:02}:00 UT",
+                    "bias": bias[h],
+                    "rmse": rmse[h],
+                    "std": std[h],
+                    "pixels": self.hour_count[h],
+                }
+            )
+        return pd.DataFrame(rows)
+
+    def daily_series(self) -> pd.DataFrame:
+        return pd.DataFrame(self.daily).set_index("date")
+
+    def pixel_maps(self) -> tuple:
+        """Returns (bias, rmse) maps with shape (lat, lon)."""
+        bias, rmse, _ = self._stats(self.pixel_sum, self.pixel_sum2, self.pixel_count)
+        return bias, rmse
+
+
+def compare(pred: GimSource, ref: GimSource, days: pd.DatetimeIndex, lat_bands: list):
+    comparison = GimComparison(lat_bands)
+    for day in days:
+        pred_maps = pred.day(day)
+        ref_maps = ref.day(day)
+        if pred_maps is None or ref_maps is None:
+            continue
+        comparison.add_day(day, pred_maps, ref_maps)
+    return comparison
+
+
+def plot_daily(daily: dict, save_plot: str) -> None:
+    fig, axes = plt.subplots(nrows=2, ncols=1, sharex=True, figsize=(10, 6))
+    for name, df in daily.items():
+        axes[0].plot(df.index, df["bias"], label=name)
+        axes[1].plot(df.index, df["rmse"], label=name)
+    axes[0].set_ylabel("Bias (TECU)")
+    axes[1].set_ylabel("RMSE (TECU)")
+    for ax in axes:
+        ax.grid(True)
+    axes[0].legend(loc="upper right")
+    plt.tight_layout()
+    plt.savefig(save_plot, bbox_inches="tight")
+    plt.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-c",
+        "-config",
+        type=argparse.FileType("r"),
+        default="configurations/gim_comparison.yaml",
+    )
+    parsed_args = parser.parse_args()
+
+    config = yaml.safe_load(parsed_args.c)
+
+    days = pd.date_range(config["start"], config["end"], freq="D")
+    lat_bands = config.get("lat_bands", [-90, -60, -30, 0, 30, 60, 90])
+    ref = GimSource(config["ref"], config.get("ref_store"))
+
+    summary_list = []
+    daily = {}
+    for series_name, series_folder in config["series"]:
+        comparison = compare(GimSource(series_folder), ref, days, lat_bands)
+        if len(comparison.daily) == 0:
+            print(f"No days of {series_name} to compare.")
+            continue
+        summary = comparison.summary()
+        summary["network"] = series_name
+        summary_list.append(summary)
+        daily[series_name] = comparison.daily_series()
+        if config.get("pixel_output"):
+            bias, rmse = comparison.pixel_maps()
+            np.savez(
+                config["pixel_output"].format(network=series_name.replace(" ", "_")),
+                lat=comparison.lat,
+                lon=comparison.lon,
+                bias=bias,
+                rmse=rmse,
+            )
+        print(f"{series_name}: {len(daily[series_name])} days")
+        print(summary.head(1).to_string(index=False))
+
+    if len(summary_list) > 0:
+        pd.concat(summary_list, ignore_index=True).to_csv(config["output"], index=False)
+        pd.concat(daily, names=["network", "date"]).to_csv(config["daily_output"])
+        plot_daily(daily, config["plot"])
@@ -6,6 +6,8 @@ import sys
 import hydra
 from omegaconf import DictConfig, OmegaConf
 import pathlib
+from results_loader import SD_COLUMNS
+from streaming_stats import norm_summary
 font = {'family' : 'Arial',
         'weight' : 'normal',
         'size'   : 12}
@@ -29,17 +31,17 @@ def makeHistComparison(l,outfilename=f"compared_histogram_continuous.pdf",bins=1
     mean = 0
 
     for i,model in enumerate(l):
-        df = pd.read_parquet(model[1])
-        m = np.linalg.norm(df[['sdx(m)', 'sdy(m)', 'sdz(m)']].to_numpy(), axis=1).flatten()
+        # Streamed by record batches: the norms of a model are never all in memory.
+        # The first model is read twice, once for the range and once for the histogram
         if rmin==rmax:
-            rmin = int(np.floor(np.percentile(m, 1)))
-            rmax = int(np.floor(np.percentile(m, 99)))
-            #bins = int(rmax-rmin)
-        hist, edges = np.histogram(m.reshape(-1), bins=bins, range=[rmin, rmax], density=True)
+            _, sketch, _ = norm_summary(model[1], SD_COLUMNS)
+            rmin = int(np.floor(sketch.percentile(1)))
+            rmax = int(np.floor(sketch.percentile(99)))
+        moments, _, histogram = norm_summary(model[1], SD_COLUMNS, bins, [rmin, rmax], quantiles=False)
+        hist_percent = histogram.percent()
+        edges = histogram.edges
         width = edges[1] - edges[0]
-        # Ajuste: Multiplicar hist por width e por 100 para obter percentagens corretas
-        hist_percent = hist * width * 100  # Normaliza para que a soma das áreas seja 100%
-        label = f"{model[0]} $\mu={m.mean():.2f}m$, $\sigma={m.std():.2f}m$"
+        label = f"{model[0]} $\mu={moments.mean:.2f}m$, $\sigma={moments.std:.2f}m$"
         if i == 0:
             plt.bar(edges[:-1] + 0.5 * width, hist_percent, label=label, alpha=0.5, width=width)
         else:
@@ -3,6 +3,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 import hydra
 from omegaconf import DictConfig, OmegaConf
+from results_loader import load_results, POSITION_COLUMNS
+from aggregation import grouped_statistics, statistics_table
 
 
 @hydra.main(
@@ -16,25 +18,30 @@ def my_app(cfg : DictConfig) -> None:
     model = cfg.get('model')
     plot_path = cfg.get("plot")
 
-    df1 = pd.read_parquet(folder.format(model=model))
+    columns = list(cfg.get('columns', POSITION_COLUMNS))
+    df1 = load_results(
+        folder.format(model=model), columns, cfg.get('start_date'), cfg.get('end_date')
+    )
     df1['norm'] = np.linalg.norm(df1.to_numpy(), axis=1)
-    freq='1D'
-    df1 = df1.resample(freq)
+    freq = cfg.get('frequency', '1D')
+    quantiles = [0.05, 0.2, 0.5, 0.8, 0.95]
 
-    data=df1['norm']
-    x=data.mean().index
+    # All the quantiles and moments of every bin in one pass
+    daily = statistics_table(
+        grouped_statistics(df1, freq, ['norm'], quantiles, ['min', 'max', 'mean']), 'norm'
+    )
+    x=daily.index
     plt.figure(figsize=(10,10))
     # plt.title("Percentiles of the VTEC values on every pixel on the GIMs from 2014 ")
-    plt.plot(x,data.min(), label='Minimum/Maximum', color='red', marker='.', linestyle='', markersize=2)
-    plt.plot(x,data.max(),  color='red', marker='.', linestyle='', markersize=2)
-    per=data.quantile([0.5, 0.95, 0.20, 0.80])
-    plt.fill_between(x,y1=data.quantile(0.05),y2=data.quantile(0.95), alpha=0.1, color='blue') #,label="90% of the pixels"
-    plt.plot(x,data.quantile(0.05), color='blue', label="Percentiles of 5% and 95%.")
-    plt.plot(x,data.quantile(0.95), color='blue')
-    plt.fill_between(x,y1=data.quantile(0.2),y2=data.quantile(0.8), alpha=0.2, color='green', edgecolor='green') #,label="60% of the pixels"
-    plt.plot(x,data.quantile(0.2), color='green', label="Percentiles of 20% and 80%.")
-    plt.plot(x,data.quantile(0.8), color='green')
-    plt.plot(x, data.mean(), label='Mean', color='yellow')
+    plt.plot(x,daily['min'], label='Minimum/Maximum', color='red', marker='.', linestyle='', markersize=2)
+    plt.plot(x,daily['max'],  color='red', marker='.', linestyle='', markersize=2)
+    plt.fill_between(x,y1=daily['q0.05'],y2=daily['q0.95'], alpha=0.1, color='blue') #,label="90% of the pixels"
+    plt.plot(x,daily['q0.05'], color='blue', label="Percentiles of 5% and 95%.")
+    plt.plot(x,daily['q0.95'], color='blue')
+    plt.fill_between(x,y1=daily['q0.2'],y2=daily['q0.8'], alpha=0.2, color='green', edgecolor='green') #,label="60% of the pixels"
+    plt.plot(x,daily['q0.2'], color='green', label="Percentiles of 20% and 80%.")
+    plt.plot(x,daily['q0.8'], color='green')
+    plt.plot(x, daily['mean'], label='Mean', color='yellow')
     plt.ylabel("Norm of the difference")
     plt.xlabel(f"Days of the years")
     # plt.legend(loc='center left', bbox_to_anchor=(1, 0.5))#(loc=1)
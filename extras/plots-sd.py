@@ -4,13 +4,15 @@ import numpy as np
 import pandas as pd
 import os
 import yaml
+from results_loader import load_results, load_resampled, intersect_with, SD_COLUMNS
 
 
-def intersect_series(series_path, ref_path=None):
-    series = pd.read_parquet(series_path)
+def intersect_series(series_path, ref_path=None, start=None, end=None):
+    series = load_results(series_path, SD_COLUMNS, start, end)
     if not ref_path is None:
-        ref = pd.read_parquet(ref_path)
-        series = series.loc[series.index.intersection(ref.index)]
+        # The reference is read once and reused for every series
+        ref = load_results(ref_path, SD_COLUMNS, start, end)
+        series = intersect_with(series, ref)
 
     return series
 
@@ -66,8 +68,13 @@ def plot_experiments(cfg, yml_name):
         series_name = series_data[0]
         series_path = series_data[1]
 
-        series_dict[f"{series_name}"] = (
-            intersect_series(series_path, None)
+        # Without a reference, the series can come already resampled from the pyramid
+        series_dict[f"{series_name}"] = load_resampled(
+            series_path,
+            SD_COLUMNS,
+            cfg["resample"],
+            cfg.get("start_date"),
+            cfg.get("end_date"),
         )
 
 
@@ -4,13 +4,15 @@ import numpy as np
 import pandas as pd
 import os
 import yaml
+from results_loader import load_results, load_resampled, intersect_with, POSITION_COLUMNS
 
 
-def intersect_series(series_path, ref_path=None):
-    series = pd.read_parquet(series_path)
+def intersect_series(series_path, ref_path=None, start=None, end=None):
+    series = load_results(series_path, POSITION_COLUMNS, start, end)
     if not ref_path is None:
-        ref = pd.read_parquet(ref_path)
-        series = series.loc[series.index.intersection(ref.index)]
+        # The reference is read once and reused for every series
+        ref = load_results(ref_path, POSITION_COLUMNS, start, end)
+        series = intersect_with(series, ref)
 
     return series
 
@@ -65,7 +67,9 @@ def plot_experiments(cfg, yml_name):
         ref_name = cfg["files"]["ref"][0]
         ref_path = cfg["files"]["ref"][1]
    
-        igs_dict[f"{ref_name}"] = pd.read_parquet(ref_path)
+        igs_dict[f"{ref_name}"] = load_results(
+            ref_path, POSITION_COLUMNS, cfg.get("start_date"), cfg.get("end_date")
+        )
     else:
         ref_path = None
         ref_name = ''
@@ -76,7 +80,9 @@ def plot_experiments(cfg, yml_name):
         igs_path = igs_data[1]
 
         # Intersecting with ref and adding to the dictionary
-        igs_dict[f"{igs_name}"] = intersect_series(igs_path, ref_path)
+        igs_dict[f"{igs_name}"] = intersect_series(
+            igs_path, ref_path, cfg.get("start_date"), cfg.get("end_date")
+        )
 
     series_data_list = cfg["files"]["series"]
     series_dict = {}
@@ -87,11 +93,19 @@ def plot_experiments(cfg, yml_name):
         # Intersecting with ref and adding to the dictionary
         if not cfg["files"]["ref"] is None:
             series_dict[f"{series_name}"] = (
-                intersect_series(series_path, ref_path) - igs_dict[f"{ref_name}"]
+                intersect_series(
+                    series_path, ref_path, cfg.get("start_date"), cfg.get("end_date")
+                )
+                - igs_dict[f"{ref_name}"]
             )
         else:
-            series_dict[f"{series_name}"] = (
-                intersect_series(series_path, ref_path)
+            # Without a reference, the series can come already resampled from the pyramid
+            series_dict[f"{series_name}"] = load_resampled(
+                series_path,
+                POSITION_COLUMNS,
+                cfg["resample"],
+                cfg.get("start_date"),
+                cfg.get("end_date"),
             )
 
     # First plot with base data: Broadcast, C1PG GIM prediction, IONEX GIM post processing and IONFREE (dual freq)
@@ -0,0 +1,83 @@
+import os
+import sys
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ppp_processor'))
+from pyramid import read_level
+from result_schema import read_results, default_columns, POSITION_COLUMNS, SD_COLUMNS
+
+# {path: {"signature": (mtime_ns, size), "frames": [(columns, start, end, DataFrame)]}}
+_cache = {}
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _covers(loaded, requested):
+    """True if a cached range (start, end) contains the requested one (None is open)."""
+    (start, end), (req_start, req_end) = loaded, requested
+    if start is not None and (req_start is None or req_start < start):
+        return False
+    if end is not None and (req_end is None or req_end > end):
+        return False
+    return True
+
+
+def load_results(path, columns=None, start=None, end=None):
+    """
+    Reads a results parquet file (indexed by datetime) with only the given columns and,
+    through parquet filters, only the rows from start to end (inclusive; an end date without
+    time includes that whole day). Without columns, every column except Q and ns is read.
+
+    Frames are cached by path and reused while the file keeps its mtime and size, so a
+    reference read by several series (or several figures) is read once. A request is served
+    from any cached frame with more columns or a wider date range. The returned frame is a
+    new object, so adding columns to it does not change the cache.
+    """
+    path = os.path.abspath(path)
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+    if end is not None and end == end.normalize():
+        end = end + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')
+    signature = _signature(path)
+    columns = default_columns(path) if columns is None else list(columns)
+    entry = _cache.get(path)
+    if entry is None or entry['signature'] != signature:
+        entry = {'signature': signature, 'frames': []}
+        _cache[path] = entry
+
+    for loaded_columns, loaded_start, loaded_end, df in entry['frames']:
+        if set(columns).issubset(loaded_columns) and _covers((loaded_start, loaded_end), (start, end)):
+            return df[columns].loc[start:end].copy(deep=False)
+
+    filters = []
+    if start is not None:
+        filters.append(('datetime', '>=', start))
+    if end is not None:
+        filters.append(('datetime', '<=', end))
+    df = read_results(path, columns, filters or None)
+    df = df.sort_index()
+    entry['frames'].append((set(columns), start, end, df))
+    return df.copy(deep=False)
+
+
+def load_resampled(path, columns, frequency, start=None, end=None):
+    """
+    Same as load_results(...).resample(frequency).mean(), but read from the pyramid written
+    by the processor next to the results file when it is up to date.
+    """
+    resampled = read_level(path, frequency, columns, 'mean', start, end)
+    if resampled is None:
+        resampled = load_results(path, columns, start, end).resample(frequency).mean()
+    return resampled
+
+
+def intersect_with(series, ref):
+    """Keeps the epochs of series that are also in ref."""
+    return series.loc[series.index.intersection(ref.index)]
+
+
+def clear_cache():
+    _cache.clear()
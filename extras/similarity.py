@@ -2,48 +2,159 @@ import pandas as pd
 import argparse
 import numpy as np
 import matplotlib.pyplot as plt
-import sklearn.metrics
 import yaml
 
-class SimilarityTool:
-
-    def __init__(self, series_path, ref_path) -> None:
-        # Series and reference dataframes
-        series = pd.read_parquet(series_path)[['X(m)','Y(m)','Z(m)']]
-        ref = pd.read_parquet(ref_path)[['X(m)','Y(m)','Z(m)']]
-
-        # Adding the norm to the series and ref
-        #series["Norm1"] = np.linalg.norm(
-        #    series[["X(m)", "Y(m)", "Z(m)"]].to_numpy(), axis=-1
-        #)
-        #ref["Norm1"] = np.linalg.norm(ref[["X(m)", "Y(m)", "Z(m)"]].to_numpy(), axis=-1)
+COLUMNS = ['X(m)', 'Y(m)', 'Z(m)']
+
+# Norms added to the coordinates: horizontal (first two) and 3D
+NORMS = {'H(m)': 2, '3D(m)': 3}
+
+
+def with_norms(values):
+    """Returns a (columns + norms, epochs) array from (epochs, 3) coordinates."""
+    values = np.ascontiguousarray(values.T)
+    squared = values**2
+    norms = [np.sqrt(squared[:n].sum(axis=0)) for n in NORMS.values()]
+    return np.vstack([values] + norms)
+
+
+def poisson_weights(rng, shape):
+    """Poisson(1) counts drawn through a 16-bit lookup table, much faster than rng.poisson."""
+    cdf = np.cumsum([np.exp(-1.0) / np.prod(np.arange(1, k + 1)) for k in range(16)])
+    table = np.searchsorted(np.round(cdf * 2**16), np.arange(2**16), side='right')
+    return table.astype(np.float64)[rng.integers(0, 2**16, shape, dtype=np.uint16)]
+
+
+class SimilarityEngine:
+    """
+    Compares any number of series with a reference that is read only once. Every series is
+    aligned to the reference timestamps and stacked in a (series, columns, epochs) array with
+    NaN where an epoch is missing, so each metric is a single NumPy reduction.
+
+    The metrics keep the meaning of the original corrwith calls: MAE and RMSE of the
+    difference, STDEV of the difference (ddof=1) and r2_score(series, ref), where the series
+    is the "true" argument.
+    """
+
+    def __init__(self, ref_path, columns=COLUMNS) -> None:
+        self.columns = list(columns) + list(NORMS)
+        ref = pd.read_parquet(ref_path, columns=list(columns))
+        ref = ref[~ref.index.duplicated()].sort_index()
+        self.index = ref.index
+        self.ref = with_norms(ref.to_numpy(dtype=np.float64))
+        self.names = []
+        self.series = []
+
+    def add(self, name, series_path) -> None:
+        series = pd.read_parquet(series_path, columns=self.columns[: -len(NORMS)])
+        # Positions of the series timestamps in the sorted reference index
+        keys = self.index.to_numpy()
+        times = series.index.to_numpy()
+        positions = np.clip(np.searchsorted(keys, times), 0, len(keys) - 1)
+        found = keys[positions] == times
+        aligned = np.full(self.ref.shape, np.nan)
+        aligned[:, positions[found]] = with_norms(series.to_numpy(dtype=np.float64)[found])
+        self.names.append(name)
+        self.series.append(aligned)
+
+    def _prepare(self):
+        """Differences and series with zeros outside the epochs both have, and counts."""
+        series = np.stack(self.series)
+        valid = ~np.isnan(series) & ~np.isnan(self.ref)
+        diff = np.where(valid, series - self.ref, 0.0)
+        series = np.where(valid, series, 0.0)
+        return valid, diff, series, valid.sum(axis=-1)
+
+    def similarity(self) -> dict:
+        """Returns {metric: DataFrame (series x columns)} for MAE, RMSE, STDEV and R2."""
+        valid, diff, series, n = self._prepare()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_diff = diff.sum(axis=-1) / n
+            mean_series = series.sum(axis=-1) / n
+            # Two passes, so large coordinates do not lose precision
+            spread = np.where(valid, diff - mean_diff[..., None], 0.0)
+            centered = np.where(valid, series - mean_series[..., None], 0.0)
+            squared = np.einsum('scn,scn->sc', diff, diff)
+            metrics = {
+                'MAE': np.abs(diff).sum(axis=-1) / n,
+                'RMSE': np.sqrt(squared / n),
+                'STDEV': np.sqrt(np.einsum('scn,scn->sc', spread, spread) / (n - 1)),
+                'R2': 1.0 - squared / np.einsum('scn,scn->sc', centered, centered),
+            }
+        return {
+            name: pd.DataFrame(values, index=self.names, columns=self.columns)
+            for name, values in metrics.items()
+        }
+
+    def bootstrap(self, samples=1000, batch=32, confidence=0.95, seed=0) -> pd.DataFrame:
+        """
+        Percentile confidence intervals from a Poisson bootstrap: every replicate weights each
+        epoch by a Poisson(1) count, so a batch of replicates is a single (batch x epochs)
+        matrix product with the per-epoch sums that the metrics need.
+        """
+        rng = np.random.default_rng(seed)
+        valid, diff, series, n = self._prepare()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_series = series.sum(axis=-1, keepdims=True) / n[..., None]
+        centered = np.where(valid, series - mean_series, 0.0)
+        # Features per epoch: count, d, |d|, d^2, s, s^2 for every series and column
+        features = np.stack(
+            [valid.astype(np.float64), diff, np.abs(diff), diff**2, centered, centered**2]
+        )
+        n_features = features.shape[0] * features.shape[1] * features.shape[2]
+        features = features.reshape(n_features, -1).T
+
+        replicates = []
+        for start in range(0, samples, batch):
+            size = min(batch, samples - start)
+            replicates.append(poisson_weights(rng, (size, features.shape[0])) @ features)
+        sums = np.concatenate(replicates).reshape(samples, 6, *valid.shape[:2])
+        n, d, abs_d, d2, s, s2 = np.moveaxis(sums, 1, 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            metrics = {
+                'MAE': abs_d / n,
+                'RMSE': np.sqrt(d2 / n),
+                'STDEV': np.sqrt((d2 - d**2 / n) / (n - 1)),
+                'R2': 1.0 - d2 / (s2 - s**2 / n),
+            }
+        point = self.similarity()
+        alpha = (1.0 - confidence) / 2
+        rows = []
+        for metric, values in metrics.items():
+            lower, upper = np.nanquantile(values, [alpha, 1.0 - alpha], axis=0)
+            for i, name in enumerate(self.names):
+                for j, column in enumerate(self.columns):
+                    rows.append(
+                        {
+                            'network': name,
+                            'metric': metric,
+                            'column': column,
+                            'value': point[metric].iloc[i, j],
+                            'lower': lower[i, j],
+                            'upper': upper[i, j],
+                        }
+                    )
+        return pd.DataFrame(rows)
 
-        # Intersecting with the reference to align the timestamps
-        series = series.loc[series.index.intersection(ref.index)]
 
-        # Computing the difference to the reference
-        diff_series = series - ref
+class SimilarityTool:
 
-        # Resampling according to the frequency
-        self.diff_series = diff_series
-        self.series = series
-        self.ref = ref
+    def __init__(self, series_path, ref_path) -> None:
+        self.engine = SimilarityEngine(ref_path)
+        self.engine.add(series_path, series_path)
 
     def similarity(self):
-        mae = self.series.corrwith(self.ref, method=sklearn.metrics.mean_absolute_error)
-        rmse = self.series.corrwith(self.ref, method=sklearn.metrics.root_mean_squared_error)
-        stdev = self.diff_series.std(axis=0)
-        r2 = self.series.corrwith(self.ref, method=sklearn.metrics.r2_score)#"pearson")
-
-        return mae, rmse, stdev, r2
+        metrics = self.engine.similarity()
+        return tuple(
+            metrics[name].iloc[0][COLUMNS] for name in ['MAE', 'RMSE', 'STDEV', 'R2']
+        )
 
-    def plot(self, concat_series, save_plot):
+    @staticmethod
+    def plot(concat_series, save_plot):
         # MAE plot
-        concat_series[['E(m)','N(m)','U(m)']] = concat_series[['X(m)','Y(m)','Z(m)']]
-        #concat_series['Norm'] = np.linalg.norm(
-        #    concat_series[["E(m)", "N(m)", "U(m)"]].to_numpy(dtype=float), axis=-1
-        #)
-        concat_series.drop(columns=['X(m)','Y(m)','Z(m)'], inplace=True)
+        concat_series.rename(
+            columns={'X(m)': 'E(m)', 'Y(m)': 'N(m)', 'Z(m)': 'U(m)'}, inplace=True
+        )
         grouped = concat_series.groupby("metric")
 
         fig, axes = plt.subplots(nrows=1, ncols=len(grouped))
@@ -84,33 +195,40 @@ if __name__ == '__main__':
 
     config = yaml.safe_load(parsed_args.c)
 
-    series_info_list = config["series"]
+    # The reference is read once and every series is aligned to it
+    engine = SimilarityEngine(config["ref"])
+    for series_name, series_path in config["series"]:
+        engine.add(series_name, series_path)
+    metrics = engine.similarity()
+
+    labels = {
+        "MAE": "MAE (menor é melhor)",
+        "RMSE": "RMSE (menor é melhor)",
+        "STDEV": "STDEV (menor é melhor)",
+        "R2": "R2 (maior é melhor)",
+    }
     series_list = []
-    for series_info in series_info_list:
-        series_name = series_info[0]
-        series_path = series_info[1]
-        st = SimilarityTool(series_path, config["ref"])
-        mae, rmse, stdev, r2 = st.similarity()
-
-        mae["metric"] = "MAE (menor é melhor)"
-        rmse["metric"] = "RMSE (menor é melhor)"
-        stdev["metric"] = "STDEV (menor é melhor)"
-        r2["metric"] = "R2 (maior é melhor)"
-
-        # As the metrics are Pandas Series, we need to convert them do dataframes and transpose them
-        mae = mae.to_frame().T
-        rmse = rmse.to_frame().T
-        stdev = stdev.to_frame().T
-        r2 = r2.to_frame().T
-
-        # Concatenating the metrics
-        series = pd.concat([mae, rmse, r2], axis=0, ignore_index=True)  # stdev,
-        series["network"] = series_name
+    for name in ["MAE", "RMSE", "R2"]:  # "STDEV"
+        series = metrics[name].copy()
+        series["metric"] = labels[name]
+        series["network"] = series.index
         series_list.append(series)
 
     # Making the final dataframe with all values
     concat_series = pd.concat(series_list, axis=0, ignore_index=True)
+    concat_series = concat_series[["metric", "network"] + engine.columns]
+
+    # Confidence intervals of every metric, when bootstrap is enabled in the config
+    bootstrap = config.get("bootstrap")
+    if bootstrap and bootstrap.get("enabled", False):
+        intervals = engine.bootstrap(
+            samples=bootstrap.get("samples", 1000),
+            batch=bootstrap.get("batch", 32),
+            confidence=bootstrap.get("confidence", 0.95),
+            seed=bootstrap.get("seed", 0),
+        )
+        intervals.to_csv(bootstrap["output"], index=False)
 
     # Plotting and saving the metrics as csv
-    st.plot(concat_series=concat_series, save_plot=config["plot"])
+    SimilarityTool.plot(concat_series=concat_series, save_plot=config["plot"])
     concat_series.to_csv(config["output"], index=False)
@@ -0,0 +1,147 @@
+import numpy as np
+import pyarrow.parquet as pq
+
+# Rows read at a time from the results files
+BATCH_ROWS = 262144
+
+
+def iter_norms(paths, columns, batch_rows=BATCH_ROWS):
+    """
+    Yields the norm of the given columns for each record batch of one or more parquet files
+    (e.g. the same model for several stations or years). NaN rows are skipped.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    for path in paths:
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=batch_rows, columns=list(columns)):
+            # Results are stored as float32, the sums are done in float64
+            values = np.column_stack(
+                [batch.column(column).to_numpy(zero_copy_only=False) for column in columns]
+            ).astype(np.float64, copy=False)
+            norms = np.sqrt(np.einsum("ij,ij->i", values, values))
+            yield norms[~np.isnan(norms)]
+
+
+class RunningMoments:
+    """Count, mean and population variance (ddof 0) merged batch by batch (Chan et al.)."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, values: np.ndarray) -> None:
+        if len(values) == 0:
+            return
+        other = RunningMoments()
+        other.count = len(values)
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        self.merge(other)
+
+    def merge(self, other: "RunningMoments") -> None:
+        count = self.count + other.count
+        if count == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+
+    @property
+    def std(self) -> float:
+        return np.sqrt(self.m2 / self.count) if self.count > 0 else np.nan
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch for non-negative values with logarithmic buckets: every
+    quantile is returned with a relative error below relative_accuracy, whatever the number
+    of values. Sketches with the same accuracy are merged by adding their bucket counts.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.005) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, values: np.ndarray) -> None:
+        if np.any(values < 0):
+            raise ValueError("QuantileSketch only accepts non-negative values.")
+        positive = values[values > 0]
+        self.zeros += len(values) - len(positive)
+        self.count += len(values)
+        keys, counts = np.unique(
+            np.ceil(np.log(positive) / self.log_gamma).astype(np.int64), return_counts=True
+        )
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.gamma != self.gamma:
+            raise ValueError("Sketches with different accuracies cannot be merged.")
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def percentile(self, q: float) -> float:
+        """Like np.percentile(values, q), within the relative accuracy."""
+        if self.count == 0:
+            return np.nan
+        rank = q / 100 * (self.count - 1)
+        if rank < self.zeros:
+            return 0.0
+        keys = np.array(sorted(self.buckets))
+        cumulative = self.zeros + np.cumsum([self.buckets[key] for key in keys])
+        key = keys[np.searchsorted(cumulative, rank, side="right")]
+        # Middle of the bucket (gamma^(key-1), gamma^key] in relative terms
+        return 2 * self.gamma**key / (self.gamma + 1)
+
+
+class StreamingHistogram:
+    """Bin counts of a fixed range, as np.histogram(values, bins, range) of all batches."""
+
+    def __init__(self, bins: int, value_range: list) -> None:
+        self.bins = bins
+        self.range = value_range
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.edges = None
+
+    def add(self, values: np.ndarray) -> None:
+        counts, self.edges = np.histogram(values, bins=self.bins, range=self.range)
+        self.counts += counts
+
+    def merge(self, other: "StreamingHistogram") -> None:
+        self.counts += other.counts
+        self.edges = other.edges if self.edges is None else self.edges
+
+    def percent(self) -> np.ndarray:
+        """Percentage of the values inside the range in each bin (density * width * 100)."""
+        if self.edges is None:
+            self.edges = np.histogram_bin_edges([], bins=self.bins, range=self.range)
+        total = self.counts.sum()
+        return self.counts / total * 100 if total > 0 else np.zeros(self.bins)
+
+
+def norm_summary(paths, columns, bins=None, value_range=None, quantiles=True):
+    """
+    Streams the norms of the files once and returns (moments, sketch, histogram). The
+    histogram is None when bins or value_range is missing, the sketch when quantiles is False.
+    """
+    moments = RunningMoments()
+    sketch = QuantileSketch() if quantiles else None
+    histogram = None
+    if bins is not None and value_range is not None:
+        histogram = StreamingHistogram(bins, value_range)
+    for norms in iter_norms(paths, columns):
+        moments.add(norms)
+        if sketch is not None:
+            sketch.add(norms)
+        if histogram is not None:
+            histogram.add(norms)
+    return moments, sketch, histogram
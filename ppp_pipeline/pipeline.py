@@ -0,0 +1,233 @@
+import os
+import sys
+import glob
+import json
+import time
+import fnmatch
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import yaml
+
+
+class Step:
+    """
+    A command with the files it reads (inputs) and writes (outputs), as glob patterns.
+    A step depends on every step whose outputs match one of its inputs, and on the steps
+    listed in after.
+    """
+
+    def __init__(self, name: str, config: dict) -> None:
+        self.name = name
+        self.command = config["command"]
+        self.inputs = list(config.get("inputs", []))
+        self.outputs = list(config.get("outputs", []))
+        self.after = list(config.get("after", []))
+        self.always = bool(config.get("always", False))
+
+    def produces(self, pattern: str) -> bool:
+        return any(
+            output == pattern
+            or fnmatch.fnmatch(output, pattern)
+            or fnmatch.fnmatch(pattern, output)
+            for output in self.outputs
+        )
+
+
+def expand(patterns: list) -> list:
+    files = set()
+    for pattern in patterns:
+        files.update(f for f in glob.glob(pattern, recursive=True) if os.path.isfile(f))
+    return sorted(files)
+
+
+class PipelineState:
+    """
+    JSON file with the signature of every step that ran successfully (hash of its command,
+    inputs and outputs) and a memo of file hashes by (size, mtime), so files that did not
+    change are never read again.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.steps = {}
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                state = json.load(f)
+            self.steps = state.get("steps", {})
+            self.files = state.get("files", {})
+
+    def file_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        memo = self.files.get(path)
+        if memo is not None and memo[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return memo[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        self.files[path] = [stat.st_size, stat.st_mtime_ns, h.hexdigest()]
+        return h.hexdigest()
+
+    def signature(self, patterns: list) -> str:
+        h = hashlib.sha256()
+        for path in expand(patterns):
+            h.update(path.encode())
+            h.update(self.file_hash(path).encode())
+        return h.hexdigest()
+
+    def save(self) -> None:
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({"steps": self.steps, "files": self.files}, f, indent=1)
+        os.replace(self.path + ".tmp", self.path)
+
+
+class Pipeline:
+    def __init__(self, config: dict) -> None:
+        self.steps = {name: Step(name, step) for name, step in config["steps"].items()}
+        self.state = PipelineState(config.get("state", "data/pipeline_state.json"))
+        self.workers = int(config.get("workers", 1))
+        self.dependencies = {name: self._dependencies(step) for name, step in self.steps.items()}
+
+    def _dependencies(self, step: Step) -> set:
+        dependencies = set(step.after)
+        for other in self.steps.values():
+            if other.name != step.name and any(other.produces(p) for p in step.inputs):
+                dependencies.add(other.name)
+        unknown = dependencies - set(self.steps)
+        if unknown:
+            raise ValueError(f"Step {step.name} runs after unknown steps {sorted(unknown)}.")
+        return dependencies
+
+    def selected(self, targets: list) -> list:
+        """The targets and everything they depend on, in the order of the file."""
+        if not targets:
+            return list(self.steps)
+        needed = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in self.steps:
+                raise ValueError(f"Unknown step {name}.")
+            if name not in needed:
+                needed.add(name)
+                pending.extend(self.dependencies[name])
+        return [name for name in self.steps if name in needed]
+
+    def stale_reason(self, step: Step) -> str | None:
+        """Why the step has to run, or None if its outputs are up to date."""
+        if step.always:
+            return "always runs"
+        recorded = self.state.steps.get(step.name)
+        if recorded is None:
+            return "never ran"
+        missing = [p for p in step.outputs if len(expand([p])) == 0]
+        if missing:
+            return f"missing {missing[0]}"
+        if recorded["command"] != step.command:
+            return "command changed"
+        if recorded["inputs"] != self.state.signature(step.inputs):
+            return "inputs changed"
+        if recorded["outputs"] != self.state.signature(step.outputs):
+            return "outputs changed"
+        return None
+
+    @staticmethod
+    def _run_step(step: Step) -> tuple:
+        start = time.perf_counter()
+        result = subprocess.run(step.command, shell=True)
+        return result.returncode, time.perf_counter() - start
+
+    def run(self, targets: list | None = None, force: list | None = None, dry_run: bool = False) -> bool:
+        """
+        Runs the stale steps of the targets. A step is checked only once all its
+        dependencies finished, and steps whose dependencies are done run in parallel.
+        Returns False if a step failed (its dependents are skipped).
+        """
+        order = self.selected(targets or [])
+        force = set(force or [])
+        done, failed, ran = set(), set(), set()
+        running, inputs = {}, {}
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            while len(done) + len(failed) < len(order):
+                settled = len(done) + len(failed)
+                for name in order:
+                    if name in done or name in failed or name in running.values():
+                        continue
+                    dependencies = self.dependencies[name] & set(order)
+                    if dependencies & failed:
+                        print(f"[skip] {name}: a dependency failed")
+                        failed.add(name)
+                        continue
+                    if not dependencies <= done:
+                        continue
+                    step = self.steps[name]
+                    reason = "forced" if name in force else self.stale_reason(step)
+                    if reason is None and not (dependencies & ran and dry_run):
+                        print(f"[ok] {name}")
+                        done.add(name)
+                        continue
+                    if dry_run:
+                        print(f"[would run] {name}: {reason or 'a dependency would run'}")
+                        done.add(name)
+                        ran.add(name)
+                        continue
+                    print(f"[run] {name}: {reason}\n      {step.command}")
+                    # Inputs are hashed before running, so a change made meanwhile is caught next time
+                    inputs[name] = self.state.signature(step.inputs)
+                    running[pool.submit(self._run_step, step)] = name
+                if not running:
+                    if len(done) + len(failed) == settled:
+                        raise ValueError("The steps have circular dependencies.")
+                    continue
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    step = self.steps[name]
+                    returncode, elapsed = future.result()
+                    if returncode != 0:
+                        print(f"[failed] {name} returned {returncode} after {elapsed:.1f} s")
+                        failed.add(name)
+                        continue
+                    self.state.steps[name] = {
+                        "command": step.command,
+                        "inputs": inputs.pop(name),
+                        "outputs": self.state.signature(step.outputs),
+                        "seconds": elapsed,
+                    }
+                    self.state.save()
+                    print(f"[done] {name} in {elapsed:.1f} s")
+                    done.add(name)
+                    ran.add(name)
+        finally:
+            pool.shutdown()
+            if not dry_run:
+                self.state.save()
+        return len(failed) == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Runs the steps of the pipeline whose inputs, outputs or command changed."
+    )
+    parser.add_argument(
+        "-c",
+        "-config",
+        type=argparse.FileType("r"),
+        default="configurations/pipeline.yaml",
+    )
+    parser.add_argument("targets", nargs="*", help="steps to bring up to date (default: all)")
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    parser.add_argument("-f", "--force", nargs="*", default=[], help="steps run even if up to date")
+    parser.add_argument("-n", "--dry-run", action="store_true")
+    parsed_args = parser.parse_args()
+
+    config = yaml.safe_load(parsed_args.c)
+    if parsed_args.workers is not None:
+        config["workers"] = parsed_args.workers
+    pipeline = Pipeline(config)
+    succeeded = pipeline.run(parsed_args.targets, parsed_args.force, parsed_args.dry_run)
+    sys.exit(0 if succeeded else 1)
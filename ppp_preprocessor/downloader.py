@@ -0,0 +1,237 @@
+import os
+import time
+import shutil
+import ftplib
+import subprocess
+import zipfile
+import threading
+import http.client
+from urllib.parse import urlsplit, urljoin
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+
+
+class PermanentError(Exception):
+    """The file does not exist on the server. Retrying will not help."""
+
+
+class Downloader:
+    """
+    Downloads many files at the same time with a bounded pool of threads.
+
+    Every thread keeps one open connection per host (HTTP keep-alive or an FTP session),
+    failed transfers are retried with exponential backoff and continue from the bytes
+    already saved in {file}.part (HTTP Range or FTP REST). A file only takes its final name
+    after it passes validate(), so a truncated zip or .Z never counts as present, and files
+    found with their final name are not tested again. close() closes the connections, which
+    download_all does once its threads are done.
+    """
+
+    def __init__(
+        self, workers: int = 4, retries: int = 3, backoff: float = 1.0, timeout: float = 60
+    ) -> None:
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        # {thread id: {(scheme, netloc): connection}}
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def validate(file: str) -> bool:
+        if not os.path.exists(file) or os.path.getsize(file) == 0:
+            return False
+        if file.endswith(".zip") or file.endswith(".zip.part"):
+            if not zipfile.is_zipfile(file):
+                return False
+            try:
+                with zipfile.ZipFile(file) as z:
+                    return z.testzip() is None
+            except (zipfile.BadZipFile, OSError):
+                return False
+        if file.endswith(".Z") or file.endswith(".Z.part"):
+            # Unix compress magic number, then the whole file is decompressed by gzip
+            with open(file, "rb") as f:
+                if f.read(2) != b"\x1f\x9d":
+                    return False
+            if shutil.which("gzip") is None:
+                return True
+            return subprocess.run(["gzip", "-t", file], capture_output=True).returncode == 0
+        return True
+
+    @staticmethod
+    def _expected_size(response: http.client.HTTPResponse, offset: int) -> int | None:
+        """Size of the whole file announced by a 200 or 206 response (None if unknown)."""
+        content_range = response.getheader("Content-Range", "")
+        if response.status == 206 and "/" in content_range:
+            total = content_range.rsplit("/", 1)[1].strip()
+            if total.isdigit():
+                return int(total)
+        length = response.getheader("Content-Length")
+        if length is None or not length.isdigit():
+            return None
+        return int(length) + (offset if response.status == 206 else 0)
+
+    def _connections(self) -> dict:
+        with self._lock:
+            return self._pools.setdefault(threading.get_ident(), {})
+
+    def close(self) -> None:
+        """Closes the connections of every thread."""
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for connections in pools.values():
+            for connection in connections.values():
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+
+    def _drop_connection(self, key: tuple) -> None:
+        connection = self._connections().pop(key, None)
+        if connection is None:
+            return
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _http_connection(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        key = (scheme, netloc)
+        connections = self._connections()
+        if key not in connections:
+            if scheme == "https":
+                connections[key] = http.client.HTTPSConnection(netloc, timeout=self.timeout)
+            else:
+                connections[key] = http.client.HTTPConnection(netloc, timeout=self.timeout)
+        return connections[key]
+
+    def _ftp_connection(self, netloc: str) -> ftplib.FTP:
+        key = ("ftp", netloc)
+        connections = self._connections()
+        if key not in connections:
+            parts = urlsplit(f"ftp://{netloc}")
+            ftp = ftplib.FTP(timeout=self.timeout)
+            ftp.connect(parts.hostname, parts.port or 21)
+            ftp.login(parts.username or "anonymous", parts.password or "anonymous@")
+            ftp.voidcmd("TYPE I")
+            connections[key] = ftp
+        return connections[key]
+
+    def _download_http(self, url: str, part_file: str, redirects: int = 5) -> None:
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+        headers = {"Connection": "keep-alive"}
+        if offset > 0:
+            headers["Range"] = f"bytes={offset}-"
+        connection = self._http_connection(parts.scheme, parts.netloc)
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            body = response.read() if response.status not in (200, 206) else None
+        except (http.client.HTTPException, OSError):
+            self._drop_connection(key)
+            raise
+        if response.status in (301, 302, 303, 307, 308) and redirects > 0:
+            location = urljoin(url, response.getheader("Location"))
+            return self._download_http(location, part_file, redirects - 1)
+        if response.status == 416:
+            return  # the partial file is already complete
+        if response.status in (403, 404, 410):
+            raise PermanentError(f"{url} returned {response.status}")
+        if body is not None:
+            raise OSError(f"{url} returned {response.status}")
+        # 206 continues the partial file, 200 sends the whole file again
+        mode = "ab" if response.status == 206 else "wb"
+        expected = self._expected_size(response, offset)
+        try:
+            with open(part_file, mode) as f:
+                while True:
+                    block = response.read(1 << 16)
+                    if not block:
+                        break
+                    f.write(block)
+        except (http.client.HTTPException, OSError):
+            # The rest of the body may still come on this connection
+            self._drop_connection(key)
+            raise
+        # A .Z file has no length of its own, so a short body is only caught here
+        size = os.path.getsize(part_file)
+        if expected is not None and size != expected:
+            self._drop_connection(key)
+            raise OSError(f"{url} ended after {size} of {expected} bytes")
+        if response.getheader("Connection", "").lower() == "close":
+            self._drop_connection(key)
+
+    def _download_ftp(self, url: str, part_file: str) -> None:
+        parts = urlsplit(url)
+        key = ("ftp", parts.netloc)
+        offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+        ftp = self._ftp_connection(parts.netloc)
+        try:
+            try:
+                expected = ftp.size(parts.path)
+            except ftplib.error_perm:
+                expected = None  # SIZE is not supported, or the file is missing (RETR says)
+            with open(part_file, "ab" if offset > 0 else "wb") as f:
+                ftp.retrbinary(f"RETR {parts.path}", f.write, rest=offset or None)
+            size = os.path.getsize(part_file)
+            if expected is not None and size != expected:
+                raise EOFError(f"{url} ended after {size} of {expected} bytes")
+        except ftplib.error_perm as e:
+            if str(e).startswith("550"):
+                raise PermanentError(f"{url}: {e}")
+            self._drop_connection(key)
+            raise
+        except (ftplib.Error, EOFError, OSError):
+            self._drop_connection(key)
+            raise
+
+    def fetch(self, urls: list | str, file: str) -> bool:
+        """
+        Downloads file from the first url that has it (the others are fallbacks, e.g. the
+        rapid product when the final one is missing). Returns True if file is present.
+        """
+        if os.path.exists(file) and os.path.getsize(file) > 0:
+            return True
+        urls = [urls] if isinstance(urls, str) else list(urls)
+        part_file = file + ".part"
+        for url in urls:
+            for attempt in range(self.retries + 1):
+                try:
+                    if url.startswith("ftp://"):
+                        self._download_ftp(url, part_file)
+                    else:
+                        self._download_http(url, part_file)
+                    if self.validate(part_file):
+                        os.replace(part_file, file)
+                        return True
+                    # A corrupted transfer cannot be resumed
+                    os.unlink(part_file)
+                    print(f"File {file} from {url} is not valid.")
+                except PermanentError as e:
+                    print(f"Failed to download {file}: {e}")
+                    break
+                except (http.client.HTTPException, ftplib.Error, EOFError, OSError) as e:
+                    print(f"Failed to download {file} from {url} ({e}).")
+                if attempt < self.retries:
+                    time.sleep(self.backoff * 2**attempt)
+            if os.path.exists(part_file):
+                os.unlink(part_file)
+        return False
+
+    def download_all(self, jobs: list) -> dict:
+        """Downloads a list of (urls, file) jobs. Returns {file: present}."""
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = {file: pool.submit(self.fetch, urls, file) for urls, file in jobs}
+                results = {}
+                for file, future in tqdm(futures.items()):
+                    results[file] = future.result()
+        finally:
+            # The threads are gone, nothing would reuse their connections
+            self.close()
+        return results
@@ -0,0 +1,251 @@
+import os
+import sys
+import shlex
+import tempfile
+import queue
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, Future
+from rtklib_library import check_args, DEFAULT_LIBRARY
+
+# Runs one rnx2rtkp job of a shared library: python rtklib_library.py <library> <args>
+LIBRARY_RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rtklib_library.py")
+
+
+class Executor:
+    """
+    Runs the PPP executable. Every backend has a concurrency limit, shared by run() and
+    submit(), and submit() puts the job in a queue served by that many threads.
+
+    Executors can be sent to worker processes: the running threads and processes are not
+    pickled and every worker starts its own when it runs the first job.
+    """
+
+    def __init__(self, concurrency: int = 1) -> None:
+        self.concurrency = max(1, int(concurrency))
+        self._semaphore = threading.BoundedSemaphore(self.concurrency)
+        self._pool = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_semaphore"] = None
+        state["_pool"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._semaphore = threading.BoundedSemaphore(self.concurrency)
+
+    def command(self, args: list) -> str:
+        """Command line of a job, for printing."""
+        raise NotImplementedError
+
+    def _run(self, args: list, cwd: str) -> subprocess.CompletedProcess:
+        raise NotImplementedError
+
+    def run(self, args: list, cwd: str = ".") -> subprocess.CompletedProcess:
+        """Runs a job and waits for it. stdout and stderr are returned as text."""
+        with self._semaphore:
+            return self._run([str(a) for a in args], cwd)
+
+    def submit(self, args: list, cwd: str = ".") -> Future:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        return self._pool.submit(self.run, args, cwd)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+class LocalExecutor(Executor):
+    """
+    Runs a local binary, e.g. ./rnx2rtkp. The command may have several words, so a fake
+    executable (python fake_rnx2rtkp.py) can stand in for rtklib.
+    """
+
+    def __init__(self, command: str | list, concurrency: int = 1) -> None:
+        super().__init__(concurrency)
+        self.prefix = shlex.split(command) if isinstance(command, str) else list(command)
+
+    def command(self, args: list) -> str:
+        return shlex.join(self.prefix + [str(a) for a in args])
+
+    def _run(self, args: list, cwd: str) -> subprocess.CompletedProcess:
+        command = self.prefix + args
+        if not hasattr(os, "wait4"):
+            return subprocess.run(command, cwd=cwd, capture_output=True, text=True)
+        # The output goes to files, so the child can be reaped with wait4, which also
+        # returns its resource usage (peak RSS and block IO, kept in result.rusage)
+        with tempfile.TemporaryFile("w+") as out, tempfile.TemporaryFile("w+") as err:
+            process = subprocess.Popen(command, cwd=cwd, stdout=out, stderr=err)
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            out.seek(0)
+            err.seek(0)
+            result = subprocess.CompletedProcess(
+                command, process.returncode, stdout=out.read(), stderr=err.read()
+            )
+        result.rusage = usage
+        return result
+
+
+class DockerExecExecutor(LocalExecutor):
+    """
+    Runs every job with its own docker exec call. Paths are relative to the container.
+    The resource usage of a job is the one of the docker client, not of the binary.
+    """
+
+    def __init__(self, container: str, binary: str, concurrency: int = 1) -> None:
+        super().__init__(["docker", "exec", container] + shlex.split(binary), concurrency)
+        self.container = container
+        self.binary = shlex.split(binary)
+
+
+class DockerBatchExecutor(Executor):
+    """
+    Keeps long-lived shells inside the container (one per concurrent job) and sends them one
+    job per line, which avoids a docker exec round trip for every day. Each shell answers
+    with the output of the job followed by a marker line with its return code.
+    """
+
+    MARKER = "__batch_ppp_done__"
+
+    def __init__(self, container: str, binary: str, concurrency: int = 1) -> None:
+        super().__init__(concurrency)
+        self.container = container
+        self.binary = shlex.split(binary)
+        self._shells = None
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["_shells"] = None
+        return state
+
+    def command(self, args: list) -> str:
+        return shlex.join(self.binary + [str(a) for a in args])
+
+    def _start_shell(self) -> subprocess.Popen:
+        loop = (
+            'while IFS= read -r line; do eval "$line" > /tmp/batch_ppp.$$ 2>&1; rc=$?; '
+            f'cat /tmp/batch_ppp.$$; printf "\\n{self.MARKER} %d\\n" "$rc"; done'
+        )
+        return subprocess.Popen(
+            ["docker", "exec", "-i", self.container, "sh", "-c", loop],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+
+    def _take_shell(self) -> subprocess.Popen:
+        if self._shells is None:
+            self._shells = queue.Queue()
+            for _ in range(self.concurrency):
+                self._shells.put(None)  # started on first use
+        shell = self._shells.get()
+        if shell is None or shell.poll() is not None:
+            shell = self._start_shell()
+        return shell
+
+    def _run(self, args: list, cwd: str) -> subprocess.CompletedProcess:
+        shell = self._take_shell()
+        lines = []
+        returncode = None
+        try:
+            shell.stdin.write(shlex.join(self.binary + args) + "\n")
+            shell.stdin.flush()
+            for line in shell.stdout:
+                if line.startswith(self.MARKER):
+                    returncode = int(line.split()[1])
+                    break
+                lines.append(line)
+        finally:
+            self._shells.put(shell if returncode is not None else None)
+        if returncode is None:
+            raise RuntimeError(f"The batch process in {self.container} stopped.")
+        # The last line is the newline printed before the marker
+        stdout = "".join(lines)[:-1]
+        return subprocess.CompletedProcess(args, returncode, stdout=stdout, stderr="")
+
+    def close(self) -> None:
+        super().close()
+        if self._shells is None:
+            return
+        while not self._shells.empty():
+            shell = self._shells.get()
+            if shell is not None and shell.poll() is None:
+                shell.stdin.close()
+                shell.wait()
+        self._shells = None
+
+
+class LibraryExecutor(LocalExecutor):
+    """
+    Calls rnx2rtkp from librtklib.so (rtklib_docker/build_library.sh), so neither the binary
+    nor a container is needed. Paths are relative to cwd.
+
+    Every job runs in its own Python process (LIBRARY_RUNNER), which loads the library:
+    RTKLIB keeps the state of a run in global variables, and an exit() or a crash inside it
+    then ends that job only, with its status as return code. Arguments that would make
+    rnx2rtkp print its help and exit are refused beforehand.
+    """
+
+    def __init__(self, library: str = DEFAULT_LIBRARY, concurrency: int = 1) -> None:
+        library = os.path.abspath(library)
+        if not os.path.exists(library):
+            raise FileNotFoundError(
+                f"{library} not found. Build it with sh rtklib_docker/build_library.sh."
+            )
+        super().__init__([sys.executable, LIBRARY_RUNNER, library], concurrency)
+        self.library = library
+
+    def command(self, args: list) -> str:
+        return shlex.join([f"{os.path.basename(self.library)}:rnx2rtkp"] + [str(a) for a in args])
+
+    def _run(self, args: list, cwd: str) -> subprocess.CompletedProcess:
+        if "--help" in args:
+            return subprocess.CompletedProcess(args, 0, stdout=f"rnx2rtkp in {self.library}", stderr="")
+        problem = check_args(args, cwd)
+        if problem is not None:
+            return subprocess.CompletedProcess(args, 1, stdout="", stderr=problem)
+        return super()._run(args, cwd)
+
+
+def make_executor(process_config) -> Executor:
+    """
+    Builds the executor from process.executor (backend: local, docker_exec, docker_batch or
+    library, container, binary, library, concurrency). Without it, ppp_executable is used
+    as before: a "docker exec <container> <binary>" command becomes docker_exec, anything else local.
+    """
+    executor_config = process_config.get("executor") or {}
+    ppp_executable = process_config.get("ppp_executable")
+    # Windows of a split day run at the same time unless a concurrency is given
+    concurrency = executor_config.get(
+        "concurrency", process_config.get("windows_per_day", 1)
+    )
+    backend = executor_config.get("backend")
+    container = executor_config.get("container")
+    binary = executor_config.get("binary")
+
+    words = shlex.split(ppp_executable)
+    if words[:2] == ["docker", "exec"]:
+        # docker exec [options] <container> <binary...>
+        rest = [w for w in words[2:] if not w.startswith("-")]
+        container = container or rest[0]
+        binary = binary or shlex.join(rest[1:])
+        backend = backend or "docker_exec"
+    else:
+        binary = binary or ppp_executable
+        backend = backend or "local"
+
+    if backend == "local":
+        return LocalExecutor(binary, concurrency)
+    elif backend == "docker_exec":
+        return DockerExecExecutor(container, binary, concurrency)
+    elif backend == "docker_batch":
+        return DockerBatchExecutor(container, binary, concurrency)
+    elif backend == "library":
+        return LibraryExecutor(executor_config.get("library", DEFAULT_LIBRARY), concurrency)
+    raise ValueError(f"Unknown executor backend {backend}.")
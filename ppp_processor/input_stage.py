@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import shutil
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl. Experiments must not overlap there.
+    fcntl = None
+
+
+class SharedInputStage:
+    """
+    Unpacks each station-day archive only once and shares the extracted obs/nav files
+    between all the experiments of a Hydra multirun.
+
+    Every archive gets its own folder with a manifest.json, which records the files that
+    were extracted, the experiments using them right now (active) and the experiments that
+    already used them (consumers). The manifest is only changed while holding a file lock,
+    so experiments running at the same time never extract the same day twice.
+
+    With max_bytes, the folder works as a bounded cache: after each extraction the least
+    recently used days that nobody is holding are removed until the total size fits.
+    Prefetched days are held ("prefetch:pid", with the pid of the process that created the
+    stage, i.e. the run) until an acquire of that same run, so another experiment using the
+    day does not drop the hold.
+
+    The .lock files are never removed. A process may already be waiting on a lock file, and
+    removing it would let a newer process lock a fresh file and enter at the same time.
+    """
+
+    MANIFEST = "manifest.json"
+    PREFETCH = "prefetch"
+
+    def __init__(self, folder: str, max_bytes: int | None = None) -> None:
+        self.folder = folder
+        self.max_bytes = max_bytes
+        # Workers get a copy of the stage, so their acquires know which run prefetched
+        self._owner = os.getpid()
+        # Archives warmed by this process and still held for their first acquire
+        self._prefetched = set()
+
+    @staticmethod
+    def scratch_folder(fallback: str) -> str:
+        """Returns a folder in tmpfs (/dev/shm) if the system has one, otherwise fallback."""
+        if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+            return os.path.join("/dev/shm", "batch_ppp")
+        return fallback
+
+    def day_folder(self, archive_path: str) -> str:
+        # data/onrj/2015/onrj0041.zip -> {folder}/onrj/2015/onrj0041
+        year_folder, fname = os.path.split(os.path.abspath(archive_path))
+        station_folder, year = os.path.split(year_folder)
+        station = os.path.basename(station_folder)
+        return os.path.join(self.folder, station, year, fname.rsplit(".", 1)[0])
+
+    @contextmanager
+    def _locked(self, day_folder: str):
+        os.makedirs(os.path.dirname(day_folder), exist_ok=True)
+        with open(day_folder + ".lock", "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_manifest(self, day_folder: str) -> dict | None:
+        manifest_path = os.path.join(day_folder, self.MANIFEST)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+
+    def _write_manifest(self, day_folder: str, manifest: dict) -> None:
+        manifest_path = os.path.join(day_folder, self.MANIFEST)
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    @staticmethod
+    def _alive(holder: str) -> bool:
+        # Holders are stored as "experiment:pid". A dead pid means a crashed run.
+        pid = int(holder.rsplit(":", 1)[-1])
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _extract(self, archive_path: str, day_folder: str) -> dict:
+        if os.path.exists(day_folder):
+            shutil.rmtree(day_folder)
+        # Unpacking into a temporary folder first, so a failed extraction never looks complete
+        partial_folder = f"{day_folder}.partial-{os.getpid()}"
+        shutil.unpack_archive(archive_path, partial_folder)
+        os.replace(partial_folder, day_folder)
+        stat = os.stat(archive_path)
+        files = sorted(os.listdir(day_folder))
+        return {
+            "archive": os.path.abspath(archive_path),
+            "archive_size": stat.st_size,
+            "archive_mtime": stat.st_mtime,
+            "files": files,
+            "size": sum(os.path.getsize(os.path.join(day_folder, f)) for f in files),
+            "last_used": time.time(),
+            "active": [],
+            "consumers": [],
+        }
+
+    def _ensure_extracted(
+        self, archive_path: str, day_folder: str
+    ) -> tuple[dict, bool]:
+        # Must be called while holding the lock of day_folder
+        manifest = self._read_manifest(day_folder)
+        if manifest is not None:
+            manifest["active"] = [h for h in manifest["active"] if self._alive(h)]
+            stat = os.stat(archive_path)
+            changed = (manifest["archive_size"], manifest["archive_mtime"]) != (
+                stat.st_size,
+                stat.st_mtime,
+            )
+            missing = any(
+                not os.path.exists(os.path.join(day_folder, f))
+                for f in manifest["files"]
+            )
+            if (changed or missing) and len(manifest["active"]) == 0:
+                manifest = None
+        if manifest is None:
+            return self._extract(archive_path, day_folder), True
+        return manifest, False
+
+    def acquire(self, archive_path: str, consumer: str) -> str:
+        """Returns the folder with the extracted files, unpacking the archive if needed."""
+        day_folder = self.day_folder(archive_path)
+        with self._locked(day_folder):
+            manifest, extracted = self._ensure_extracted(archive_path, day_folder)
+            manifest["last_used"] = time.time()
+            # The first acquire of this run takes over the hold of its prefetch
+            prefetch_holder = self._prefetch_holder()
+            if prefetch_holder in manifest["active"]:
+                manifest["active"].remove(prefetch_holder)
+            manifest["active"].append(f"{consumer}:{os.getpid()}")
+            if consumer not in manifest["consumers"]:
+                manifest["consumers"].append(consumer)
+            self._write_manifest(day_folder, manifest)
+        if extracted:
+            self.evict()
+        return day_folder
+
+    def warm(self, archive_path: str) -> None:
+        """
+        Unpacks an archive ahead of time. The day is held until it is acquired (or until
+        release_prefetched), so evict cannot remove it before its worker gets to it.
+        """
+        day_folder = self.day_folder(archive_path)
+        holder = self._prefetch_holder()
+        try:
+            with self._locked(day_folder):
+                manifest, extracted = self._ensure_extracted(archive_path, day_folder)
+                if holder not in manifest["active"]:
+                    manifest["active"].append(holder)
+                self._write_manifest(day_folder, manifest)
+            self._prefetched.add(archive_path)
+        except Exception as e:
+            # The day will be unpacked (and the error reported) when it is acquired
+            print(f"Could not prefetch {archive_path}: {e}")
+            return
+        if extracted:
+            self.evict(keep=day_folder)
+
+    def _manifests(self):
+        if not os.path.exists(self.folder):
+            return
+        for root, dirs, files in os.walk(self.folder):
+            if self.MANIFEST in files:
+                dirs.clear()  # day folders hold only the extracted files
+                yield root
+
+    def evict(self, keep: str | None = None) -> int:
+        """Removes the least recently used idle days while the folder is above max_bytes."""
+        if self.max_bytes is None:
+            return 0
+        entries = []
+        for day_folder in self._manifests():
+            manifest = self._read_manifest(day_folder)
+            if manifest is not None:
+                entries.append(
+                    (manifest.get("last_used", 0), manifest.get("size", 0), day_folder)
+                )
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, day_folder in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if day_folder == keep:
+                continue
+            with self._locked(day_folder):
+                manifest = self._read_manifest(day_folder)
+                if manifest is None:
+                    continue
+                if any(self._alive(h) for h in manifest["active"]):
+                    continue
+                shutil.rmtree(day_folder)
+            total -= size
+            removed += 1
+        return removed
+
+    def _prefetch_holder(self) -> str:
+        return f"{self.PREFETCH}:{self._owner}"
+
+    def release(self, archive_path: str, consumer: str) -> None:
+        self._drop_holder(archive_path, f"{consumer}:{os.getpid()}")
+
+    def _drop_holder(self, archive_path: str, holder: str) -> None:
+        day_folder = self.day_folder(archive_path)
+        with self._locked(day_folder):
+            manifest = self._read_manifest(day_folder)
+            if manifest is None:
+                return
+            if holder in manifest["active"]:
+                manifest["active"].remove(holder)
+            self._write_manifest(day_folder, manifest)
+
+    def release_prefetched(self) -> None:
+        """Drops the holds of the days this process warmed (e.g. days that were skipped)."""
+        for archive_path in self._prefetched:
+            self._drop_holder(archive_path, self._prefetch_holder())
+        self._prefetched.clear()
+
+    def cleanup(self, consumers: list | None = None) -> int:
+        """
+        Removes the extracted days that nobody is using. If consumers is given, a day is
+        only removed after all of those experiments used it. Returns the number of removed days.
+        """
+        removed = 0
+        for root in list(self._manifests()):
+            with self._locked(root):
+                manifest = self._read_manifest(root)
+                if manifest is None:
+                    continue
+                if any(self._alive(h) for h in manifest["active"]):
+                    continue
+                if consumers is not None and not set(consumers).issubset(
+                    manifest["consumers"]
+                ):
+                    continue
+                shutil.rmtree(root)
+            removed += 1
+        return removed
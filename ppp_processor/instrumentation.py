@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import argparse
+import threading
+from contextlib import contextmanager
+import pandas as pd
+
+try:
+    import fcntl
+    import resource
+except ImportError:  # Windows: no file locks and no resource usage in the run log
+    fcntl = None
+    resource = None
+
+# Stages timed for every day, in the order they happen
+STAGES = ["unpack", "render", "run", "parse", "transform", "write"]
+
+# Characters of the executable's stderr kept in the log
+STDERR_CHARS = 2000
+
+
+def run_log_path(save_as: str) -> str:
+    """Run log of a results file, e.g. data/unet/onrj.runlog.jsonl."""
+    return os.path.splitext(save_as)[0] + ".runlog.jsonl"
+
+
+def process_io() -> dict:
+    """Bytes read and written by this process so far (Linux only, empty elsewhere)."""
+    try:
+        with open("/proc/self/io", "r") as f:
+            fields = dict(line.split(":") for line in f.read().splitlines())
+    except OSError:
+        return {}
+    return {"read_bytes": int(fields["rchar"]), "write_bytes": int(fields["wchar"])}
+
+
+def max_rss_kb() -> int | None:
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class StageTimer:
+    """
+    Wall time of the stages of one day, plus what is known about the executable runs
+    (return code, stderr, peak RSS and block IO of the child process). Times of a stage that
+    happens several times in a day (e.g. one run per window) are added.
+    """
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.io = process_io()
+        self.times = {}
+        self.status = None
+        self.processes = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.times[name] = self.times.get(name, 0.0) + elapsed
+
+    def add_process(self, result) -> None:
+        """Keeps the return code, stderr and resource usage of a finished executable run."""
+        usage = getattr(result, "rusage", None)
+        with self._lock:
+            self.processes.append(
+                {
+                    "returncode": result.returncode,
+                    "stderr": (result.stderr or "")[-STDERR_CHARS:],
+                    "max_rss_kb": None if usage is None else usage.ru_maxrss,
+                    "block_read_bytes": None if usage is None else usage.ru_inblock * 512,
+                    "block_write_bytes": None if usage is None else usage.ru_oublock * 512,
+                }
+            )
+
+    def record(self, **fields) -> dict:
+        record = dict(fields)
+        record["status"] = self.status
+        record["total_s"] = time.perf_counter() - self.start
+        for name in STAGES:
+            record[f"{name}_s"] = self.times.get(name)
+        for name in self.times:
+            if name not in STAGES:
+                record[f"{name}_s"] = self.times[name]
+        io = process_io()
+        for key, value in io.items():
+            record[key] = value - self.io.get(key, 0)
+        record["worker_max_rss_kb"] = max_rss_kb()
+        record["runs"] = len(self.processes)
+        if len(self.processes) > 0:
+            codes = [p["returncode"] for p in self.processes]
+            record["returncode"] = max(codes, key=abs)
+            rss = [p["max_rss_kb"] for p in self.processes if p["max_rss_kb"] is not None]
+            record["child_max_rss_kb"] = max(rss) if rss else None
+            for key in ["block_read_bytes", "block_write_bytes"]:
+                values = [p[key] for p in self.processes if p[key] is not None]
+                record[f"child_{key}"] = sum(values) if values else None
+            stderr = [p["stderr"] for p in self.processes if p["stderr"]]
+            record["stderr"] = stderr[-1] if stderr else ""
+        return record
+
+
+class RunLog:
+    """
+    JSON lines file with one record per processed day (kind "day") and per final step of a
+    run (kind "run"). Worker processes append to it directly, one locked write per record,
+    so the log is complete up to the last finished day even if the run is interrupted.
+    """
+
+    def __init__(self, path: str, run_id: str) -> None:
+        self.path = path
+        self.run_id = run_id
+
+    def append(self, record: dict) -> None:
+        record = {"run_id": self.run_id, "time": pd.Timestamp.now().isoformat(), **record}
+        line = json.dumps(record, default=str) + "\n"
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(line)
+                f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def read_run_log(path: str, run: str = "last") -> pd.DataFrame:
+    """Records of a run log: the last run, all runs or the run with the given run_id."""
+    df = pd.read_json(path, lines=True, convert_dates=False, dtype={"run_id": str})
+    if run == "last":
+        df = df[df["run_id"] == df["run_id"].iloc[-1]]
+    elif run != "all":
+        df = df[df["run_id"] == run]
+    return df.reset_index(drop=True)
+
+
+def summary(df: pd.DataFrame) -> str:
+    """Where the time of the days went: totals, share, mean and p95 of every stage."""
+    days = df[df["kind"] == "day"]
+    lines = [f"{len(days)} days in {df['run_id'].nunique()} run(s)"]
+    lines.append("status: " + ", ".join(f"{k} {v}" for k, v in days["status"].value_counts().items()))
+
+    stage_columns = [f"{name}_s" for name in STAGES if f"{name}_s" in days]
+    stage_columns += [
+        c for c in days.columns if c.endswith("_s") and c not in stage_columns and c != "total_s"
+    ]
+    total = days["total_s"].sum()
+    table = pd.DataFrame(
+        {
+            "total_s": days[stage_columns].sum(),
+            "share_%": days[stage_columns].sum() / total * 100,
+            "mean_s": days[stage_columns].mean(),
+            "p95_s": days[stage_columns].quantile(0.95),
+            "days": days[stage_columns].count(),
+        }
+    )
+    table.index = [c[:-2] for c in stage_columns]
+    table.loc["other"] = [
+        total - table["total_s"].sum(),
+        100 - table["share_%"].sum(),
+        None,
+        None,
+        len(days),
+    ]
+    table.loc["day total"] = [total, 100.0, days["total_s"].mean(), days["total_s"].quantile(0.95), len(days)]
+    lines.append(table.to_string(float_format=lambda v: f"{v:.3f}"))
+
+    run_steps = df[df["kind"] == "run"]
+    for _, step in run_steps.iterrows():
+        lines.append(f"{step['step']}: {step['total_s']:.3f} s")
+
+    if "child_max_rss_kb" in days and days["child_max_rss_kb"].notna().any():
+        lines.append(f"peak RSS of the executable: {days['child_max_rss_kb'].max() / 1024:.1f} MB")
+    if "worker_max_rss_kb" in days and days["worker_max_rss_kb"].notna().any():
+        lines.append(f"peak RSS of the workers: {days['worker_max_rss_kb'].max() / 1024:.1f} MB")
+    for key in ["read_bytes", "write_bytes"]:
+        if key in days:
+            lines.append(f"{key.replace('_', ' ')} by the workers: {days[key].sum() / 1024**2:.1f} MB")
+
+    if "returncode" in days:
+        failed = days[days["returncode"].fillna(0) != 0]
+        for _, day in failed.iterrows():
+            lines.append(f"{day['day']} returned {int(day['returncode'])}: {str(day.get('stderr', '')).strip()[-200:]}")
+    slowest = days.nlargest(5, "total_s")
+    lines.append("slowest days: " + ", ".join(f"{d} ({t:.2f} s)" for d, t in zip(slowest["day"], slowest["total_s"])))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Shows where the days of a batch run spent their time."
+    )
+    parser.add_argument("save_array_as", help="results file of the run, or its .runlog.jsonl")
+    parser.add_argument("-r", "--run", default="last", help="last (default), all or a run_id")
+    parser.add_argument("-p", "--parquet", help="also writes the records to this parquet file")
+    parsed_args = parser.parse_args()
+
+    path = parsed_args.save_array_as
+    if not path.endswith(".jsonl"):
+        path = run_log_path(path)
+    records = read_run_log(path, parsed_args.run)
+    if parsed_args.parquet:
+        records.to_parquet(parsed_args.parquet, index=False)
+    print(summary(records))
@@ -0,0 +1,288 @@
+import os
+import glob
+import gzip
+import json
+import argparse
+import subprocess
+import numpy as np
+import pandas as pd
+
+# Value used by IONEX for pixels without data
+MISSING = 9999
+
+MAP_TYPES = {
+    "START OF TEC MAP": "tec",
+    "START OF RMS MAP": "rms",
+    "START OF HEIGHT MAP": "height",
+}
+
+
+class IonexMaps:
+    """
+    Maps of a IONEX file. tec and rms have shape (maps, lat, lon) and hold the raw integer
+    values of the file (int16); multiply by 10**exponent to get TECU. epochs are
+    datetime64[s], lat and lon are the grid axes in degrees.
+    """
+
+    def __init__(
+        self,
+        epochs: np.ndarray,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        tec: np.ndarray,
+        exponent: np.ndarray,
+        rms: np.ndarray | None = None,
+        rms_exponent: np.ndarray | None = None,
+        height: float = 450.0,
+        base_radius: float = 6371.0,
+    ) -> None:
+        self.epochs = epochs
+        self.lat = lat
+        self.lon = lon
+        self.tec = tec
+        self.exponent = exponent
+        self.rms = rms
+        self.rms_exponent = rms_exponent
+        self.height = height
+        self.base_radius = base_radius
+
+    @staticmethod
+    def scale(values: np.ndarray, exponent: np.ndarray) -> np.ndarray:
+        """Converts raw values to TECU (float32). Missing pixels become NaN."""
+        scaled = values.astype(np.float32) * np.power(
+            10.0, np.asarray(exponent, dtype=np.float32)
+        ).reshape(-1, 1, 1)
+        scaled[values == MISSING] = np.nan
+        return scaled
+
+    def tec_tecu(self) -> np.ndarray:
+        return self.scale(self.tec, self.exponent)
+
+    def rms_tecu(self) -> np.ndarray | None:
+        if self.rms is None:
+            return None
+        return self.scale(self.rms, self.rms_exponent)
+
+
+def read_text(ionex_file: str) -> list:
+    """Returns the lines of a IONEX file, which may be compressed with .Z or .gz."""
+    if ionex_file.endswith(".Z"):
+        # Unix compress is not supported by the standard library. gunzip reads it.
+        result = subprocess.run(
+            ["gunzip", "-c", ionex_file], capture_output=True, check=True
+        )
+        return result.stdout.decode().splitlines()
+    if ionex_file.endswith(".gz"):
+        with gzip.open(ionex_file, "rt") as f:
+            return f.read().splitlines()
+    with open(ionex_file, "r") as f:
+        return f.read().splitlines()
+
+
+def _axis(first: float, last: float, step: float) -> np.ndarray:
+    return np.round(first + step * np.arange(round((last - first) / step) + 1), 6)
+
+
+def read_ionex(ionex_file: str) -> IonexMaps:
+    lines = read_text(ionex_file)
+    exponent = -1
+    height = 450.0
+    base_radius = 6371.0
+    lat = lon = None
+
+    # Header
+    n_header = 0
+    for n_header, line in enumerate(lines):
+        label = line[60:].strip()
+        if label == "END OF HEADER":
+            break
+        if label == "EXPONENT":
+            exponent = int(line[:60])
+        elif label == "LAT1 / LAT2 / DLAT":
+            lat = _axis(*[float(v) for v in line[:60].split()])
+        elif label == "LON1 / LON2 / DLON":
+            lon = _axis(*[float(v) for v in line[:60].split()])
+        elif label == "HGT1 / HGT2 / DHGT":
+            height = float(line[:60].split()[0])
+        elif label == "BASE RADIUS":
+            base_radius = float(line[:60])
+
+    # Maps. The values of all maps of a type are joined and parsed in a single call.
+    values = {"tec": [], "rms": []}
+    epochs = {"tec": [], "rms": []}
+    exponents = {"tec": [], "rms": []}
+    map_type = None
+    map_exponent = exponent
+    for line in lines[n_header + 1 :]:
+        label = line[60:].strip()
+        if label in MAP_TYPES:
+            map_type = MAP_TYPES[label]
+            map_exponent = exponent
+        elif label == "EPOCH OF CURRENT MAP":
+            epoch = [int(v) for v in line[:60].split()]
+            if map_type in epochs:
+                epochs[map_type].append(np.datetime64(pd.Timestamp(*epoch), "s"))
+                exponents[map_type].append(map_exponent)
+        elif label == "EXPONENT":
+            map_exponent = int(line[:60])
+            if map_type in exponents and len(exponents[map_type]) > 0:
+                exponents[map_type][-1] = map_exponent
+        elif label.startswith("END OF") or label == "LAT/LON1/LON2/DLON/H":
+            continue
+        elif map_type in values:
+            values[map_type].append(line)
+
+    shape = (len(lat), len(lon))
+    arrays = {}
+    for key in values:
+        if len(epochs[key]) == 0:
+            arrays[key] = None
+            continue
+        data = np.fromstring(" ".join(values[key]), sep=" ")
+        if data.size != len(epochs[key]) * shape[0] * shape[1]:
+            raise ValueError(f"Unexpected number of {key} values in {ionex_file}.")
+        arrays[key] = data.astype(np.int16).reshape(len(epochs[key]), *shape)
+
+    return IonexMaps(
+        epochs=np.array(epochs["tec"], dtype="datetime64[s]"),
+        lat=lat,
+        lon=lon,
+        tec=arrays["tec"],
+        exponent=np.array(exponents["tec"], dtype=np.int8),
+        rms=arrays["rms"],
+        rms_exponent=(
+            np.array(exponents["rms"], dtype=np.int8) if arrays["rms"] is not None else None
+        ),
+        height=height,
+        base_radius=base_radius,
+    )
+
+
+class IonexStore:
+    """
+    Binary store of IONEX maps, one day per file: {folder}/{year}/{doy}.tec.npy (int16,
+    raw values), {doy}.rms.npy when the file has RMS maps, and {doy}.json with the epochs,
+    exponents and grid. The arrays are memory-mapped on load, so a whole year of GIMs is
+    read in a fraction of a second instead of parsing thousands of text lines per day.
+    """
+
+    def __init__(self, folder: str) -> None:
+        self.folder = folder
+
+    def _base(self, day: pd.Timestamp) -> str:
+        return os.path.join(self.folder, str(day.year), f"{day.day_of_year:03}")
+
+    def add(self, ionex_file: str) -> pd.Timestamp:
+        """Converts a IONEX file. The day is the date of its first map."""
+        maps = read_ionex(ionex_file)
+        day = pd.Timestamp(maps.epochs[0]).normalize()
+        base = self._base(day)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        np.save(base + ".tec.npy", maps.tec)
+        if maps.rms is not None:
+            np.save(base + ".rms.npy", maps.rms)
+        meta = {
+            "source": os.path.abspath(ionex_file),
+            "epochs": [str(e) for e in maps.epochs],
+            "exponent": maps.exponent.tolist(),
+            "rms_exponent": (
+                maps.rms_exponent.tolist() if maps.rms_exponent is not None else None
+            ),
+            "lat": maps.lat.tolist(),
+            "lon": maps.lon.tolist(),
+            "height": maps.height,
+            "base_radius": maps.base_radius,
+        }
+        with open(base + ".json", "w") as f:
+            json.dump(meta, f)
+        return day
+
+    def _converted(self) -> dict:
+        """Returns {source file: mtime of its stored day} for the whole store."""
+        converted = {}
+        for meta_file in glob.glob(os.path.join(self.folder, "*", "*.json")):
+            with open(meta_file, "r") as f:
+                converted[json.load(f)["source"]] = os.path.getmtime(meta_file)
+        return converted
+
+    def convert_folder(self, ionex_folder: str, pattern: str = "*.??i*") -> int:
+        """Converts every file of a folder that is not stored yet or changed since."""
+        stored = self._converted()
+        converted = 0
+        for ionex_file in sorted(glob.glob(os.path.join(ionex_folder, pattern))):
+            source = os.path.abspath(ionex_file)
+            if source in stored and stored[source] >= os.path.getmtime(ionex_file):
+                continue
+            try:
+                self.add(ionex_file)
+                converted += 1
+            except (ValueError, subprocess.CalledProcessError) as e:
+                print(f"Could not convert {ionex_file}: {e}")
+        return converted
+
+    def has(self, day: pd.Timestamp) -> bool:
+        return os.path.exists(self._base(day) + ".json")
+
+    def load_day(self, day: pd.Timestamp) -> IonexMaps | None:
+        base = self._base(day)
+        if not self.has(day):
+            return None
+        with open(base + ".json", "r") as f:
+            meta = json.load(f)
+        rms = None
+        if os.path.exists(base + ".rms.npy"):
+            rms = np.load(base + ".rms.npy", mmap_mode="r")
+        return IonexMaps(
+            epochs=np.array(meta["epochs"], dtype="datetime64[s]"),
+            lat=np.array(meta["lat"]),
+            lon=np.array(meta["lon"]),
+            tec=np.load(base + ".tec.npy", mmap_mode="r"),
+            exponent=np.array(meta["exponent"], dtype=np.int8),
+            rms=rms,
+            rms_exponent=(
+                np.array(meta["rms_exponent"], dtype=np.int8)
+                if meta["rms_exponent"] is not None
+                else None
+            ),
+            height=meta["height"],
+            base_radius=meta["base_radius"],
+        )
+
+    def load(
+        self, d0: pd.Timestamp, d1: pd.Timestamp, drop_last_map: bool = True
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (epochs, tec in TECU as float32) for the days from d0 to d1. Daily files
+        usually end with the 00:00 map of the next day, which is dropped by default so
+        epochs are not repeated.
+        """
+        epochs = []
+        tec = []
+        for day in pd.date_range(d0, d1, freq="D"):
+            maps = self.load_day(day)
+            if maps is None:
+                continue
+            n = len(maps.epochs)
+            if drop_last_map and n > 1 and maps.epochs[-1] >= np.datetime64(
+                day + pd.Timedelta(days=1), "s"
+            ):
+                n -= 1
+            epochs.append(maps.epochs[:n])
+            tec.append(IonexMaps.scale(maps.tec[:n], maps.exponent[:n]))
+        if len(tec) == 0:
+            return np.array([], dtype="datetime64[s]"), np.zeros((0, 0, 0), np.float32)
+        return np.concatenate(epochs), np.concatenate(tec)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Converts a folder of IONEX files (.i, .Z or .gz) into a binary store."
+    )
+    parser.add_argument("-i", "--input", default="data/ionex")
+    parser.add_argument("-o", "--output", default=None)
+    parser.add_argument("-p", "--pattern", default="*.??i*")
+    parsed_args = parser.parse_args()
+
+    output = parsed_args.output or os.path.join(parsed_args.input, "store")
+    converted = IonexStore(output).convert_folder(parsed_args.input, parsed_args.pattern)
+    print(f"{converted} files converted to {output}.")
@@ -0,0 +1,380 @@
+import re
+import numpy as np
+import pandas as pd
+import pymap3d as pm
+from rinex import GPS_EPOCH, read_nav, read_obs
+from ionex import read_ionex
+
+CLIGHT = 299792458.0
+MU_GPS = 3.9860050e14
+OMEGA_E = 7.2921151467e-5
+F_REL = -4.442807633e-10  # relativistic clock correction (s/m^0.5)
+FREQ_L1 = 1.57542e9
+RE_WGS84 = 6378137.0
+
+# Same limits as rtklib
+MAX_DTOE = 7200.0
+MAX_GDOP = 30.0
+ERR_CBIAS = 0.3
+ERR_SAAS = 0.3
+REL_HUMI = 0.7
+
+
+class SppOptions:
+    """Options of the solution, read from the same rtklib template as run_rtklib."""
+
+    def __init__(
+        self,
+        elevation_mask: float = 15.0,
+        ionosphere: str = "ionex-tec",
+        troposphere: str = "saas",
+        eratio: float = 100.0,
+        err_a: float = 0.003,
+        err_b: float = 0.003,
+        iterations: int = 10,
+    ) -> None:
+        if ionosphere not in ("off", "ionex-tec"):
+            raise ValueError(f"numpy_spp does not support pos1-ionoopt={ionosphere}.")
+        if troposphere not in ("off", "saas"):
+            raise ValueError(f"numpy_spp does not support pos1-tropopt={troposphere}.")
+        self.elevation_mask = elevation_mask
+        self.ionosphere = ionosphere
+        self.troposphere = troposphere
+        self.eratio = eratio
+        self.err_a = err_a
+        self.err_b = err_b
+        self.iterations = iterations
+
+    @classmethod
+    def from_conf(cls, conf_text: str) -> "SppOptions":
+        values = {}
+        for line in conf_text.splitlines():
+            match = re.match(r"^\s*([\w-]+)\s*=\s*([^#]*)", line)
+            if match:
+                values[match.group(1)] = match.group(2).strip()
+        return cls(
+            elevation_mask=float(values.get("pos1-elmask", 15)),
+            ionosphere=values.get("pos1-ionoopt", "ionex-tec"),
+            troposphere=values.get("pos1-tropopt", "saas"),
+            eratio=float(values.get("stats-eratio1", 100)),
+            err_a=float(values.get("stats-errphase", 0.003)),
+            err_b=float(values.get("stats-errphaseel", 0.003)),
+        )
+
+
+def select_ephemeris(nav: dict, prn: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """Index of the healthy record of each satellite with toe closest to t (-1 if none)."""
+    index = np.full(len(t), -1, dtype=np.int64)
+    for sat in np.unique(prn):
+        records = np.flatnonzero((nav["prn"] == sat) & (nav["health"] == 0))
+        if len(records) == 0:
+            continue
+        records = records[np.argsort(nav["toe"][records])]
+        toe = nav["toe"][records]
+        rows = np.flatnonzero(prn == sat)
+        k = np.clip(np.searchsorted(toe, t[rows]), 1, max(len(toe) - 1, 1))
+        before = np.abs(t[rows] - toe[k - 1])
+        after = np.abs(t[rows] - toe[np.minimum(k, len(toe) - 1)])
+        k = np.where(after < before, np.minimum(k, len(toe) - 1), k - 1)
+        dt = np.abs(t[rows] - toe[k])
+        index[rows] = np.where(dt <= MAX_DTOE, records[k], -1)
+    return index
+
+
+def satellite_clock(nav: dict, index: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """Polynomial clock bias (s) of broadcast records index at times t."""
+    dt = t - nav["toc"][index]
+    return nav["af0"][index] + nav["af1"][index] * dt + nav["af2"][index] * dt**2
+
+
+def satellite_positions(nav: dict, index: np.ndarray, t: np.ndarray) -> tuple:
+    """
+    ECEF positions (n, 3) and clock biases (n,) with the relativistic correction, of
+    broadcast records index at transmission times t (IS-GPS-200).
+    """
+    e = nav["e"][index]
+    a = nav["sqrt_a"][index] ** 2
+    tk = t - nav["toe"][index]
+    toe_sow = nav["toe"][index] - nav["week"][index] * 604800.0
+    mk = nav["m0"][index] + (np.sqrt(MU_GPS / a**3) + nav["delta_n"][index]) * tk
+
+    ek = mk.copy()
+    for _ in range(30):
+        step = (ek - e * np.sin(ek) - mk) / (1.0 - e * np.cos(ek))
+        ek -= step
+        if np.max(np.abs(step), initial=0.0) < 1e-14:
+            break
+    sin_e, cos_e = np.sin(ek), np.cos(ek)
+
+    phi = np.arctan2(np.sqrt(1.0 - e**2) * sin_e, cos_e - e) + nav["omega"][index]
+    sin2, cos2 = np.sin(2 * phi), np.cos(2 * phi)
+    u = phi + nav["cus"][index] * sin2 + nav["cuc"][index] * cos2
+    r = a * (1.0 - e * cos_e) + nav["crs"][index] * sin2 + nav["crc"][index] * cos2
+    i = nav["i0"][index] + nav["cis"][index] * sin2 + nav["cic"][index] * cos2
+    i += nav["idot"][index] * tk
+    x, y = r * np.cos(u), r * np.sin(u)
+    omega = (
+        nav["omega0"][index]
+        + (nav["omega_dot"][index] - OMEGA_E) * tk
+        - OMEGA_E * toe_sow
+    )
+    cos_o, sin_o, cos_i = np.cos(omega), np.sin(omega), np.cos(i)
+    position = np.stack(
+        [x * cos_o - y * cos_i * sin_o, x * sin_o + y * cos_i * cos_o, y * np.sin(i)],
+        axis=1,
+    )
+    clock = satellite_clock(nav, index, t) + F_REL * e * nav["sqrt_a"][index] * sin_e
+    return position, clock
+
+
+def azimuth_elevation(receiver: np.ndarray, satellite: np.ndarray, lat, lon) -> tuple:
+    """Azimuth and elevation (rad) of each satellite seen from each receiver (n, 3)."""
+    los = satellite - receiver
+    los /= np.linalg.norm(los, axis=1, keepdims=True)
+    sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+    sin_lon, cos_lon = np.sin(lon), np.cos(lon)
+    east = -sin_lon * los[:, 0] + cos_lon * los[:, 1]
+    north = (
+        -sin_lat * cos_lon * los[:, 0] - sin_lat * sin_lon * los[:, 1] + cos_lat * los[:, 2]
+    )
+    up = cos_lat * cos_lon * los[:, 0] + cos_lat * sin_lon * los[:, 1] + sin_lat * los[:, 2]
+    return np.arctan2(east, north) % (2 * np.pi), np.arcsin(np.clip(up, -1, 1))
+
+
+def saastamoinen(lat, height, elevation) -> np.ndarray:
+    """Tropospheric delay (m) of rtklib's tropmodel with the standard atmosphere."""
+    hgt = np.maximum(height, 0.0)
+    pres = 1013.25 * (1.0 - 2.2557e-5 * hgt) ** 5.2568
+    temp = 15.0 - 6.5e-3 * hgt + 273.16
+    e = 6.108 * REL_HUMI * np.exp((17.15 * temp - 4684.0) / (temp - 38.45))
+    cos_z = np.cos(np.pi / 2 - elevation)
+    dry = 0.0022768 * pres / (1.0 - 0.00266 * np.cos(2 * lat) - 0.00028 * hgt / 1e3) / cos_z
+    wet = 0.002277 * (1255.0 / temp + 0.05) * e / cos_z
+    valid = (height > -100.0) & (height < 1e4) & (elevation > 0)
+    return np.where(valid, dry + wet, 0.0)
+
+
+def ionex_delay(maps: dict, t, lat, lon, azimuth, elevation) -> np.ndarray:
+    """
+    L1 slant ionospheric delay (m) from IONEX maps, as rtklib's iontec: single layer
+    pierce point, bilinear interpolation in the sun-fixed frame and linear interpolation
+    between the maps before and after t. NaN when t is outside the maps.
+    """
+    re = maps["base_radius"] * 1e3
+    rp = re / (re + maps["height"] * 1e3) * np.cos(elevation)
+    ap = np.pi / 2 - elevation - np.arcsin(rp)
+    sin_ap, tan_ap = np.sin(ap), np.tan(ap)
+    cos_az = np.cos(azimuth)
+    lat_p = np.arcsin(np.sin(lat) * np.cos(ap) + np.cos(lat) * sin_ap * cos_az)
+    offset = np.arcsin(np.clip(sin_ap * np.sin(azimuth) / np.cos(lat_p), -1, 1))
+    across_pole = ((lat > 0) & (tan_ap * cos_az > np.tan(np.pi / 2 - lat))) | (
+        (lat < 0) & (-tan_ap * cos_az > np.tan(np.pi / 2 + lat))
+    )
+    lon_p = np.where(across_pole, lon + np.pi - offset, lon + offset)
+    mapping = 1.0 / np.sqrt(1.0 - rp**2)
+
+    epochs = maps["epochs"]
+    after = np.searchsorted(epochs, t, side="right")
+    inside = (after > 0) & (after < len(epochs))
+    after = np.clip(after, 1, len(epochs) - 1)
+    before = after - 1
+
+    def vtec(k):
+        # Earth rotation since the map epoch, so the map follows the sun
+        lon_k = np.degrees(lon_p) + 360.0 * (t - epochs[k]) / 86400.0
+        return interpolate_grid(maps, k, np.degrees(lat_p), lon_k)
+
+    tec_before, tec_after = vtec(before), vtec(after)
+    weight = (t - epochs[before]) / (epochs[after] - epochs[before])
+    tec = np.where(
+        np.isnan(tec_before),
+        tec_after,
+        np.where(np.isnan(tec_after), tec_before, tec_before * (1 - weight) + tec_after * weight),
+    )
+    delay = 40.3e16 / FREQ_L1**2 * tec * mapping
+    return np.where(inside, delay, np.nan)
+
+
+def interpolate_grid(maps: dict, k: np.ndarray, lat: np.ndarray, lon: np.ndarray):
+    """Bilinear interpolation of maps k at (lat, lon) in degrees."""
+    grid_lat, grid_lon, tec = maps["lat"], maps["lon"], maps["tec"]
+    lon = (lon - grid_lon[0]) % 360.0 + grid_lon[0]
+    dlat = grid_lat[1] - grid_lat[0]
+    dlon = grid_lon[1] - grid_lon[0]
+    fi = np.clip((lat - grid_lat[0]) / dlat, 0, len(grid_lat) - 1.000001)
+    fj = np.clip((lon - grid_lon[0]) / dlon, 0, len(grid_lon) - 1.000001)
+    i, j = fi.astype(np.int64), fj.astype(np.int64)
+    a, b = fi - i, fj - j
+    return (
+        tec[k, i, j] * (1 - a) * (1 - b)
+        + tec[k, i, j + 1] * (1 - a) * b
+        + tec[k, i + 1, j] * a * (1 - b)
+        + tec[k, i + 1, j + 1] * a * b
+    )
+
+
+def load_ionex_maps(ionex_file: str) -> dict:
+    maps = read_ionex(ionex_file)
+    return {
+        "epochs": (maps.epochs - GPS_EPOCH.astype("datetime64[s]")).astype(np.float64),
+        "lat": maps.lat,
+        "lon": maps.lon,
+        "tec": maps.tec_tecu(),
+        "height": maps.height,
+        "base_radius": maps.base_radius,
+    }
+
+
+def solve_spp(
+    obs: dict,
+    nav: dict,
+    options: SppOptions,
+    ionex: dict | None = None,
+    initial_position: np.ndarray | None = None,
+    code: str = "C1",
+) -> pd.DataFrame:
+    """
+    Single-frequency single point positioning of every epoch at once. Each iteration builds
+    the residuals and design matrix of all observations and accumulates the 4x4 normal
+    equations of every epoch with bincount, then solves them in one batched call.
+    Returns the columns of read_pos (datetime, X(m).. sdzx(m), Q=5 for single, ns).
+    """
+    pseudorange = obs[code]
+    keep = ~np.isnan(pseudorange)
+    t_rx = obs["time"][keep]
+    prn = obs["prn"][keep]
+    pseudorange = pseudorange[keep]
+
+    # Satellite positions at transmission time (independent of the receiver position)
+    index = select_ephemeris(nav, prn, t_rx)
+    keep = index >= 0
+    t_rx, prn, pseudorange, index = t_rx[keep], prn[keep], pseudorange[keep], index[keep]
+    t_tx = t_rx - pseudorange / CLIGHT
+    t_tx -= satellite_clock(nav, index, t_tx)
+    sat_position, sat_clock = satellite_positions(nav, index, t_tx)
+    sat_clock -= nav["tgd"][index]  # L1 group delay
+    sat_variance = nav["sv_accuracy"][index] ** 2
+
+    epochs, group = np.unique(t_rx, return_inverse=True)
+    n_epochs = len(epochs)
+    if initial_position is None or not np.any(initial_position):
+        initial_position = obs.get("approx_position", np.zeros(3))
+    state = np.zeros((n_epochs, 4))
+    state[:, :3] = initial_position
+
+    mask = np.radians(options.elevation_mask)
+    valid = np.ones(len(t_rx), dtype=bool)
+    for iteration in range(options.iterations):
+        receiver = state[group, :3]
+        lat, lon, height = pm.ecef2geodetic(
+            receiver[:, 0], receiver[:, 1], receiver[:, 2], deg=False
+        )
+        near_surface = np.linalg.norm(receiver, axis=1) > RE_WGS84 - 1e5
+        azimuth, elevation = azimuth_elevation(receiver, sat_position, lat, lon)
+        # Like rtklib, a receiver at the center of the Earth sees every satellite at zenith
+        elevation = np.where(near_surface, elevation, np.pi / 2)
+
+        diff = sat_position - receiver
+        rho = np.linalg.norm(diff, axis=1)
+        # Earth rotation during the signal travel (Sagnac)
+        rho += OMEGA_E * (
+            sat_position[:, 0] * receiver[:, 1] - sat_position[:, 1] * receiver[:, 0]
+        ) / CLIGHT
+        model = rho + state[group, 3] - CLIGHT * sat_clock
+
+        variance = (
+            options.eratio**2 * (options.err_a**2 + options.err_b**2 / np.sin(elevation))
+            + sat_variance
+            + ERR_CBIAS**2
+        )
+        valid = elevation >= mask
+        if options.troposphere == "saas":
+            tropo = np.where(near_surface, saastamoinen(lat, height, elevation), 0.0)
+            model += tropo
+            variance += (ERR_SAAS / (np.sin(elevation) + 0.1)) ** 2
+        if options.ionosphere == "ionex-tec" and ionex is not None:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                iono = ionex_delay(ionex, t_rx, lat, lon, azimuth, elevation)
+            valid &= ~np.isnan(iono) | ~near_surface
+            model += np.where(near_surface, np.nan_to_num(iono), 0.0)
+
+        residual = pseudorange - model
+        design = np.column_stack([-diff / rho[:, None], np.ones(len(rho))])
+        weight = np.where(valid, 1.0 / variance, 0.0)
+
+        normal = np.empty((n_epochs, 4, 4))
+        rhs = np.empty((n_epochs, 4))
+        for a in range(4):
+            rhs[:, a] = np.bincount(group, weight * design[:, a] * residual, n_epochs)
+            for b in range(a, 4):
+                normal[:, a, b] = normal[:, b, a] = np.bincount(
+                    group, weight * design[:, a] * design[:, b], n_epochs
+                )
+        n_sats = np.bincount(group, valid, n_epochs)
+        solvable = (n_sats >= 4) & (np.abs(np.linalg.det(normal)) > 0)
+        normal[~solvable] = np.eye(4)
+        rhs[~solvable] = 0.0
+        step = np.linalg.solve(normal, rhs[:, :, None])[:, :, 0]
+        state += step
+        if np.max(np.abs(step[solvable, :3]), initial=0.0) < 1e-4:
+            break
+
+    # Geometry check with unweighted dops, like rtklib's valsol
+    geometry = np.empty((n_epochs, 4, 4))
+    for a in range(4):
+        for b in range(a, 4):
+            geometry[:, a, b] = geometry[:, b, a] = np.bincount(
+                group, valid * design[:, a] * design[:, b], n_epochs
+            )
+    geometry[~solvable] = np.eye(4)
+    gdop = np.sqrt(np.trace(np.linalg.inv(geometry), axis1=1, axis2=2))
+    solved = solvable & (gdop <= MAX_GDOP)
+
+    covariance = np.linalg.inv(normal[solved])
+    q = np.stack(
+        [
+            covariance[:, 0, 0],
+            covariance[:, 1, 1],
+            covariance[:, 2, 2],
+            covariance[:, 0, 1],
+            covariance[:, 1, 2],
+            covariance[:, 2, 0],
+        ],
+        axis=1,
+    )
+    sd = np.sign(q) * np.sqrt(np.abs(q))
+    times = GPS_EPOCH + np.round(epochs[solved] * 1e9).astype("timedelta64[ns]")
+    data = {
+        "datetime": times,
+        "X(m)": state[solved, 0],
+        "Y(m)": state[solved, 1],
+        "Z(m)": state[solved, 2],
+        "Q": np.full(solved.sum(), 5, dtype=np.int64),
+        "ns": n_sats[solved].astype(np.int64),
+    }
+    for k, column in enumerate(
+        ["sdx(m)", "sdy(m)", "sdz(m)", "sdxy(m)", "sdyz(m)", "sdzx(m)"]
+    ):
+        data[column] = sd[:, k]
+    data["age(s)"] = np.zeros(solved.sum())
+    data["ratio"] = np.zeros(solved.sum())
+    return pd.DataFrame(data)
+
+
+def run_spp(
+    obs_file: str,
+    nav_file: str,
+    conf_text: str,
+    ionex_file: str | None = None,
+    initial_position: np.ndarray | None = None,
+) -> pd.DataFrame:
+    """Reads the RINEX (and IONEX) files of a day and solves all its epochs."""
+    options = SppOptions.from_conf(conf_text)
+    obs = read_obs(obs_file, ["C1", "P1"])
+    # C1 is the code of the templates. P1 fills the epochs of receivers without C1.
+    obs["C1"] = np.where(np.isnan(obs["C1"]), obs["P1"], obs["C1"])
+    nav = read_nav(nav_file)
+    ionex = None
+    if options.ionosphere == "ionex-tec":
+        ionex = load_ionex_maps(ionex_file)
+    return solve_spp(obs, nav, options, ionex, initial_position)
@@ -0,0 +1,283 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Column names used by the processor for the ECEF solution of rnx2rtkp
+XYZ_COLUMNS = {
+    "x-ecef(m)": "X(m)",
+    "y-ecef(m)": "Y(m)",
+    "z-ecef(m)": "Z(m)",
+}
+
+# Layout of the solution when rnx2rtkp is run with out-outhead=off
+DEFAULT_COLUMNS = [
+    "X(m)",
+    "Y(m)",
+    "Z(m)",
+    "Q",
+    "ns",
+    "sdx(m)",
+    "sdy(m)",
+    "sdz(m)",
+    "sdxy(m)",
+    "sdyz(m)",
+    "sdzx(m)",
+    "age(s)",
+    "ratio",
+]
+
+INTEGER_COLUMNS = ["Q", "ns"]
+
+TIME_SYSTEMS = ["GPST", "UTC", "JST"]
+
+GPS_EPOCH = np.datetime64("1980-01-06T00:00:00", "ns")
+
+SPACE, DOT, MINUS, SLASH, COLON, ZERO, NINE = b" .-/:09"
+
+# Lookup table from ASCII codes to digit values
+DIGIT_VALUES = np.zeros(256)
+DIGIT_VALUES[ZERO : NINE + 1] = np.arange(10)
+
+
+def parse_fixed_width(chars: np.ndarray) -> np.ndarray | None:
+    """
+    Parses a block of right-aligned numeric fields, one line per row of chars (uint8).
+    rtklib prints every field with a fixed width and precision, so the position of the
+    digits and of the decimal point is the same in every line and the numbers can be
+    assembled with a single matrix product. Returns None if the block is not regular.
+    """
+    n, width = chars.shape
+    filled = chars != SPACE
+    used = filled.any(axis=0)
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], used.astype(np.int8), [0]])))
+    starts, ends = edges[0::2], edges[1::2]
+    # Inside a right-aligned field, a character is never followed by a space
+    falls = np.flatnonzero((np.diff(filled.view(np.int8), axis=1) < 0).any(axis=0))
+    if not np.isin(falls + 1, ends).all():
+        return None
+    dots = chars == DOT
+    dot_columns = np.flatnonzero(dots.any(axis=0))
+    if not dots[:, dot_columns].all():
+        return None
+
+    # Power of ten of every column, counted from the last digit of its field
+    weights = np.zeros((width, len(starts)))
+    scale = np.ones(len(starts))
+    for k, (a, b) in enumerate(zip(starts, ends)):
+        dot = dot_columns[(dot_columns >= a) & (dot_columns < b)]
+        if len(dot) > 1:
+            return None
+        columns = [c for c in range(a, b) if not c in dot]
+        weights[columns, k] = 10.0 ** np.arange(len(columns) - 1, -1, -1)
+        if len(dot):
+            scale[k] = 10.0 ** (b - 1 - dot[0])
+    # Integers below 2**53 are exact, so dividing by the scale rounds like strtod
+    values = np.take(DIGIT_VALUES, chars) @ weights
+    minus = chars == MINUS
+    for k in np.unique(np.searchsorted(ends, np.flatnonzero(minus.any(axis=0)), "right")):
+        negative = minus[:, starts[k] : ends[k]].any(axis=1)
+        values[negative, k] *= -1
+    return values / scale
+
+
+def parse_free_format(data_lines: list) -> np.ndarray:
+    # Fallback for lines that do not share the same layout
+    body = b"\n".join(data_lines).replace(b"/", b" ").replace(b":", b" ")
+    values = np.fromstring(body.decode(), sep=" ")
+    n_fields = len(data_lines[0].replace(b"/", b" ").replace(b":", b" ").split())
+    if values.size != n_fields * len(data_lines):
+        raise ValueError("The solution lines do not have the same number of fields.")
+    return values.reshape(len(data_lines), n_fields)
+
+
+def parse_header(header_lines: list) -> dict:
+    """
+    Reads the % lines of a .pos file. Lines like "% program   : RTKLIB ver.demo5" become
+    dictionary entries and repeated keys (inp file) become lists. The last line, which
+    names the columns, is stored as "columns" together with the "time_system".
+    """
+    meta = {}
+    for line in header_lines:
+        content = line.lstrip("%").strip()
+        if ":" in content and not content.split()[0] in TIME_SYSTEMS:
+            key, value = content.split(":", 1)
+            key = key.strip()
+            value = value.strip()
+            if key in meta:
+                if not isinstance(meta[key], list):
+                    meta[key] = [meta[key]]
+                meta[key].append(value)
+            else:
+                meta[key] = value
+        elif len(content) > 0 and content.split()[0] in TIME_SYSTEMS:
+            fields = content.split()
+            meta["time_system"] = fields[0]
+            meta["columns"] = [XYZ_COLUMNS.get(c, c) for c in fields[1:]]
+    return meta
+
+
+def hms_to_datetime64(fields: np.ndarray) -> np.ndarray:
+    """Converts columns (year, month, day, hour, minute, second) to datetime64[ns]."""
+    year, month, day = fields[:, 0], fields[:, 1], fields[:, 2]
+    months = (year.astype(np.int64) - 1970) * 12 + month.astype(np.int64) - 1
+    days = months.astype("datetime64[M]").astype("datetime64[D]")
+    days = days + (day.astype(np.int64) - 1).astype("timedelta64[D]")
+    seconds = fields[:, 3] * 3600.0 + fields[:, 4] * 60.0 + fields[:, 5]
+    nanoseconds = np.round(seconds * 1e6).astype(np.int64) * 1000
+    return days.astype("datetime64[ns]") + nanoseconds.astype("timedelta64[ns]")
+
+
+def tow_to_datetime64(fields: np.ndarray) -> np.ndarray:
+    """Converts columns (GPS week, time of week in seconds) to datetime64[ns]."""
+    week_ns = fields[:, 0].astype(np.int64) * 7 * 86400 * 10**9
+    tow_ns = np.round(fields[:, 1] * 1e6).astype(np.int64) * 1000
+    return GPS_EPOCH + (week_ns + tow_ns).astype("timedelta64[ns]")
+
+
+def read_pos(pos_file: str) -> pd.DataFrame:
+    """
+    Reads a rnx2rtkp solution file straight into NumPy arrays.
+
+    Both time formats of rtklib are supported: yyyy/mm/dd hh:mm:ss.sss (out-timeform=hms or
+    the -t flag) and GPS week plus time of week (out-timeform=tow). The time system (GPST or,
+    with -u, UTC) is read from the header. Times are returned in the "datetime" column, the
+    ECEF columns are renamed to X(m), Y(m), Z(m) and the header is kept in df.attrs["header"].
+    """
+    with open(pos_file, "rb") as f:
+        lines = f.read().splitlines()
+
+    # rtklib writes the whole header before the first solution line
+    n_header = 0
+    while n_header < len(lines) and lines[n_header].startswith(b"%"):
+        n_header += 1
+    while len(lines) > n_header and not lines[-1].strip():
+        lines.pop()
+    header_lines = [line.decode() for line in lines[:n_header]]
+    data_lines = lines[n_header:]
+    meta = parse_header(header_lines)
+    columns = meta.get("columns", DEFAULT_COLUMNS)
+
+    if len(data_lines) == 0:
+        df = pd.DataFrame(columns=["datetime"] + columns)
+        df.attrs["header"] = meta
+        return df
+
+    hms = b"/" in data_lines[0].split()[0]
+    n_time = 6 if hms else 2
+    values = None
+    block = b"".join(data_lines)
+    numeric = len(block.translate(None, b" .-0123456789/:")) == 0
+    if numeric and len(set(map(len, data_lines))) == 1:
+        chars = np.frombuffer(block, dtype=np.uint8)
+        chars = chars.reshape(len(data_lines), -1).copy()
+        # The date and time separators become spaces, so the whole block is numeric
+        chars[(chars == SLASH) | (chars == COLON)] = SPACE
+        values = parse_fixed_width(chars)
+    if values is None:
+        values = parse_free_format(data_lines)
+
+    if hms:
+        times = hms_to_datetime64(values[:, :n_time])
+    else:
+        times = tow_to_datetime64(values[:, :n_time])
+
+    solution = values[:, n_time:]
+    if solution.shape[1] != len(columns):
+        # Unknown layout (e.g. latitude/longitude in dms). Keeping positional names.
+        columns = [f"field{i}" for i in range(solution.shape[1])]
+    data = {"datetime": times}
+    for i, column in enumerate(columns):
+        if column in INTEGER_COLUMNS:
+            data[column] = solution[:, i].astype(np.int64)
+        else:
+            data[column] = solution[:, i]
+    df = pd.DataFrame(data)
+    df.attrs["header"] = meta
+    return df
+
+
+def stitch_pos(window_files: list, bounds: list, out_file: str) -> int:
+    """
+    Joins the solution files of consecutive time windows of a day into out_file, keeping
+    the header of the first one. bounds has the (start, end) of the epochs kept from each
+    window, start inclusive and end exclusive (None keeps everything on that side), so the
+    overlap epochs computed for convergence are dropped. Returns the number of epochs.
+    """
+    out_lines = []
+    for k, (window_file, (start, end)) in enumerate(zip(window_files, bounds)):
+        with open(window_file, "rb") as f:
+            lines = f.read().splitlines(keepends=True)
+        n_header = 0
+        while n_header < len(lines) and lines[n_header].startswith(b"%"):
+            n_header += 1
+        while len(lines) > n_header and not lines[-1].strip():
+            lines.pop()
+        if k == 0:
+            out_lines.extend(lines[:n_header])
+        elif k == len(window_files) - 1:
+            # The end of the observations is the one of the last window
+            obs_end = [line for line in lines[:n_header] if line.startswith(b"% obs end")]
+            out_lines = [
+                obs_end[0] if line.startswith(b"% obs end") and obs_end else line
+                for line in out_lines
+            ]
+        data_lines = lines[n_header:]
+        times = read_pos(window_file)["datetime"].to_numpy()
+        keep = np.ones(len(data_lines), dtype=bool)
+        if start is not None:
+            keep &= times >= pd.Timestamp(start).to_datetime64()
+        if end is not None:
+            keep &= times < pd.Timestamp(end).to_datetime64()
+        out_lines.extend(line for line, kept in zip(data_lines, keep) if kept)
+
+    tmp_file = f"{out_file}.tmp-{os.getpid()}"
+    with open(tmp_file, "wb") as f:
+        f.writelines(out_lines)
+    os.replace(tmp_file, out_file)
+    return sum(1 for line in out_lines if not line.startswith(b"%"))
+
+
+# Names (lowercase, without units) of the time columns that rt_ppp may write
+RT_PPP_TIMES = {
+    "tow": (["week", "sow"], ["week", "tow"], ["gpsweek", "sow"], ["gpsweek", "tow"]),
+    "hms": (["year", "month", "day", "hour", "min", "sec"],),
+    "doy": (["year", "doy", "sod"],),
+}
+
+
+def read_rt_ppp(out_file: str) -> pd.DataFrame:
+    """
+    Reads every epoch of an rt_ppp solution (output/RT_PPP.out): a whitespace separated
+    table after the % comments, whose first line names the columns. The time columns are
+    found by name, either GPS week and seconds of week, the calendar date and time, or year,
+    day of year and seconds of day. Returns the columns of read_pos that are in the file
+    (names are matched ignoring case), X(m), Y(m), Z(m) being the ECEF position.
+    """
+    df = pd.read_csv(out_file, comment="%", sep=r"\s+", header="infer")
+    names = {column.lower().split("(")[0].strip(): column for column in df.columns}
+    fields = None
+    for layout, candidates in RT_PPP_TIMES.items():
+        for candidate in candidates:
+            if all(name in names for name in candidate):
+                fields = df[[names[name] for name in candidate]].to_numpy(dtype=float)
+                break
+        if fields is not None:
+            break
+    if fields is None:
+        raise ValueError(f"No time columns found in {out_file}: {list(df.columns)}.")
+    if layout == "tow":
+        times = tow_to_datetime64(fields)
+    elif layout == "hms":
+        times = hms_to_datetime64(fields)
+    else:
+        years = (fields[:, 0].astype(np.int64) - 1970).astype("datetime64[Y]")
+        days = years.astype("datetime64[D]") + (fields[:, 1].astype(np.int64) - 1).astype("timedelta64[D]")
+        nanoseconds = np.round(fields[:, 2] * 1e6).astype(np.int64) * 1000
+        times = days.astype("datetime64[ns]") + nanoseconds.astype("timedelta64[ns]")
+
+    known = {column.lower(): column for column in DEFAULT_COLUMNS}
+    solution = pd.DataFrame({"datetime": times})
+    for column in df.columns:
+        if column.lower() in known:
+            solution[known[column.lower()]] = df[column].to_numpy()
+    return solution
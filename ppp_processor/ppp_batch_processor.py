@@ -2,19 +2,29 @@ import os
 import sys
 import subprocess
 import shutil
+import shlex
 from datetime import date
-import urllib.request
-from pathlib import Path
 import argparse
-import stat
 import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
 from tqdm import tqdm
 import pandas as pd
 import numpy as np
 import yaml
-import pymap3d as pm
 import hydra
 from omegaconf import DictConfig, OmegaConf
+from input_stage import SharedInputStage
+from result_cache import ResultCache
+from pos_reader import read_pos, read_rt_ppp, stitch_pos
+from station_frame import StationFrame
+from result_store import PartitionedResultStore
+from executors import make_executor, LocalExecutor, DockerExecExecutor, LibraryExecutor
+from numpy_spp import run_spp
+from rinex import filter_obs
+from pyramid import build_pyramid, LEVELS
+from result_schema import result_frame, QUALITY_COLUMNS
+from instrumentation import StageTimer, RunLog, run_log_path
 
 @hydra.main(
     version_base=None, config_path="../configurations", config_name="default_process"
@@ -30,73 +40,111 @@ class PPPBatchProcessor:
     def __init__(self, config) -> None:
         self.config = config
         self.update_pos = config["process"].get("update_pos")
+        # Frame of the sdx..sdzx columns: enu (same as the positions) or ecef (as rtklib writes them)
+        self.sd_frame = config["process"].get("sd_frame", "enu")
+        self.station_frames = {}
+        # Overlap (minutes) added before every window when a day is split (windows_per_day)
+        self.window_overlap = float(config["process"].get("window_overlap", 30))
+        # Runs rnx2rtkp (see executors.py). Created by main.
+        self.executor = None
 
     # This method is not really used, but it can be used to clean GNSS data.
     def rinex_with_gps_only(self, rinexFile: str):
-        if not os.path.exists("Binary/teqc"):
-            urllib.request.urlretrieve(
-                "https://www.unavco.org/software/data-processing/teqc/development/teqc_CentOSLx86_64s.zip",
-                "Binary/teqc.zip",
-            )
-            shutil.unpack_archive("Binary/teqc.zip", extract_dir="Binary")
-            f = Path("Binary/teqc")
-            f.chmod(
-                f.stat().st_mode | stat.S_IEXEC
-            )  # change permission to run the file
+        # Same selection as teqc -E -C -R -S -O.obs L1L2C1P2S1S2, without the external binary
         newFile = rinexFile.replace(".", "-new.")
-        subprocess.run(
-            f"Binary/teqc -E -C -R -S -O.obs L1L2C1P2S1S2 +out {newFile} {rinexFile}",
-            shell=True,
+        filter_obs(
+            rinexFile, newFile, systems="G", observables=["L1", "L2", "C1", "P2", "S1", "S2"]
         )
         return newFile
 
     def temporaryConf(
         self,
         replaceDict: dict,
-        temporaryFile: str,
+        temporaryFile: str | None,
         templateFile: str = "data/templates/rtklib_template_brdc.conf",
-    ) -> None:
+    ) -> str:
+        # Without temporaryFile the configuration is only rendered
         with open(templateFile, "r") as template:
             template_text = template.read()
             for key, value in replaceDict.items():
                 template_text = template_text.replace(key, str(value))
+        if temporaryFile is not None:
             with open(temporaryFile, "w") as tempConf:
                 tempConf.write(template_text)
+        return template_text
 
     def run_rt_ppp(
         self,
         ppp_executable: str,
         obsFile: str,
-        outFile: str,
+        navFile: str,
         template_conf: str,
         temporary_conf: str,
         replaceDict: dict,
-        cwd: str = ".",
+        cwd: str | None = None,
         move_to=".",
+        timer: StageTimer | None = None,
     ):
-        out_file = obsFile.split(".")[0] + ".pos"  #'temp.obs'
-        move_file = os.path.join(move_to, os.path.split(out_file)[-1])
+        timer = timer or StageTimer()
+        # rt_ppp writes output/RT_PPP.out and a .pos next to the observation file, so every
+        # job runs in its own folder (the one of temporary_conf), with links to its inputs
+        cwd = os.path.abspath(cwd or os.path.dirname(temporary_conf))
+        obs_name = os.path.basename(obsFile)
+        stem = os.path.splitext(obs_name)[0]
+        outFile = os.path.join(move_to, f"{stem}.out")
         if not os.path.exists(outFile) or (self.update_pos == True):
-            self.temporaryConf(replaceDict, temporary_conf, template_conf)
-            cmd = f"{ppp_executable} {obsFile} {temporary_conf}"
-            print(f"Running {cmd}")
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                cwd=cwd,
+            os.makedirs(os.path.join(cwd, "output"), exist_ok=True)
+            for input_file in [obsFile, navFile]:
+                link = os.path.join(cwd, os.path.basename(input_file))
+                if os.path.lexists(link):
+                    os.unlink(link)
+                try:
+                    os.symlink(os.path.abspath(input_file), link)
+                except OSError:
+                    shutil.copy(input_file, link)
+            with timer.stage("render"):
+                self.temporaryConf(replaceDict, temporary_conf, template_conf)
+            # A relative executable (./rt_ppp) is relative to the folder of the process
+            command = shlex.split(ppp_executable)
+            if os.path.exists(command[0]):
+                command[0] = os.path.abspath(command[0])
+            command += [obs_name, os.path.abspath(temporary_conf)]
+            print(f"Running {shlex.join(command)} in {cwd}")
+            with timer.stage("run"):
+                subprocess.run(
+                    command,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    cwd=cwd,
+                )
+            job_out = os.path.join(cwd, "output", "RT_PPP.out")
+            if not os.path.exists(job_out):
+                print(f"rt_ppp wrote no solution for {obsFile}.")
+                return None
+            shutil.move(job_out, outFile)
+            job_pos = os.path.join(cwd, f"{stem}.pos")
+            if os.path.exists(job_pos):
+                shutil.move(job_pos, os.path.join(move_to, f"{stem}.pos"))
+
+        with timer.stage("parse"):
+            df = read_rt_ppp(outFile)
+        if len(df) == 0:
+            return None
+        with timer.stage("transform"):
+            station_frame = self.get_station_frame(
+                replaceDict["{x0}"], replaceDict["{y0}"], replaceDict["{z0}"]
             )
-            os.rename("output/RT_PPP.out", outFile)
-        if os.path.exists(out_file):
-            if os.path.exists(move_file):
-                os.unlink(move_file)
-            shutil.move(out_file, move_to)
-        df = pd.read_csv(
-            outFile, comment="%", sep="\s+", parse_dates=True, header="infer"
-        )
-        pos = df[["X(m)", "Y(m)", "Z(m)"]].to_numpy().mean(axis=0)
-        return pos
+            # Without the covariances the sigmas are rotated as uncorrelated
+            if "sdx(m)" in df.columns:
+                for column in ["sdxy(m)", "sdyz(m)", "sdzx(m)"]:
+                    if column not in df.columns:
+                        df[column] = 0.0
+            df = station_frame.transform(df, rotate_sd=self.sd_frame == "enu")
+            # Same columns as rtklib, NaN where rt_ppp has no value. Q is 6 (ppp) as in rtklib.
+            if "Q" not in df.columns:
+                df["Q"] = 6
+            df = result_frame(df)
+        return df
 
     def run_rtklib(
         self,
@@ -107,61 +155,167 @@ class PPPBatchProcessor:
         temporary_conf: str,
         replaceDict: dict,
         cwd: str = ".",
-        groups_per_file: int = 12,
+        groups_per_file: int = 1,
         move_to=".",
+        result_cache: ResultCache | None = None,
+        result_store: PartitionedResultStore | None = None,
+        day: pd.Timestamp | None = None,
+        timer: StageTimer | None = None,
     ):
+        timer = timer or StageTimer()
         out_file = obsFile.split(".")[0] + ".pos"  #'temp.obs'
         move_file = os.path.join(move_to, os.path.split(out_file)[-1])
-        if not os.path.exists(move_file) or (self.update_pos == True):
-            self.temporaryConf(replaceDict, temporary_conf, template_conf)
-            cmd = f"{ppp_executable} -x 2 -y 0 -k {temporary_conf} -o {move_file} {obsFile} {navFile}"
-            print(f"Running {cmd}")
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                cwd=cwd,
-            )
+        with timer.stage("render"):
+            rendered_conf = self.temporaryConf(replaceDict, temporary_conf, template_conf)
+        args = ["-x", 2, "-y", 0, "-k", temporary_conf, "-o", move_file, obsFile, navFile]
+        # The day is split in groups_per_file windows run at the same time (needs the day)
+        windowed = groups_per_file > 1 and day is not None
+        if result_cache is None:
+            up_to_date = os.path.exists(move_file)
+        else:
+            # The ionex file only matters if the template uses it
+            input_files = [obsFile, navFile]
+            if str(replaceDict["{ionex}"]) in rendered_conf:
+                input_files.append(replaceDict["{ionex}"])
+            command = f"{ppp_executable} -x 2 -y 0"
+            if windowed:
+                command += f" windows {groups_per_file} overlap {self.window_overlap}"
+            cache_key = result_cache.key(input_files, rendered_conf, command)
+            stale = os.path.exists(move_file)
+            up_to_date = result_cache.fetch(cache_key, move_file)
+            if stale and not up_to_date:
+                print(f"Inputs of {move_file} changed. Recomputing it.")
+        if not up_to_date or (self.update_pos == True):
+            # move_file may be a hard link to a cache entry, and rnx2rtkp writes -o in
+            # place. A failed run must not leave the solution of other inputs behind either.
+            if os.path.exists(move_file):
+                os.unlink(move_file)
+            if windowed:
+                succeeded = self.run_windows(args, day, groups_per_file, cwd, timer)
+            else:
+                print(f"Running {self.executor.command(args)}")
+                with timer.stage("run"):
+                    result = self.executor.run(args, cwd=cwd)
+                timer.add_process(result)
+                succeeded = result.returncode == 0
+            if not succeeded:
+                print(f"{self.executor.command(args)} failed. {move_file} is not kept.")
+                if os.path.exists(move_file):
+                    os.unlink(move_file)
+                if result_store is not None:
+                    result_store.discard(day)
+                return None
+            if result_cache is not None and os.path.exists(move_file):
+                result_cache.store(cache_key, move_file)
         if not os.path.exists(move_file):
             return None
+        # Nothing to do if the day was already stored from this same solution file
+        if result_store is not None and result_store.is_committed(day, move_file):
+            return None
 
-        header = [
-            "date",
-            "GPST",
-            "X(m)",
-            "Y(m)",
-            "Z(m)",
-            "Q",
-            "ns",
-            "sdx(m)",
-            "sdy(m)",
-            "sdz(m)",
-            "sdxy(m)",
-            "sdyz(m)",
-            "sdzx(m)",
-            "age(s)",
-            "ratio",
-        ]
-        df = pd.read_csv(move_file, comment="%", sep="\s+", names=header)
-        df["datetime"] = pd.to_datetime(
-            df["date"].astype(str) + " " + df["GPST"].astype(str),
-            format="%Y/%m/%d %H:%M:%S.%f",
-        )
-        ellipsoid = pm.Ellipsoid.from_name("wgs84")
-        baseLLH = pm.ecef2geodetic(
-            replaceDict["{x0}"], replaceDict["{y0}"], replaceDict["{z0}"], ellipsoid
-        )
-        df["X(m)"], df["Y(m)"], df["Z(m)"] = pm.ecef2enu(
-            df["X(m)"],
-            df["Y(m)"],
-            df["Z(m)"],
-            baseLLH[0],
-            baseLLH[1],
-            baseLLH[2],
-            ellipsoid,
+        with timer.stage("parse"):
+            df = read_pos(move_file)
+        with timer.stage("transform"):
+            station_frame = self.get_station_frame(
+                replaceDict["{x0}"], replaceDict["{y0}"], replaceDict["{z0}"]
+            )
+            df = station_frame.transform(df, rotate_sd=self.sd_frame == "enu")
+            df = result_frame(df)
+        if result_store is not None:
+            with timer.stage("write"):
+                result_store.commit(day, df, source_file=move_file)
+        return df
+
+    def run_windows(
+        self,
+        args: list,
+        day: pd.Timestamp,
+        windows: int,
+        cwd: str,
+        timer: StageTimer,
+    ) -> bool:
+        """
+        Runs rnx2rtkp (args of a whole-day run) over windows of the day with -ts/-te, all
+        submitted to the executor at once, and stitches them into the -o file of args. Each
+        window starts window_overlap minutes earlier, and those epochs are dropped, so the
+        solution converges before the epochs that are kept. The first and last windows are
+        open, so the stitched file has the same epochs as a whole-day run.
+        """
+        out_file = args[args.index("-o") + 1]
+        edges = [day + pd.Timedelta(days=1) * k / windows for k in range(windows + 1)]
+        overlap = pd.Timedelta(minutes=self.window_overlap)
+        window_files, bounds, futures = [], [], []
+        for k in range(windows):
+            window_args = list(args)
+            window_file = f"{out_file}.window{k:02}"
+            window_args[window_args.index("-o") + 1] = window_file
+            time_args = []
+            if k > 0:
+                start = max(edges[k] - overlap, day)
+                time_args += ["-ts", start.strftime("%Y/%m/%d"), start.strftime("%H:%M:%S")]
+            if k < windows - 1:
+                end = edges[k + 1]
+                time_args += ["-te", end.strftime("%Y/%m/%d"), end.strftime("%H:%M:%S")]
+            window_args[:0] = time_args
+            window_files.append(window_file)
+            bounds.append((edges[k] if k > 0 else None, edges[k + 1] if k < windows - 1 else None))
+            futures.append(self.executor.submit(window_args, cwd=cwd))
+        print(f"Running {windows} windows of {self.executor.command(args)}")
+        with timer.stage("run"):
+            results = [future.result() for future in futures]
+        for result in results:
+            timer.add_process(result)
+
+        try:
+            failed = [k for k, result in enumerate(results) if result.returncode != 0]
+            if len(failed) == 0 and all(os.path.exists(f) for f in window_files):
+                stitch_pos(window_files, bounds, out_file)
+                return True
+            print(f"Windows {failed} of {out_file} failed or some have no solution.")
+            return False
+        finally:
+            for window_file in window_files:
+                if os.path.exists(window_file):
+                    os.unlink(window_file)
+
+    def run_numpy_spp(
+        self,
+        ppp_executable: str,
+        obsFile: str,
+        navFile: str,
+        template_conf: str,
+        temporary_conf: str,
+        replaceDict: dict,
+        cwd: str = ".",
+        move_to=".",
+        timer: StageTimer | None = None,
+    ):
+        timer = timer or StageTimer()
+        # Solved in-process with the options of the rtklib template, nothing is written
+        with timer.stage("render"):
+            rendered_conf = self.temporaryConf(replaceDict, None, template_conf)
+        ionex = str(replaceDict["{ionex}"])
+        if "ionex-tec" in rendered_conf and not os.path.exists(ionex):
+            print(f"File {ionex} not found.")
+            return None
+        reference_position = np.array(
+            [replaceDict["{x0}"], replaceDict["{y0}"], replaceDict["{z0}"]], dtype=float
         )
-        return df[["datetime", "X(m)", "Y(m)", "Z(m)", "sdx(m)", "sdy(m)", "sdz(m)"]]
+        with timer.stage("run"):
+            df = run_spp(obsFile, navFile, rendered_conf, ionex, reference_position)
+        if len(df) == 0:
+            return None
+        with timer.stage("transform"):
+            station_frame = self.get_station_frame(*reference_position)
+            df = station_frame.transform(df, rotate_sd=self.sd_frame == "enu")
+        return result_frame(df)
+
+    def get_station_frame(self, x0: float, y0: float, z0: float) -> StationFrame:
+        # One frame per reference position, reused by all days of the process
+        key = (float(x0), float(y0), float(z0))
+        if key not in self.station_frames:
+            self.station_frames[key] = StationFrame(*key)
+        return self.station_frames[key]
 
     def absError(self, m):
         return np.sqrt(np.sum(np.array(m) ** 2, axis=1))
@@ -176,9 +330,27 @@ class PPPBatchProcessor:
 
         return d0, d1
 
+    def executable_version(self) -> str:
+        # The help text (and the binary itself, when it is a local file) identifies the build
+        test_run = self.executor.run(["--help"])
+        version = test_run.stdout + test_run.stderr
+        if isinstance(self.executor, LocalExecutor) and not isinstance(
+            self.executor, (DockerExecExecutor, LibraryExecutor)
+        ):
+            binary = shutil.which(self.executor.prefix[0])
+            if binary is not None:
+                version += ResultCache("").file_hash(binary)
+        if isinstance(self.executor, LibraryExecutor):
+            version += ResultCache("").file_hash(self.executor.library)
+        return version
+
     def test_executable(self, ppp_executable):
         # Checking if the executable is available
-        test_run = subprocess.run(ppp_executable, shell=True)
+        if self.executor is not None:
+            test_run = self.executor.run(["--help"])
+            ppp_executable = self.executor.command(["--help"])
+        else:
+            test_run = subprocess.run(ppp_executable, shell=True)
         if test_run.returncode > 0:
             print(f"Docker error while running {ppp_executable}.")
             print(
@@ -193,6 +365,125 @@ class PPPBatchProcessor:
         else:
             print(f"Using PPP executable: {ppp_executable}.")
 
+    def run_day(self, day: pd.Timestamp, settings: dict):
+        # Every day leaves a record in the run log, whatever happens to it
+        timer = StageTimer()
+        committed = False
+        try:
+            committed = self.process_day(day, settings, timer)
+            return committed
+        finally:
+            if settings["run_log"] is not None:
+                timer.status = timer.status or "error"
+                settings["run_log"].append(
+                    timer.record(
+                        kind="day",
+                        day=str(day.date()),
+                        station=settings["station"],
+                        experiment=settings["experiment_name"],
+                        committed=committed,
+                        pid=os.getpid(),
+                    )
+                )
+
+    def process_day(self, day: pd.Timestamp, settings: dict, timer: StageTimer):
+        station = settings["station"]
+        station_folder = os.path.join(settings["run_folder"], station)
+        year = str(day.year)
+        year_folder = os.path.join(station_folder, year)
+        fname = f"{station}{day.day_of_year:03}1.zip"
+
+        # Checking if the file exists
+        if not os.path.exists(os.path.join(year_folder, fname)):
+            print(day, day.day_of_year)
+            timer.status = "missing"
+            return False
+
+        # Without the result cache, a stored day is trusted (like an existing .pos file)
+        result_store = settings["result_store"]
+        if settings["result_cache"] is None and not self.update_pos:
+            if result_store.is_committed(day):
+                timer.status = "stored"
+                return True
+
+        # Unpacking it once for all experiments (or reusing what another experiment unpacked)
+        archive_path = os.path.join(year_folder, fname)
+        input_stage = settings["input_stage"]
+        try:
+            with timer.stage("unpack"):
+                day_folder = input_stage.acquire(archive_path, settings["experiment_name"])
+        except Exception as e:
+            print(f"Error unpacking archive {archive_path}: {e}")
+            print(day, day.day_of_year)
+            timer.status = "unpack_error"
+            return False
+
+        try:
+            return self.run_unpacked_day(day, day_folder, fname, settings, timer)
+        finally:
+            input_stage.release(archive_path, settings["experiment_name"])
+
+    def run_unpacked_day(
+        self,
+        day: pd.Timestamp,
+        day_folder: str,
+        fname: str,
+        settings: dict,
+        timer: StageTimer | None = None,
+    ):
+        timer = timer or StageTimer()
+        year = str(day.year)
+        y2d = day.year % 100
+        obsFile = os.path.join(day_folder, fname.replace(".zip", f".{y2d}o"))
+        navFile = os.path.join(day_folder, fname.replace(".zip", f".{y2d}n"))
+        ionex = os.path.join(
+            settings["ionex_folder"],
+            settings["ionex_pattern"].format(doy=day.day_of_year, y2d=y2d),
+        )
+        reference_position = settings["reference_position"]
+        replaceDict = {
+            "{ionex}": ionex,
+            "{x0}": reference_position[0],
+            "{y0}": reference_position[1],
+            "{z0}": reference_position[2],
+        }
+
+        # Each day gets its own scratch folder, so concurrent jobs never share a config file
+        job_folder = os.path.join(
+            settings["experiment_folder"], "jobs", fname.replace(".zip", f"_{year}")
+        )
+        os.makedirs(job_folder, exist_ok=True)
+        temporary_conf = os.path.join(job_folder, "temporary.inp")
+
+        result_store = settings["result_store"]
+        run_kwargs = {}
+        if settings["ppp_solution"] == "rtklib":
+            # rtklib commits the day itself, skipping it if its solution did not change
+            run_kwargs = {
+                "result_cache": settings["result_cache"],
+                "result_store": result_store,
+                "day": day,
+                "groups_per_file": settings["windows_per_day"],
+            }
+        run_kwargs["timer"] = timer
+        position = settings["run_ppp_method"](
+            settings["ppp_executable"],
+            obsFile,
+            navFile,
+            settings["template_conf"],
+            temporary_conf,
+            replaceDict=replaceDict,
+            move_to=settings["output_folder"],
+            **run_kwargs,
+        )
+        shutil.rmtree(job_folder, ignore_errors=True)
+        if not position is None and not "result_store" in run_kwargs:
+            with timer.stage("write"):
+                result_store.commit(day, position)
+        committed = result_store.is_committed(day)
+        timer.status = "processed" if committed else "no_solution"
+        return committed
+
     def main(self):
         # Getting configs from the yaml file
         experiment_name = self.config["process"].get("experiment_name")
@@ -202,83 +493,154 @@ class PPPBatchProcessor:
             run_ppp_method = self.run_rt_ppp  # this is a function
         elif self.config["process"].get("ppp_solution") == "rtklib":
             run_ppp_method = self.run_rtklib  # this is a function
+        elif self.config["process"].get("ppp_solution") == "numpy_spp":
+            run_ppp_method = self.run_numpy_spp  # this is a function
         ppp_executable_test = self.config["process"].get("ppp_executable_test")
-        ppp_executable = self.config["process"].get("ppp_executable")
-        template_conf = self.config["process"].get("ppp_template_conf")
-        temporary_conf = os.path.join(run_folder, "temporary.inp")
-        station = self.config["process"].get("station")
-        reference_position = self.config["process"].get("reference_position")
         save_array_as = self.config["process"].get("save_array_as")
-        ionex_pattern = self.config["process"].get("ionex_pattern")
-        ionex_folder = self.config["process"].get("ionex_folder")
+        workers = int(self.config["process"].get("workers", 1))
 
         # Getting dates
         d0, d1 = self.get_dates()
 
-        # Station folder
-        station_folder = os.path.join(run_folder, station)
-
         # Experiment folder
         experiment_folder = os.path.join(run_folder, experiment_name)
 
-        # Checking if the executable is available
-        self.test_executable(ppp_executable_test)
+        # rtklib jobs go through an executor (local binary, docker exec or a batch process)
+        if self.config["process"].get("ppp_solution") == "rtklib":
+            self.executor = make_executor(self.config["process"])
 
-        error = []
+        # Checking if the executable is available (numpy_spp does not use one)
+        if self.config["process"].get("ppp_solution") != "numpy_spp":
+            self.test_executable(ppp_executable_test)
 
         # Output folder
         output_folder = os.path.join(experiment_folder, "output")
+        os.makedirs(output_folder, exist_ok=True)
 
-        for day in tqdm(pd.date_range(d0, d1, freq="D")):
-            os.makedirs(output_folder, exist_ok=True)
-            year = str(day.year)
-            year_folder = os.path.join(station_folder, year)
-            fname = f"{station}{day.day_of_year:03}1.zip"
-
-            # Checking if the file exists
-            if not os.path.exists(os.path.join(year_folder, fname)):
-                print(day, day.day_of_year)
-                continue
-
-            # Trying to unzip it
-            try:
-                archive_path = os.path.join(year_folder, fname)
-                shutil.unpack_archive(archive_path, year_folder)
-            except Exception as e:
-                print(f"Error unpacking archive {archive_path}: {e}")
-                print(day, day.day_of_year)
-                continue
-
-            y2d = day.year % 100
-            outFilePos = os.path.join(year_folder, f'{fname.replace(".zip",".pos")}')
-            obsFile = os.path.join(year_folder, fname.replace(".zip", f".{y2d}o"))
-            navFile = os.path.join(year_folder, fname.replace(".zip", f".{y2d}n"))
-            navFile2 = os.path.join(year_folder, fname.replace(".zip", f".{y2d}g"))
-            ionex = os.path.join(
-                ionex_folder,
-                ionex_pattern.format(doy=day.day_of_year, y2d=day.year % 100),
+        # Folder shared by all experiments with the unpacked RINEX files
+        shared_inputs = self.config["process"].get("shared_inputs") or {}
+        inputs_folder = shared_inputs.get("folder", os.path.join(run_folder, "unpacked"))
+        if inputs_folder == "tmpfs":
+            inputs_folder = SharedInputStage.scratch_folder(
+                os.path.join(run_folder, "unpacked")
             )
-            replaceDict = {
-                "{ionex}": ionex,
-                "{x0}": reference_position[0],
-                "{y0}": reference_position[1],
-                "{z0}": reference_position[2],
-            }
+        max_size_gb = shared_inputs.get("max_size_gb")
+        input_stage = SharedInputStage(
+            inputs_folder,
+            max_bytes=None if max_size_gb is None else int(max_size_gb * 1024**3),
+        )
+        prefetch = int(shared_inputs.get("prefetch", 2))
+
+        # Results are reused only while their inputs stay the same
+        result_cache = None
+        cache_folder = self.config["process"].get(
+            "result_cache", os.path.join(run_folder, "result_cache")
+        )
+        if cache_folder and self.config["process"].get("ppp_solution") == "rtklib":
+            result_cache = ResultCache(cache_folder, self.executable_version())
+
+        # Everything a single day needs, so days can be sent to worker processes
+        settings = {
+            "run_folder": run_folder,
+            "experiment_name": experiment_name,
+            "input_stage": input_stage,
+            "experiment_folder": experiment_folder,
+            "output_folder": output_folder,
+            "run_ppp_method": run_ppp_method,
+            "ppp_executable": self.config["process"].get("ppp_executable"),
+            "template_conf": self.config["process"].get("ppp_template_conf"),
+            "station": self.config["process"].get("station"),
+            "reference_position": list(
+                self.config["process"].get("reference_position")
+            ),
+            "ionex_pattern": self.config["process"].get("ionex_pattern"),
+            "ionex_folder": self.config["process"].get("ionex_folder"),
+            "result_cache": result_cache,
+            "result_store": PartitionedResultStore(
+                self.config["process"].get(
+                    "results_folder", os.path.join(experiment_folder, "results")
+                ),
+                self.config["process"].get("station"),
+            ),
+            "ppp_solution": self.config["process"].get("ppp_solution"),
+            "run_log": None,
+            "windows_per_day": int(self.config["process"].get("windows_per_day", 1)),
+        }
+
+        # Stage times and resources of every day, next to the results (see instrumentation.py)
+        if self.config["process"].get("run_log", True):
+            settings["run_log"] = RunLog(
+                run_log_path(save_array_as),
+                f"{pd.Timestamp.now():%Y%m%dT%H%M%S}-{os.getpid()}",
+            )
+
+        days = pd.date_range(d0, d1, freq="D")
+        station = settings["station"]
+        archives = [
+            os.path.join(
+                run_folder, station, str(day.year), f"{station}{day.day_of_year:03}1.zip"
+            )
+            for day in days
+        ]
+
+        if workers > 1:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            # map keeps the submission order, so the prefetching below follows the days
+            results = pool.map(self.run_day, days, repeat(settings))
+        else:
+            pool = None
+            results = (self.run_day(day, settings) for day in days)
+
+        # Unpacking the next days in the background while the current ones are processed
+        prefetcher = ThreadPoolExecutor(max_workers=1)
+        lead = workers + prefetch if prefetch > 0 else 0
+
+        def prefetch_day(i):
+            if i < len(archives) and os.path.exists(archives[i]):
+                prefetcher.submit(input_stage.warm, archives[i])
+
+        for i in range(lead):
+            prefetch_day(i)
+
+        committed = 0
+        for i, day_committed in enumerate(tqdm(results, total=len(days))):
+            committed += int(day_committed)
+            prefetch_day(i + lead)
+
+        if pool is not None:
+            pool.shutdown()
+        prefetcher.shutdown()
+        input_stage.release_prefetched()
+        if self.executor is not None:
+            self.executor.close()
+        print(f"{committed} of {len(days)} days stored.")
+
+        # Joining the stored days in the single file read by the extras scripts
+        timer = StageTimer()
+        rows = settings["result_store"].compact(days, save_array_as)
+        if settings["run_log"] is not None:
+            settings["run_log"].append(timer.record(kind="run", step="compact", days=len(days)))
 
-            position = run_ppp_method(
-                ppp_executable,
-                obsFile,
-                navFile,
-                template_conf,
-                temporary_conf,
-                replaceDict=replaceDict,
-                move_to=output_folder,
+        # Pre-aggregated levels, so the plots do not resample the whole series every time
+        pyramid_levels = self.config["process"].get("pyramid_levels", LEVELS)
+        if rows > 0 and pyramid_levels:
+            timer = StageTimer()
+            build_pyramid(
+                (
+                    df.drop(columns=QUALITY_COLUMNS, errors="ignore")
+                    for df in settings["result_store"].iter_days(days)
+                ),
+                save_array_as,
+                list(pyramid_levels),
             )
-            if not position is None:
-                error.append(position)
+            if settings["run_log"] is not None:
+                settings["run_log"].append(timer.record(kind="run", step="pyramid"))
 
-        final_df = pd.concat(error).set_index("datetime")
-        final_df.to_parquet(save_array_as)
+        # The last experiment of a multirun removes the unpacked files
+        cleanup_after = shared_inputs.get("cleanup_after")
+        if cleanup_after:
+            removed = input_stage.cleanup(list(cleanup_after))
+            print(f"Removed {removed} unpacked days from {inputs_folder}.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,152 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# Default levels and the statistics stored for every column at each level
+LEVELS = ["5min", "1h", "2h", "1D"]
+STATS = ["mean", "min", "max", "count"]
+META = "pyramid.json"
+
+
+def pyramid_folder(save_as: str) -> str:
+    """Folder of the pyramid of a results file, e.g. data/unet/onrj.pyramid."""
+    return os.path.splitext(save_as)[0] + ".pyramid"
+
+
+def _signature(path: str) -> list:
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def build_pyramid(frames, save_as: str, levels: list = LEVELS) -> None:
+    """
+    Writes mean, min, max and count of every numeric column (indexed by datetime) at each
+    level, next to save_as. frames is a DataFrame or an iterable of consecutive frames, e.g.
+    one per day, which are aggregated one at a time (bins found in two frames are merged). The
+    pyramid records the mtime and size of save_as, so it is ignored once that file changes.
+    """
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    aggregated = {level: [] for level in levels}
+    for df in frames:
+        numeric = df.select_dtypes("number")
+        for level in levels:
+            aggregated[level].append(numeric.resample(level).agg(STATS))
+
+    folder = pyramid_folder(save_as)
+    os.makedirs(folder, exist_ok=True)
+    for level in levels:
+        if len(aggregated[level]) == 0:
+            continue
+        df = pd.concat(aggregated[level])
+        if df.index.has_duplicates:
+            df = _merge_bins(df)
+        # Same bins as resampling the whole series: missing ones have a count of 0
+        df = df.reindex(pd.date_range(df.index[0], df.index[-1], freq=level, name=df.index.name))
+        counts = [column for column in df.columns if column[1] == "count"]
+        df[counts] = df[counts].fillna(0).astype(np.int64)
+        df.columns = [f"{column}_{stat}" for column, stat in df.columns]
+        level_path = os.path.join(folder, f"{level}.parquet")
+        df.to_parquet(level_path + ".tmp")
+        os.replace(level_path + ".tmp", level_path)
+    with open(os.path.join(folder, META), "w") as f:
+        json.dump({"source": _signature(save_as), "levels": list(levels)}, f)
+
+
+def _merge_bins(df: pd.DataFrame) -> pd.DataFrame:
+    """Joins the bins found in two frames (e.g. a day file ending at midnight of the next)."""
+    merged = {}
+    for column in dict.fromkeys(column for column, _ in df.columns):
+        count = df[(column, "count")]
+        weighted = (df[(column, "mean")].fillna(0.0) * count).groupby(level=0).sum()
+        total = count.groupby(level=0).sum()
+        merged[(column, "mean")] = weighted / total.where(total > 0)
+        merged[(column, "min")] = df[(column, "min")].groupby(level=0).min()
+        merged[(column, "max")] = df[(column, "max")].groupby(level=0).max()
+        merged[(column, "count")] = total
+    return pd.DataFrame(merged)[df.columns]
+
+
+def _levels(save_as: str) -> list:
+    """Levels of a pyramid that is up to date with save_as (empty otherwise)."""
+    meta_path = os.path.join(pyramid_folder(save_as), META)
+    if not os.path.exists(meta_path) or not os.path.exists(save_as):
+        return []
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+    if meta["source"] != _signature(save_as):
+        return []
+    return meta["levels"]
+
+
+def _length(frequency: str) -> pd.Timedelta | None:
+    """Length of a fixed frequency (e.g. 4h, 1D). None for anchored ones (weeks, months)."""
+    offset = pd.tseries.frequencies.to_offset(frequency)
+    if not isinstance(offset, (pd.offsets.Tick, pd.offsets.Day)):
+        return None
+    return offset.n * pd.Timedelta(1, offset.rule_code)
+
+
+def choose_level(levels: list, frequency: str) -> str | None:
+    """Coarsest level whose bins fit a whole number of times in the frequency."""
+    target = _length(frequency)
+    if target is None:
+        return None
+    fitting = [
+        level
+        for level in levels
+        if target >= pd.Timedelta(level) and target % pd.Timedelta(level) == pd.Timedelta(0)
+    ]
+    if len(fitting) == 0:
+        return None
+    return max(fitting, key=pd.Timedelta)
+
+
+def read_level(
+    save_as: str,
+    frequency: str,
+    columns: list,
+    stat: str = "mean",
+    start=None,
+    end=None,
+) -> pd.DataFrame | None:
+    """
+    Returns the same frame as resample(frequency).<stat>() of the given columns, built from
+    the coarsest stored level instead of the raw epochs. Means are weighted by the counts of
+    each bin. start and end are inclusive, and an end date without time includes that whole
+    day, as in results_loader.load_results. Returns None when there is no up-to-date pyramid
+    or no level fits.
+    """
+    level = choose_level(_levels(save_as), frequency)
+    if level is None:
+        return None
+    needed = [f"{column}_{s}" for column in columns for s in (stat, "count")]
+    df = pd.read_parquet(
+        os.path.join(pyramid_folder(save_as), f"{level}.parquet"),
+        columns=list(dict.fromkeys(needed)),
+    )
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+    if end is not None and end == end.normalize():
+        end = end + pd.Timedelta(days=1) - pd.Timedelta(1, "ns")
+    df = df.loc[start:end]
+
+    if pd.Timedelta(level) == _length(frequency):
+        result = df[[f"{column}_{stat}" for column in columns]]
+        result.columns = list(columns)
+        return result
+
+    grouped = df.resample(frequency)
+    result = {}
+    for column in columns:
+        count = df[f"{column}_count"]
+        if stat == "mean":
+            weighted = (df[f"{column}_mean"].fillna(0.0) * count).resample(frequency).sum()
+            total = count.resample(frequency).sum()
+            result[column] = weighted / total.where(total > 0)
+        elif stat == "count":
+            result[column] = count.resample(frequency).sum()
+        else:
+            result[column] = grouped[f"{column}_{stat}"].agg(stat)
+    return pd.DataFrame(result)
@@ -0,0 +1,68 @@
+import os
+import shutil
+import hashlib
+
+
+class ResultCache:
+    """
+    Content-addressed store for the solution files of the PPP executable.
+
+    The key of a run is the hash of everything that can change its result: the content of
+    the input files (obs, nav, ionex), the rendered configuration, the command and the
+    executable version. A day is only computed again when its key is not in the cache,
+    so editing a template or replacing a GIM file invalidates exactly the affected days.
+    """
+
+    def __init__(self, folder: str, executable_version: str = "") -> None:
+        self.folder = folder
+        self.executable_version = executable_version
+        self._file_hashes = {}
+
+    def file_hash(self, path: str) -> str:
+        if not os.path.exists(path):
+            return "missing"
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._file_hashes:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+            self._file_hashes[memo_key] = h.hexdigest()
+        return self._file_hashes[memo_key]
+
+    def key(self, input_files: list, rendered_conf: str, command: str) -> str:
+        h = hashlib.sha256()
+        for path in input_files:
+            h.update(self.file_hash(path).encode())
+        h.update(rendered_conf.encode())
+        h.update(command.encode())
+        h.update(self.executable_version.encode())
+        return h.hexdigest()
+
+    def entry(self, key: str) -> str:
+        return os.path.join(self.folder, key[:2], f"{key}.pos")
+
+    @staticmethod
+    def _link(src: str, dest: str) -> None:
+        # Hard links keep a single copy on disk. Copying is the fallback across devices.
+        tmp = f"{dest}.tmp-{os.getpid()}"
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copy2(src, tmp)
+        os.replace(tmp, dest)
+
+    def fetch(self, key: str, dest: str) -> bool:
+        """Places the cached result in dest. Returns False if the key is not cached."""
+        entry = self.entry(key)
+        if not os.path.exists(entry):
+            return False
+        if not (os.path.exists(dest) and os.path.samefile(entry, dest)):
+            self._link(entry, dest)
+        return True
+
+    def store(self, key: str, src: str) -> None:
+        entry = self.entry(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        self._link(src, entry)
@@ -0,0 +1,171 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Columns of a results file, indexed by datetime. The positions are ENU offsets from the
+# reference position and the sigmas are meters, so float32 keeps them to a few micrometers.
+POSITION_COLUMNS = ["X(m)", "Y(m)", "Z(m)"]
+SD_COLUMNS = ["sdx(m)", "sdy(m)", "sdz(m)"]
+# Solution quality (1: fix .. 6: ppp) and number of satellites of rtklib
+QUALITY_COLUMNS = ["Q", "ns"]
+RESULT_COLUMNS = ["datetime"] + POSITION_COLUMNS + SD_COLUMNS + QUALITY_COLUMNS
+# In memory, Q and ns are nullable (rt_ppp may not give ns), so they keep one dtype
+QUALITY_DTYPE = "Int8"
+
+RESULT_SCHEMA = pa.schema(
+    [pa.field("datetime", pa.timestamp("ns"))]
+    + [pa.field(column, pa.float32()) for column in POSITION_COLUMNS + SD_COLUMNS]
+    + [pa.field(column, pa.int8()) for column in QUALITY_COLUMNS]
+)
+
+COMPRESSION = "zstd"
+COMPRESSION_LEVEL = 3
+# Epochs are evenly spaced and the floats compress better split by byte than through a
+# dictionary. Only Q and ns, with a handful of values, keep dictionary encoding.
+ENCODINGS = {"datetime": "DELTA_BINARY_PACKED"} | {
+    column: "BYTE_STREAM_SPLIT" for column in POSITION_COLUMNS + SD_COLUMNS
+}
+# About a month of 30 s epochs, so a date filter reads only the months it needs
+ROW_GROUP_SIZE = 31 * 2880
+
+
+def result_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """The RESULT_COLUMNS of a solution (NaN where missing), with Q and ns as Int8."""
+    df = df.reindex(columns=RESULT_COLUMNS)
+    return df.astype({column: QUALITY_DTYPE for column in QUALITY_COLUMNS})
+
+
+def to_result_table(df: pd.DataFrame, columns: list | None = None) -> pa.Table:
+    """
+    Converts a result frame (datetime as a column or as the index) to RESULT_SCHEMA. Columns
+    of the schema missing in df (e.g. Q and ns of older files) are left out, unless columns
+    lists the ones to keep. NaN quality values are stored as nulls, and Q and ns are recorded
+    as Int8 in the pandas metadata whatever their dtype here, so pd.read_parquet also gives
+    them one dtype.
+    """
+    if df.index.name == "datetime":
+        df = df.reset_index()
+    if columns is None:
+        columns = [column for column in RESULT_COLUMNS if column in df.columns]
+    dtypes = {column: "float32" for column in POSITION_COLUMNS + SD_COLUMNS if column in columns}
+    dtypes |= {column: QUALITY_DTYPE for column in QUALITY_COLUMNS if column in columns}
+    df = df[columns].astype(dtypes).set_index("datetime")
+    # Converted without the schema, whose datetime field comes first, since pyarrow would
+    # then describe the columns one place off in the pandas metadata
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    schema = pa.schema([RESULT_SCHEMA.field(column) for column in columns])
+    return table.select(columns).cast(schema.with_metadata(table.schema.metadata))
+
+
+class ResultWriter:
+    """
+    Writes result frames one after the other (e.g. one day at a time) in a single file with
+    RESULT_SCHEMA, so a result set never has to be in memory at once. Frames are buffered
+    into row groups of row_group_size rows. The file replaces path when the writer is
+    closed, and is dropped if the block of a with statement raises.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        columns: list = RESULT_COLUMNS,
+        compression: str = COMPRESSION,
+        row_group_size: int = ROW_GROUP_SIZE,
+    ) -> None:
+        self.path = path
+        self.tmp_path = f"{path}.tmp-{os.getpid()}"
+        self.columns = list(columns)
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self._pending = []
+        self._pending_rows = 0
+        self._writer = None
+
+    def __enter__(self) -> "ResultWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, df: pd.DataFrame) -> None:
+        table = to_result_table(df, self.columns)
+        if self._writer is None:
+            # The schema of the first table carries the pandas metadata (datetime index)
+            self._writer = pq.ParquetWriter(
+                self.tmp_path,
+                table.schema,
+                compression=self.compression,
+                compression_level=COMPRESSION_LEVEL if self.compression == COMPRESSION else None,
+                use_dictionary=[c for c in QUALITY_COLUMNS if c in self.columns],
+                column_encoding={c: e for c, e in ENCODINGS.items() if c in self.columns},
+            )
+        self._pending.append(table)
+        self._pending_rows += table.num_rows
+        self.rows += table.num_rows
+        if self._pending_rows >= self.row_group_size:
+            self._flush(whole_groups=True)
+
+    def _flush(self, whole_groups: bool) -> None:
+        table = pa.concat_tables(self._pending)
+        n = table.num_rows
+        if whole_groups:
+            n -= n % self.row_group_size
+        if n > 0:
+            self._writer.write_table(table.slice(0, n), row_group_size=self.row_group_size)
+        self._pending = [table.slice(n)]
+        self._pending_rows = table.num_rows - n
+
+    def close(self) -> None:
+        if self._writer is None:
+            self.write(pd.DataFrame(columns=self.columns))
+        if self._pending_rows > 0:
+            self._flush(whole_groups=False)
+        self._writer.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self.tmp_path):
+            os.unlink(self.tmp_path)
+
+
+def write_results(
+    df: pd.DataFrame,
+    path: str,
+    compression: str = COMPRESSION,
+    row_group_size: int = ROW_GROUP_SIZE,
+) -> None:
+    """Writes a result frame with RESULT_SCHEMA, replacing path atomically."""
+    if df.index.name == "datetime":
+        columns = [c for c in RESULT_COLUMNS if c == "datetime" or c in df.columns]
+    else:
+        columns = [c for c in RESULT_COLUMNS if c in df.columns]
+    with ResultWriter(path, columns, compression, row_group_size) as writer:
+        writer.write(df)
+
+
+def default_columns(path: str) -> list:
+    """Columns of a results file except datetime, Q and ns: the frame the extras expect."""
+    return [
+        column
+        for column in pq.read_schema(path).names
+        if column not in QUALITY_COLUMNS and column != "datetime"
+    ]
+
+
+def read_results(path: str, columns: list | None = None, filters: list | None = None) -> pd.DataFrame:
+    """
+    Reads a results file as a frame indexed by datetime (default_columns by default). Q and
+    ns come back as Int8, whether or not they have nulls.
+    """
+    if columns is None:
+        columns = default_columns(path)
+    df = pd.read_parquet(path, columns=list(columns), filters=filters)
+    quality = [column for column in QUALITY_COLUMNS if column in df.columns]
+    return df.astype({column: QUALITY_DTYPE for column in quality})
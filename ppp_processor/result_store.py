@@ -0,0 +1,113 @@
+import os
+import json
+import pandas as pd
+import pyarrow.parquet as pq
+from result_schema import write_results, ResultWriter, RESULT_COLUMNS
+
+
+class PartitionedResultStore:
+    """
+    Stores the result of every processed day as soon as it is finished, in a dataset
+    partitioned as {folder}/station={station}/year={year}/doy={doy}/part.parquet.
+
+    A day is committed by an atomic rename, so a crash never leaves half-written days and
+    a rerun can skip every committed day. Next to each part, source.json records which
+    solution file the day was built from, so days whose solution changed are rebuilt.
+    compact() joins the days into the single parquet file read by the extras scripts. Parts
+    and the joined file are written with RESULT_SCHEMA (see result_schema).
+    """
+
+    PART = "part.parquet"
+    SOURCE = "source.json"
+
+    def __init__(self, folder: str, station: str) -> None:
+        self.folder = folder
+        self.station = station
+
+    def partition(self, day: pd.Timestamp) -> str:
+        return os.path.join(
+            self.folder,
+            f"station={self.station}",
+            f"year={day.year}",
+            f"doy={day.day_of_year:03}",
+        )
+
+    @staticmethod
+    def source_signature(source_file: str) -> list:
+        stat = os.stat(source_file)
+        return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+    def is_committed(self, day: pd.Timestamp, source_file: str | None = None) -> bool:
+        """True if the day is stored and, when source_file is given, was built from it."""
+        partition = self.partition(day)
+        if not os.path.exists(os.path.join(partition, self.PART)):
+            return False
+        if source_file is None:
+            return True
+        source_path = os.path.join(partition, self.SOURCE)
+        if not os.path.exists(source_path) or not os.path.exists(source_file):
+            return False
+        with open(source_path, "r") as f:
+            return json.load(f) == self.source_signature(source_file)
+
+    def discard(self, day: pd.Timestamp) -> None:
+        """Removes a stored day, e.g. when its solution could not be computed again."""
+        partition = self.partition(day)
+        for name in [self.PART, self.SOURCE]:
+            path = os.path.join(partition, name)
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def commit(
+        self, day: pd.Timestamp, df: pd.DataFrame, source_file: str | None = None
+    ) -> None:
+        partition = self.partition(day)
+        os.makedirs(partition, exist_ok=True)
+        part_path = os.path.join(partition, self.PART)
+        source_path = os.path.join(partition, self.SOURCE)
+        # The old source goes first and the new one is written last, so a crash in between
+        # leaves a part without a source, which is rebuilt, never a stale part with a new one
+        if os.path.exists(source_path):
+            os.unlink(source_path)
+        write_results(df, part_path)
+        if source_file is not None:
+            with open(source_path + ".tmp", "w") as f:
+                json.dump(self.source_signature(source_file), f)
+            os.replace(source_path + ".tmp", source_path)
+
+    @staticmethod
+    def read_part(part_path: str) -> pd.DataFrame:
+        df = pd.read_parquet(part_path)
+        # Parts written before the result schema keep datetime as a column
+        if "datetime" in df.columns:
+            df = df.set_index("datetime")
+        return df
+
+    def committed_parts(self, days: pd.DatetimeIndex) -> list:
+        return [
+            os.path.join(self.partition(day), self.PART)
+            for day in days
+            if self.is_committed(day)
+        ]
+
+    def iter_days(self, days: pd.DatetimeIndex):
+        """Yields the committed days of the range, one frame (indexed by datetime) at a time."""
+        for part in self.committed_parts(days):
+            yield self.read_part(part).sort_index()
+
+    def compact(self, days: pd.DatetimeIndex, save_as: str) -> int:
+        """
+        Joins the committed days of the range into a single parquet file, streaming one day
+        at a time. Returns the number of rows written (0 if no day is committed).
+        """
+        parts = self.committed_parts(days)
+        if len(parts) == 0:
+            print("No committed days to compact.")
+            return 0
+        # Parts written before the result schema (or by rt_ppp) may lack some columns
+        names = set.intersection(*[set(pq.read_schema(part).names) for part in parts])
+        columns = [column for column in RESULT_COLUMNS if column in names]
+        with ResultWriter(save_as, columns) as writer:
+            for df in self.iter_days(days):
+                writer.write(df)
+        return writer.rows
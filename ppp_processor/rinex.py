@@ -0,0 +1,406 @@
+import numpy as np
+
+GPS_EPOCH = np.datetime64("1980-01-06T00:00:00", "ns")
+
+# Broadcast orbit parameters of a GPS navigation record, in file order
+NAV_FIELDS = [
+    "af0", "af1", "af2",
+    "iode", "crs", "delta_n", "m0",
+    "cuc", "e", "cus", "sqrt_a",
+    "toe", "cic", "omega0", "cis",
+    "i0", "crc", "omega", "omega_dot",
+    "idot", "codes_l2", "week", "l2p_flag",
+    "sv_accuracy", "health", "tgd", "iodc",
+    "ttom", "fit_interval",
+]  # fmt: skip
+
+# Lines of a navigation record per system (GLONASS and SBAS records are shorter)
+NAV_RECORD_LINES = {"G": 8, "E": 8, "J": 8, "C": 8, "I": 8, "R": 4, "S": 4}
+
+# RINEX 3 codes used when a RINEX 2 observable is asked from a RINEX 3 file
+V2_TO_V3 = {
+    "C1": ["C1C"],
+    "P1": ["C1W", "C1P"],
+    "P2": ["C2W", "C2P"],
+    "C2": ["C2L", "C2S", "C2X"],
+    "C5": ["C5Q", "C5X", "C5I"],
+    "L1": ["L1C"],
+    "L2": ["L2W", "L2P", "L2L", "L2X"],
+    "L5": ["L5Q", "L5X", "L5I"],
+    "D1": ["D1C"],
+    "D2": ["D2W", "D2P"],
+    "S1": ["S1C"],
+    "S2": ["S2W", "S2P", "S2L", "S2X"],
+    "S5": ["S5Q", "S5X", "S5I"],
+}
+
+# Header records that describe the observations and are rewritten (or dropped) by the writer
+V2_TYPES = "# / TYPES OF OBSERV"
+V3_TYPES = "SYS / # / OBS TYPES"
+COUNT_RECORDS = ["# OF SATELLITES", "PRN / # OF OBS"]
+# Event flags followed by header records instead of observations (start moving, new site
+# occupation, header information, external event). Flag 6 epochs list cycle slips with the
+# layout of observations.
+EVENT_FLAGS = [2, 3, 4, 5]
+CYCLE_SLIP_FLAG = 6
+
+
+def _float(field: str) -> float:
+    field = field.strip()
+    return float(field.replace("D", "E").replace("d", "E")) if field else 0.0
+
+
+def _epoch_seconds(year: int, month: int, day: int, hour: int, minute: int, second: float):
+    """Seconds since the GPS epoch (no leap seconds: RINEX GPS files are in GPS time)."""
+    if year < 100:
+        year += 2000 if year < 80 else 1900
+    date = np.datetime64(f"{year:04}-{month:02}-{day:02}", "s")
+    return (date - GPS_EPOCH.astype("datetime64[s]")) / np.timedelta64(1, "s") + (
+        hour * 3600 + minute * 60 + second
+    )
+
+
+class ObsHeader:
+    """
+    Header of an observation file. types maps each system letter to its observable codes
+    (RINEX 2 files share one list, stored under every system).
+    """
+
+    SYSTEMS = "GRESCJI"
+
+    def __init__(self, lines: list) -> None:
+        self.lines = lines
+        self.version = float(lines[0][:9])
+        self.types = {}
+        self.approx_position = np.zeros(3)
+
+        v2_types = []
+        system = None
+        for line in lines:
+            label = line[60:].strip()
+            if label == V2_TYPES:
+                v2_types += line[6:60].split()
+            elif label == V3_TYPES:
+                # Continuation lines leave the system letter blank
+                if line[0] != " ":
+                    system = line[0]
+                    self.types[system] = []
+                self.types[system] += line[7:60].split()
+            elif label == "APPROX POSITION XYZ":
+                self.approx_position = np.array([float(v) for v in line[:60].split()[:3]])
+        if self.version < 3:
+            self.types = {s: v2_types for s in self.SYSTEMS}
+
+    def resolve(self, system: str, observables: list) -> list:
+        """Index of each observable in the records of system (None if absent)."""
+        types = self.types.get(system, [])
+        columns = []
+        for observable in observables:
+            candidates = [observable] + V2_TO_V3.get(observable, [])
+            columns.append(next((types.index(c) for c in candidates if c in types), None))
+        return columns
+
+
+class ObsEpoch:
+    """
+    One epoch of an observation file. fields holds, for every satellite, the raw 16-character
+    fields (value, LLI and signal strength) in the order of the header types of its system.
+    Epochs with one of EVENT_FLAGS carry header records in special_lines instead.
+    """
+
+    def __init__(
+        self,
+        time: float,
+        time_text: str,
+        flag: int,
+        clock_offset: str,
+        sats: list,
+        fields: list,
+        special_lines: list | None = None,
+    ) -> None:
+        self.time = time
+        self.time_text = time_text
+        self.flag = flag
+        self.clock_offset = clock_offset
+        self.sats = sats
+        self.fields = fields
+        self.special_lines = special_lines or []
+
+
+def read_obs_header(f) -> ObsHeader:
+    lines = []
+    for line in f:
+        lines.append(line.rstrip("\n"))
+        if line[60:].strip() == "END OF HEADER":
+            break
+    return ObsHeader(lines)
+
+
+def _split_fields(record: str) -> list:
+    return [record[k : k + 16] for k in range(0, len(record), 16)]
+
+
+def iter_obs(f, header: ObsHeader, systems: str | None = None):
+    """
+    Yields the epochs of an open observation file, one at a time, so a day of 1 Hz data
+    never has to be in memory. Satellites of other systems are skipped when systems is set.
+    """
+    v2 = header.version < 3
+    n_types = {s: len(types) for s, types in header.types.items()}
+    for line in f:
+        line = line.rstrip("\n")
+        if v2:
+            if len(line) < 29:
+                continue
+            flag_text = line[26:29].strip()
+            # Event flags 2 to 5 may leave the time blank. Their records follow anyway.
+            if not line[:26].strip() and flag_text not in ["2", "3", "4", "5"]:
+                continue
+            flag = int(flag_text or 0)
+            n_sats = int(line[29:32] or 0)
+            time_text = line[:26]
+        else:
+            if not line.startswith(">"):
+                continue
+            flag = int(line[29:32] or 0)
+            n_sats = int(line[32:35] or 0)
+            time_text = line[1:29]
+        if flag in EVENT_FLAGS:
+            special = [next(f).rstrip("\n") for _ in range(n_sats)]
+            yield ObsEpoch(None, time_text, flag, "", [], [], special)
+            continue
+
+        fields = time_text.split()
+        time = _epoch_seconds(
+            int(fields[0]),
+            int(fields[1]),
+            int(fields[2]),
+            int(fields[3]),
+            int(fields[4]),
+            float(fields[5]),
+        )
+        sats = []
+        records = []
+        if v2:
+            clock_offset = line[68:80]
+            sat_text = line[32:68]
+            for _ in range((n_sats - 1) // 12):
+                sat_text += next(f)[32:68]
+            for s in range(n_sats):
+                sat = sat_text[3 * s : 3 * s + 3]
+                system = sat[0] if sat[0] != " " else "G"
+                n_lines = (n_types[system] + 4) // 5
+                record = "".join(next(f).rstrip("\n").ljust(80) for _ in range(n_lines))
+                if systems is None or system in systems:
+                    sats.append(f"{system}{int(sat[1:]):02}")
+                    records.append(_split_fields(record[: 16 * n_types[system]]))
+        else:
+            clock_offset = line[41:56]
+            for _ in range(n_sats):
+                record = next(f).rstrip("\n")
+                system = record[0]
+                if systems is None or system in systems:
+                    sats.append(f"{system}{int(record[1:3]):02}")
+                    body = record[3:].ljust(16 * n_types.get(system, 0))
+                    records.append(_split_fields(body))
+        yield ObsEpoch(time, time_text, flag, clock_offset, sats, records)
+
+
+def select_fields(epoch: ObsEpoch, columns: dict) -> list:
+    """Fields of each satellite reordered by columns ({system: [index or None]})."""
+    blank = " " * 16
+    selected = []
+    for sat, fields in zip(epoch.sats, epoch.fields):
+        selected.append(
+            [fields[c] if c is not None and c < len(fields) else blank for c in columns[sat[0]]]
+        )
+    return selected
+
+
+class ObsWriter:
+    """
+    Writes observation files in the version of their header, with the observables given
+    for each system. Satellite counts of the header are dropped, since they would be wrong.
+    """
+
+    def __init__(self, f, header: ObsHeader, observables: dict) -> None:
+        self.f = f
+        self.v2 = header.version < 3
+        self.observables = observables
+        self._write_header(header)
+
+    def _write_header(self, header: ObsHeader) -> None:
+        written = False
+        for line in header.lines:
+            label = line[60:].strip()
+            if label in COUNT_RECORDS:
+                continue
+            if label in (V2_TYPES, V3_TYPES):
+                if not written:
+                    for types_line in self._types_lines():
+                        self.f.write(types_line + "\n")
+                    written = True
+                continue
+            self.f.write(line + "\n")
+
+    def _types_lines(self) -> list:
+        lines = []
+        if self.v2:
+            types = next(iter(self.observables.values()))
+            for k in range(0, max(len(types), 1), 9):
+                count = f"{len(types):6d}" if k == 0 else " " * 6
+                codes = "".join(f"{t:>6}" for t in types[k : k + 9])
+                lines.append(f"{count}{codes}".ljust(60) + V2_TYPES)
+        else:
+            for system, types in self.observables.items():
+                for k in range(0, max(len(types), 1), 13):
+                    prefix = f"{system}  {len(types):3d}" if k == 0 else " " * 6
+                    codes = "".join(f" {t:>3}" for t in types[k : k + 13])
+                    lines.append(f"{prefix}{codes}".ljust(60) + V3_TYPES)
+        return lines
+
+    def write(self, epoch: ObsEpoch, fields: list) -> None:
+        if epoch.flag in EVENT_FLAGS:
+            count = len(epoch.special_lines)
+            if self.v2:
+                self.f.write(f"{epoch.time_text}{epoch.flag:3d}{count:3d}\n")
+            else:
+                self.f.write(f">{epoch.time_text}{epoch.flag:3d}{count:3d}\n")
+            for line in epoch.special_lines:
+                self.f.write(line + "\n")
+            return
+        n_sats = len(epoch.sats)
+        if self.v2:
+            names = [f"{sat[0]}{sat[1:]:>2}" for sat in epoch.sats]
+            first = f"{epoch.time_text}{epoch.flag:3d}{n_sats:3d}" + "".join(names[:12])
+            if epoch.clock_offset.strip():
+                first = first.ljust(68) + epoch.clock_offset
+            self.f.write(first + "\n")
+            for k in range(12, n_sats, 12):
+                self.f.write(" " * 32 + "".join(names[k : k + 12]) + "\n")
+            for sat_fields in fields:
+                for k in range(0, max(len(sat_fields), 1), 5):
+                    self.f.write("".join(sat_fields[k : k + 5]).rstrip() + "\n")
+        else:
+            first = f">{epoch.time_text}{epoch.flag:3d}{n_sats:3d}"
+            if epoch.clock_offset.strip():
+                first = first.ljust(41) + epoch.clock_offset
+            self.f.write(first + "\n")
+            for sat, sat_fields in zip(epoch.sats, fields):
+                self.f.write((sat + "".join(sat_fields)).rstrip() + "\n")
+
+
+def filter_obs(
+    obs_file: str, out_file: str, systems: str = "G", observables: list | None = None
+) -> int:
+    """
+    Copies obs_file to out_file keeping only the satellites of systems and, if given, the
+    observables (RINEX 2 codes also select their RINEX 3 equivalents). Returns the number
+    of epochs written.
+    """
+    with open(obs_file, "r") as f, open(out_file, "w") as out:
+        header = read_obs_header(f)
+        kept = {}
+        columns = {}
+        for system in systems:
+            types = header.types.get(system, [])
+            if observables is None:
+                indexes = list(range(len(types)))
+            else:
+                indexes = [c for c in header.resolve(system, observables) if c is not None]
+            columns[system] = indexes
+            kept[system] = [types[c] for c in indexes]
+        if header.version < 3:
+            # RINEX 2 files have a single list of observables for every system
+            columns = {s: columns[systems[0]] for s in header.SYSTEMS}
+            kept = {systems[0]: kept[systems[0]]}
+        writer = ObsWriter(out, header, kept)
+        n_epochs = 0
+        for epoch in iter_obs(f, header, systems):
+            writer.write(epoch, select_fields(epoch, columns))
+            n_epochs += 1
+    return n_epochs
+
+
+def read_obs(obs_file: str, observables: list, system: str = "G") -> dict:
+    """
+    Reads the observations of one system of a RINEX 2 or 3 observation file, streaming it
+    epoch by epoch. Returns columnar arrays with one row per satellite and epoch: time
+    (seconds since the GPS epoch), prn, and one float64 column per observable (NaN when
+    missing), plus approx_position.
+    """
+    time = []
+    prn = []
+    values = []
+    with open(obs_file, "r") as f:
+        header = read_obs_header(f)
+        columns = {system: header.resolve(system, observables)}
+        for epoch in iter_obs(f, header, system):
+            # Cycle slip records repeat observations of other epochs
+            if epoch.flag in EVENT_FLAGS or epoch.flag == CYCLE_SLIP_FLAG:
+                continue
+            for sat, fields in zip(epoch.sats, select_fields(epoch, columns)):
+                time.append(epoch.time)
+                prn.append(int(sat[1:]))
+                values.append([field[:14] for field in fields])
+
+    # All values of the day are converted by a single call
+    values = np.array(values, dtype="U14").reshape(-1, len(observables))
+    numeric = np.char.strip(values)
+    numeric[numeric == ""] = "nan"
+    numeric = numeric.astype(np.float64)
+    obs = {
+        "time": np.array(time, dtype=np.float64),
+        "prn": np.array(prn, dtype=np.int16),
+        "approx_position": header.approx_position,
+    }
+    for k, observable in enumerate(observables):
+        obs[observable] = numeric[:, k]
+    return obs
+
+
+def read_nav(nav_file: str) -> dict:
+    """
+    Reads the GPS broadcast ephemeris of a RINEX 2 or 3 (also mixed) navigation file.
+    Returns columnar arrays: prn, toc (seconds since the GPS epoch) and every field of
+    NAV_FIELDS.
+    """
+    prn = []
+    toc = []
+    values = []
+    with open(nav_file, "r") as f:
+        version = float(next(f)[:9])
+        for line in f:
+            if line[60:].strip() == "END OF HEADER":
+                break
+        v2 = version < 3
+        for first in f:
+            if not first.strip():
+                continue
+            system = "G" if v2 else first[0]
+            lines = [next(f) for _ in range(NAV_RECORD_LINES.get(system, 8) - 1)]
+            if system != "G":
+                continue
+            if v2:
+                prn.append(int(first[0:2]))
+                epoch = first[3:22].split()
+                start, indent = 22, 3
+            else:
+                prn.append(int(first[1:3]))
+                epoch = first[4:23].split()
+                start, indent = 23, 4
+            toc.append(_epoch_seconds(*[int(v) for v in epoch[:5]], float(epoch[5])))
+            record = [_float(first[start + 19 * k : start + 19 * (k + 1)]) for k in range(3)]
+            for line in lines:
+                record += [
+                    _float(line[indent + 19 * k : indent + 19 * (k + 1)]) for k in range(4)
+                ]
+            values.append(record[: len(NAV_FIELDS)])
+
+    values = np.array(values, dtype=np.float64).reshape(-1, len(NAV_FIELDS))
+    nav = {"prn": np.array(prn, dtype=np.int16), "toc": np.array(toc, dtype=np.float64)}
+    for k, field in enumerate(NAV_FIELDS):
+        nav[field] = values[:, k]
+    # toe is given in seconds of the GPS week
+    nav["toe"] = nav["week"] * 604800.0 + nav["toe"]
+    return nav
@@ -0,0 +1,93 @@
+import os
+import sys
+import ctypes
+import threading
+
+# Built by rtklib_docker/build_library.sh
+DEFAULT_LIBRARY = "rtklib_docker/librtklib.so"
+
+# Options of rnx2rtkp and their number of values. main() calls exit() on the others
+# (through printhelp), which would end the calling process.
+OPTIONS = {
+    "-k": 1, "-o": 1, "-ts": 2, "-te": 2, "-ti": 1, "-tu": 1, "-p": 1, "-m": 1, "-sys": 1,
+    "-f": 1, "-v": 1, "-bl": 1, "-d": 1, "-s": 1, "-r": 3, "-l": 3, "-y": 1, "-x": 1,
+    "-b": 0, "-c": 0, "-i": 0, "-h": 0, "-e": 0, "-a": 0, "-n": 0, "-g": 0, "-t": 0, "-u": 0,
+}  # fmt: skip
+
+# Libraries already loaded by this process, by path
+_libraries = {}
+_libraries_lock = threading.Lock()
+
+
+class RtklibLibrary:
+    """
+    rnx2rtkp inside the Python process: main() of rnx2rtkp.c, exported by librtklib.so as
+    rnx2rtkp_main, called through ctypes with the same arguments as the binary. Options and
+    solutions still go through files: postpos only reads and writes them.
+
+    RTKLIB keeps the observations, navigation data and options of a run in global
+    variables, so the calls of one process are serialized by a lock. rnx2rtkp also calls
+    exit() on some errors, so LibraryExecutor runs every job in its own process, through
+    the __main__ of this module.
+    """
+
+    def __init__(self, path: str = DEFAULT_LIBRARY) -> None:
+        self.path = os.path.abspath(path)
+        self._library = ctypes.CDLL(self.path)
+        self._library.rnx2rtkp_main.argtypes = [ctypes.c_int, ctypes.POINTER(ctypes.c_char_p)]
+        self._library.rnx2rtkp_main.restype = ctypes.c_int
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def load(path: str = DEFAULT_LIBRARY) -> "RtklibLibrary":
+        """The library of this process, loaded on first use."""
+        path = os.path.abspath(path)
+        with _libraries_lock:
+            if path not in _libraries:
+                _libraries[path] = RtklibLibrary(path)
+            return _libraries[path]
+
+    def run(self, args: list) -> int:
+        """Runs rnx2rtkp with args (without the program name). Returns postpos' status."""
+        problem = check_args(args)
+        if problem is not None:
+            raise ValueError(problem)
+        argv = [b"rnx2rtkp"] + [str(a).encode() for a in args]
+        array = (ctypes.c_char_p * (len(argv) + 1))(*argv, None)
+        with self._lock:
+            return self._library.rnx2rtkp_main(len(argv), array)
+
+
+def check_args(args: list, cwd: str = ".") -> str | None:
+    """
+    Why rnx2rtkp would exit() instead of returning with args (unknown options, missing
+    values, a missing configuration or input file), or None when they are fine.
+    """
+    args = [str(a) for a in args]
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in OPTIONS:
+            values = args[i + 1 : i + 1 + OPTIONS[arg]]
+            if len(values) < OPTIONS[arg]:
+                return f"rnx2rtkp option {arg} needs {OPTIONS[arg]} value(s)."
+            if arg == "-k" and not os.path.isfile(os.path.join(cwd, values[0])):
+                return f"rnx2rtkp configuration {values[0]} not found."
+            i += 1 + OPTIONS[arg]
+        elif arg.startswith("-"):
+            return f"Unknown rnx2rtkp option {arg} (rnx2rtkp would print its help and exit)."
+        elif not os.path.isfile(os.path.join(cwd, arg)):
+            return f"rnx2rtkp input {arg} not found."
+        else:
+            i += 1
+    return None
+
+
+def run_library(path: str, args: list) -> int:
+    """Runs a job with the library of the calling process."""
+    return RtklibLibrary.load(path).run(args)
+
+
+if __name__ == "__main__":
+    # python rtklib_library.py <library> <rnx2rtkp arguments>: one job in its own process
+    sys.exit(run_library(sys.argv[1], sys.argv[2:]))
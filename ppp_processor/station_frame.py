@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pymap3d as pm
+
+POSITION_COLUMNS = ["X(m)", "Y(m)", "Z(m)"]
+
+# rtklib writes the covariance as signed square roots: sdxy = sign(qxy) * sqrt(|qxy|)
+SD_COLUMNS = ["sdx(m)", "sdy(m)", "sdz(m)", "sdxy(m)", "sdyz(m)", "sdzx(m)"]
+
+
+class StationFrame:
+    """
+    Local East/North/Up frame of a station. The geodetic origin and the ECEF to ENU
+    rotation are computed once, so any number of epochs (one day or a whole year) is
+    converted with a single matrix product.
+    """
+
+    def __init__(self, x0: float, y0: float, z0: float) -> None:
+        self.origin = np.array([x0, y0, z0], dtype=np.float64)
+        ellipsoid = pm.Ellipsoid.from_name("wgs84")
+        self.lat, self.lon, self.height = pm.ecef2geodetic(x0, y0, z0, ellipsoid)
+        lat = np.radians(self.lat)
+        lon = np.radians(self.lon)
+        # Rows are the East, North and Up unit vectors in ECEF
+        self.rotation = np.array(
+            [
+                [-np.sin(lon), np.cos(lon), 0.0],
+                [-np.sin(lat) * np.cos(lon), -np.sin(lat) * np.sin(lon), np.cos(lat)],
+                [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)],
+            ]
+        )
+
+    def to_enu(self, xyz: np.ndarray) -> np.ndarray:
+        """Converts ECEF positions (n, 3) to ENU offsets (n, 3) from the origin."""
+        return (np.asarray(xyz, dtype=np.float64) - self.origin) @ self.rotation.T
+
+    def covariance_to_enu(self, sd: np.ndarray) -> np.ndarray:
+        """
+        Rotates rtklib's standard deviations (n, 6), ordered as sdx, sdy, sdz, sdxy, sdyz,
+        sdzx, to the ENU frame. The result uses the same order and signed square roots.
+        """
+        sd = np.asarray(sd, dtype=np.float64)
+        q = np.sign(sd) * sd**2
+        cov = np.empty((len(sd), 3, 3))
+        cov[:, 0, 0], cov[:, 1, 1], cov[:, 2, 2] = q[:, 0], q[:, 1], q[:, 2]
+        cov[:, 0, 1] = cov[:, 1, 0] = q[:, 3]
+        cov[:, 1, 2] = cov[:, 2, 1] = q[:, 4]
+        cov[:, 2, 0] = cov[:, 0, 2] = q[:, 5]
+        enu = self.rotation @ cov @ self.rotation.T
+        q_enu = np.stack(
+            [
+                enu[:, 0, 0],
+                enu[:, 1, 1],
+                enu[:, 2, 2],
+                enu[:, 0, 1],
+                enu[:, 1, 2],
+                enu[:, 2, 0],
+            ],
+            axis=1,
+        )
+        return np.sign(q_enu) * np.sqrt(np.abs(q_enu))
+
+    def transform(self, df: pd.DataFrame, rotate_sd: bool = True) -> pd.DataFrame:
+        """
+        Converts the X(m), Y(m), Z(m) columns to ENU offsets and, if rotate_sd is set and the
+        columns are present, the sdx..sdzx columns to the ENU covariance. Names are kept.
+        """
+        df = df.copy()
+        df[POSITION_COLUMNS] = self.to_enu(df[POSITION_COLUMNS].to_numpy())
+        if rotate_sd and set(SD_COLUMNS).issubset(df.columns):
+            df[SD_COLUMNS] = self.covariance_to_enu(df[SD_COLUMNS].to_numpy())
+        return df
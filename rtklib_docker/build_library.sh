@@ -0,0 +1,30 @@
+#!/bin/sh
+# Builds rnx2rtkp as a shared library (librtklib.so) for the "library" executor backend,
+# from the same rtklibexplorer sources used by the Dockerfile.
+#
+#   sh rtklib_docker/build_library.sh [RTKLIB folder] [output file]
+#
+# The objects are compiled by rnx2rtkp's own makefile (same options as the binary) with
+# -fPIC, and main() of rnx2rtkp.c is exported as rnx2rtkp_main(argc, argv).
+set -e
+
+RTKLIB=${1:-RTKLIB}
+OUTPUT=${2:-rtklib_docker/librtklib.so}
+
+if [ ! -d "$RTKLIB" ]; then
+    git clone https://github.com/rtklibexplorer/RTKLIB.git "$RTKLIB"
+fi
+OUTPUT=$(cd "$(dirname "$OUTPUT")" && pwd)/$(basename "$OUTPUT")
+
+cd "$RTKLIB/app/consapp/rnx2rtkp/gcc"
+make clean > /dev/null 2>&1 || true
+make -j4 CC="gcc -fPIC"
+
+# Same defines and include folder as the makefile
+OPTS=$(sed -n 's/^OPTS *= *//p' makefile)
+SRC=$(sed -n 's/^SRC *= *//p' makefile)
+gcc -fPIC -O3 -I"$SRC" $OPTS -Dmain=rnx2rtkp_main -c ../rnx2rtkp.c -o rnx2rtkp_library.o
+
+OBJECTS=$(ls *.o | grep -v -e '^rnx2rtkp\.o$' -e '^rnx2rtkp_library\.o$')
+gcc -shared -o "$OUTPUT" $OBJECTS rnx2rtkp_library.o -lm -lpthread
+echo "Built $OUTPUT"
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules import each other by name, as when they are run as scripts
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for folder in ['ppp_processor', 'ppp_preprocessor', 'extras', 'benchmarks']:
+    sys.path.insert(0, os.path.join(ROOT, folder))
@@ -0,0 +1,27 @@
+/* Stand-in for librtklib.so: rnx2rtkp_main writes the number of runs of the process to -o.
+   An input named exit.obs makes it call exit(3), one named crash.obs makes it abort(). */
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+static int runs = 0;
+
+int rnx2rtkp_main(int argc, char **argv)
+{
+    const char *out = NULL;
+    int i;
+
+    runs++;
+    for (i = 1; i < argc; i++) {
+        if (!strcmp(argv[i], "-o") && i + 1 < argc) out = argv[++i];
+        else if (strstr(argv[i], "exit.obs")) exit(3);
+        else if (strstr(argv[i], "crash.obs")) abort();
+    }
+    if (out) {
+        FILE *f = fopen(out, "w");
+        if (!f) return 1;
+        fprintf(f, "runs=%d\n", runs);
+        fclose(f);
+    }
+    return 0;
+}
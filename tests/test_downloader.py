@@ -0,0 +1,175 @@
+import io
+import os
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from downloader import Downloader
+
+
+def make_zip(size=200_000):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as z:
+        z.writestr("onrj0011.15o", os.urandom(size))
+    return buffer.getvalue()
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.files = {}  # {path: bytes}
+        self.cut = {}  # {path: number of responses to cut in half}
+        self.requests = []  # (path, Range header)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("Range")))
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        offset = 0
+        if self.headers.get("Range"):
+            offset = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {offset}-{len(data) - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+        body = data[offset:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.server.cut.get(self.path, 0) > 0:
+            # Announces the whole body and drops the connection halfway
+            self.server.cut[self.path] -= 1
+            self.wfile.write(body[: len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = Server()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+@pytest.fixture
+def downloader():
+    downloader = Downloader(workers=2, retries=2, backoff=0, timeout=5)
+    yield downloader
+    downloader.close()
+
+
+def test_resumes_partial_download(server, downloader, tmp_path):
+    data = make_zip()
+    server.files["/onrj0011.zip"] = data
+    server.cut["/onrj0011.zip"] = 1
+    file = str(tmp_path / "onrj0011.zip")
+
+    assert downloader.fetch(url(server, "/onrj0011.zip"), file)
+    with open(file, "rb") as f:
+        assert f.read() == data
+    assert not os.path.exists(file + ".part")
+    # The second request continues after the bytes received by the first one
+    assert server.requests == [("/onrj0011.zip", None), ("/onrj0011.zip", f"bytes={len(data) // 2}-")]
+
+
+def test_rejects_truncated_z(server, downloader, tmp_path):
+    # Unix compress header: a .Z cut short still starts like a valid one
+    server.files["/codg0010.15i.Z"] = b"\x1f\x9d\x90" + os.urandom(50_000)
+    server.cut["/codg0010.15i.Z"] = 100
+    file = str(tmp_path / "codg0010.15i.Z")
+
+    assert not downloader.fetch(url(server, "/codg0010.15i.Z"), file)
+    assert not os.path.exists(file)
+    assert not os.path.exists(file + ".part")
+    assert len(server.requests) == downloader.retries + 1
+
+
+def test_rejects_invalid_z(server, downloader, tmp_path):
+    server.files["/codg0010.15i.Z"] = b"<html>not found</html>"
+    file = str(tmp_path / "codg0010.15i.Z")
+
+    assert not downloader.fetch(url(server, "/codg0010.15i.Z"), file)
+    assert not os.path.exists(file)
+
+
+def test_missing_file_falls_back_to_next_mirror(server, downloader, tmp_path):
+    data = make_zip(1000)
+    server.files["/corg0010.15i.zip"] = data
+    file = str(tmp_path / "codg0010.15i.zip")
+    urls = [url(server, "/codg0010.15i.zip"), url(server, "/corg0010.15i.zip")]
+
+    assert downloader.fetch(urls, file)
+    with open(file, "rb") as f:
+        assert f.read() == data
+    # A 404 is not retried
+    assert [path for path, _ in server.requests] == ["/codg0010.15i.zip", "/corg0010.15i.zip"]
+
+
+def test_present_files_are_not_downloaded_again(server, downloader, tmp_path):
+    file = str(tmp_path / "onrj0011.zip")
+    with open(file, "wb") as f:
+        f.write(make_zip(1000))
+
+    assert downloader.fetch(url(server, "/onrj0011.zip"), file)
+    assert server.requests == []
+
+
+def test_download_all_closes_connections(server, downloader, tmp_path):
+    jobs = []
+    for day in range(1, 5):
+        server.files[f"/onrj{day:03}1.zip"] = make_zip(1000)
+        jobs.append(([url(server, f"/onrj{day:03}1.zip")], str(tmp_path / f"onrj{day:03}1.zip")))
+
+    assert all(downloader.download_all(jobs).values())
+    assert downloader._pools == {}
+
+
+def test_ftp_resumes_partial_download(downloader, tmp_path):
+    authorizers = pytest.importorskip("pyftpdlib.authorizers")
+    handlers = pytest.importorskip("pyftpdlib.handlers")
+    servers = pytest.importorskip("pyftpdlib.servers")
+    root = tmp_path / "ftp"
+    root.mkdir()
+    data = b"\x1f\x9d\x90" + os.urandom(100_000)
+    (root / "codg0010.15i.Z").write_bytes(data)
+    authorizer = authorizers.DummyAuthorizer()
+    authorizer.add_anonymous(str(root))
+    handler = type("Handler", (handlers.FTPHandler,), {"authorizer": authorizer})
+    server = servers.FTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"timeout": 0.1}, daemon=True)
+    thread.start()
+    # Only the magic number is checked without gzip, and random bytes are not a valid .Z
+    downloader.validate = lambda file: os.path.getsize(file) == len(data)
+    try:
+        file = str(tmp_path / "codg0010.15i.Z")
+        with open(file + ".part", "wb") as f:
+            f.write(data[:40_000])
+        assert downloader.fetch(f"ftp://127.0.0.1:{server.address[1]}/codg0010.15i.Z", file)
+        with open(file, "rb") as f:
+            assert f.read() == data
+    finally:
+        downloader.close()
+        server.close_all()
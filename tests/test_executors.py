@@ -0,0 +1,146 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from executors import LibraryExecutor, make_executor
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+@pytest.fixture(scope="module")
+def stub_library(tmp_path_factory):
+    if shutil.which("gcc") is None:
+        pytest.skip("gcc is needed to build the stub library")
+    path = str(tmp_path_factory.mktemp("lib") / "librtklib.so")
+    subprocess.run(
+        ["gcc", "-shared", "-fPIC", "-o", path, os.path.join(DATA, "stub_rtklib.c")], check=True
+    )
+    return path
+
+
+@pytest.fixture
+def job_folder(tmp_path):
+    for name in ["rtklib.conf", "onrj0011.15o", "exit.obs", "crash.obs"]:
+        (tmp_path / name).write_text("")
+    return tmp_path
+
+
+def test_library_runs_every_job_in_a_fresh_process(stub_library, job_folder):
+    executor = LibraryExecutor(stub_library)
+    for name in ["a.pos", "b.pos"]:
+        result = executor.run(["-k", "rtklib.conf", "-o", name, "onrj0011.15o"], cwd=job_folder)
+        assert result.returncode == 0
+        # Paths are relative to cwd, and the globals of RTKLIB start over every time
+        assert (job_folder / name).read_text() == "runs=1\n"
+
+
+@pytest.mark.parametrize("obs, returncode", [("exit.obs", 3), ("crash.obs", -6)])
+def test_library_exit_or_crash_fails_one_job(stub_library, job_folder, obs, returncode):
+    executor = make_executor(
+        {"ppp_executable": "./rnx2rtkp", "executor": {"backend": "library", "library": stub_library}}
+    )
+    failed = executor.run(["-k", "rtklib.conf", "-o", "a.pos", obs], cwd=job_folder)
+    assert failed.returncode == returncode
+    assert executor.run(["-k", "rtklib.conf", "-o", "b.pos", "onrj0011.15o"], cwd=job_folder).returncode == 0
+    executor.close()
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["-k", "missing.conf", "-o", "a.pos", "onrj0011.15o"],
+        ["-k", "rtklib.conf", "-o", "a.pos", "-zz", "onrj0011.15o"],
+        ["-k", "rtklib.conf", "-o", "a.pos", "missing.15o"],
+        ["-k", "rtklib.conf", "onrj0011.15o", "-o"],
+    ],
+)
+def test_library_refuses_args_that_exit(stub_library, job_folder, args):
+    result = LibraryExecutor(stub_library).run(args, cwd=job_folder)
+    assert result.returncode == 1
+    assert "rnx2rtkp" in result.stderr
+    assert not (job_folder / "a.pos").exists()
+
+
+def test_library_concurrent_jobs(stub_library, job_folder):
+    executor = LibraryExecutor(stub_library, concurrency=2)
+    jobs = [["-k", "rtklib.conf", "-o", f"{k}.pos", "onrj0011.15o"] for k in range(4)]
+    jobs.append(["-k", "rtklib.conf", "-o", "x.pos", "crash.obs"])
+    futures = [executor.submit(args, cwd=job_folder) for args in jobs]
+    assert [future.result().returncode for future in futures] == [0, 0, 0, 0, -6]
+    executor.close()
+
+
+FAKE_RNX2RTKP = os.path.join(DATA, "..", "..", "benchmarks", "fake_rnx2rtkp.py")
+FAKE_DOCKER = """#!{python}
+# docker exec [options] <container> <command...>, run here instead of in the container
+import os, sys
+args = [a for a in sys.argv[2:] if not a.startswith("-")][:1]
+command = sys.argv[sys.argv.index(args[0]) + 1 :]
+os.execvp(command[0], command)
+"""
+
+
+@pytest.fixture
+def fake_docker(tmp_path, monkeypatch):
+    folder = tmp_path / "bin"
+    folder.mkdir()
+    docker = folder / "docker"
+    docker.write_text(FAKE_DOCKER.format(python=sys.executable))
+    docker.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{folder}{os.pathsep}{os.environ['PATH']}")
+
+
+def backend_executor(backend, concurrency=1, binary=None):
+    binary = binary or f"{sys.executable} {os.path.abspath(FAKE_RNX2RTKP)}"
+    config = {"ppp_executable": binary, "executor": {"backend": backend, "concurrency": concurrency}}
+    if backend != "local":
+        config["executor"].update(container="rtklib", binary=binary)
+    return make_executor(config)
+
+
+@pytest.mark.parametrize("backend", ["local", "docker_exec", "docker_batch"])
+def test_backends_run_jobs_and_report_failures(backend, fake_docker, tmp_path):
+    executor = backend_executor(backend)
+    assert "synthetic solutions" in executor.run(["--help"]).stdout
+
+    pos = tmp_path / "onrj0011.pos"
+    result = executor.run(["-x", "2", "-o", str(pos), str(tmp_path / "onrj0011.15o")], cwd=tmp_path)
+    assert result.returncode == 0
+    assert pos.stat().st_size > 0
+
+    # No obs file: the job fails and its message comes back (merged in stdout by the batch shell)
+    failed = executor.run(["-o", str(tmp_path / "x.pos")], cwd=tmp_path)
+    assert failed.returncode == 1
+    assert "no obs file" in failed.stdout + failed.stderr
+
+    # The executor keeps working after a failed job
+    assert executor.run(["--help"]).returncode == 0
+    executor.close()
+
+
+def test_batch_shells_run_concurrently_and_close(fake_docker, tmp_path):
+    executor = backend_executor("docker_batch", concurrency=2)
+    futures = [
+        executor.submit(["-o", str(tmp_path / f"onrj00{doy}1.pos"), f"onrj00{doy}1.15o"])
+        for doy in range(11, 15)
+    ]
+    assert [future.result().returncode for future in futures] == [0, 0, 0, 0]
+    shells = [shell for shell in executor._shells.queue if shell is not None]
+    assert 1 <= len(shells) <= 2
+
+    executor.close()
+    assert executor._shells is None
+    assert all(shell.poll() is not None for shell in shells)
+
+
+def test_batch_shell_that_stops_is_replaced(fake_docker):
+    # The job kills the shell running it, so its marker line never comes
+    executor = backend_executor("docker_batch", binary="sh -c 'kill $PPID'")
+    with pytest.raises(RuntimeError):
+        executor.run(["job"])
+    executor.binary = ["echo"]
+    assert executor.run(["done"]).stdout == "done\n"
+    executor.close()
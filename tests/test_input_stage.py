@@ -0,0 +1,53 @@
+import os
+import zipfile
+
+import pytest
+
+from input_stage import SharedInputStage
+
+
+@pytest.fixture
+def archives(tmp_path):
+    paths = []
+    for doy in (1, 2):
+        folder = tmp_path / "data" / "onrj" / "2015"
+        folder.mkdir(parents=True, exist_ok=True)
+        path = str(folder / f"onrj{doy:03}1.zip")
+        with zipfile.ZipFile(path, "w") as z:
+            z.writestr(f"onrj{doy:03}1.15o", "x" * 1000)
+            z.writestr(f"onrj{doy:03}1.15n", "x" * 1000)
+        paths.append(path)
+    return paths
+
+
+def stages(tmp_path):
+    # Two experiments running at the same time: B is another (live) process
+    folder = str(tmp_path / "unpacked")
+    a = SharedInputStage(folder, max_bytes=1)
+    b = SharedInputStage(folder, max_bytes=1)
+    b._owner = os.getppid()
+    return a, b
+
+
+def test_prefetch_hold_survives_other_experiments(tmp_path, archives):
+    a, b = stages(tmp_path)
+    b.warm(archives[0])
+    day_folder = b.day_folder(archives[0])
+
+    a.acquire(archives[0], "exp_a")
+    a.release(archives[0], "exp_a")
+    a.acquire(archives[1], "exp_a")  # unpacks another day and evicts
+    a.release(archives[1], "exp_a")
+    a.evict()
+    assert os.path.exists(day_folder)
+
+    b.release_prefetched()
+    a.evict()
+    assert not os.path.exists(day_folder)
+
+
+def test_acquire_takes_over_own_prefetch(tmp_path, archives):
+    a, _ = stages(tmp_path)
+    a.warm(archives[0])
+    day_folder = a.acquire(archives[0], "exp_a")
+    assert a._read_manifest(day_folder)["active"] == [f"exp_a:{os.getpid()}"]
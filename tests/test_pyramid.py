@@ -0,0 +1,35 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyramid import build_pyramid
+from result_schema import write_results
+from results_loader import load_results, load_resampled, clear_cache
+
+
+@pytest.fixture
+def results_file(tmp_path):
+    index = pd.date_range("2015-01-01", "2015-01-03 23:59:30", freq="30s", name="datetime")
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        rng.normal(size=(len(index), 3)), index=index, columns=["X(m)", "Y(m)", "Z(m)"]
+    )
+    path = str(tmp_path / "onrj.parquet")
+    write_results(df, path)
+    build_pyramid(pd.read_parquet(path), path)
+    clear_cache()
+    return path
+
+
+@pytest.mark.parametrize("frequency", ["2h", "1D", "4h"])
+def test_date_end_keeps_the_whole_day(results_file, frequency):
+    start, end = date(2015, 1, 1), date(2015, 1, 2)
+    columns = ["X(m)", "Y(m)"]
+    from_pyramid = load_resampled(results_file, columns, frequency, start, end)
+    raw = load_results(results_file, columns, start, end).resample(frequency).mean()
+
+    assert from_pyramid.index.equals(raw.index)
+    assert raw.index[-1] == pd.Timestamp("2015-01-02") + pd.Timedelta(1, "D") - pd.Timedelta(frequency)
+    np.testing.assert_allclose(from_pyramid.to_numpy(), raw.to_numpy(), rtol=1e-5, atol=1e-6)
@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from result_schema import RESULT_COLUMNS, RESULT_SCHEMA, read_results
+from result_store import PartitionedResultStore
+
+
+def day_frame(day, ns):
+    index = pd.date_range(day, periods=len(ns), freq="30s", name="datetime")
+    df = pd.DataFrame(
+        np.arange(6 * len(ns), dtype=np.float64).reshape(len(ns), 6),
+        index=index,
+        columns=RESULT_COLUMNS[1:7],
+    )
+    df["Q"] = 6
+    df["ns"] = ns
+    return df
+
+
+def test_compacted_file_has_one_dtype_per_column(tmp_path):
+    days = pd.date_range("2015-01-01", periods=3)
+    store = PartitionedResultStore(str(tmp_path / "results"), "onrj")
+    store.commit(days[0], day_frame(days[0], np.array([7, 8, 9], dtype=np.int64)))
+    store.commit(days[1], day_frame(days[1], pd.array([7, None, 9], dtype="Int8")))
+    # A part written before the fix, whose pandas metadata was one column off
+    old = day_frame(days[2], np.array([7, 8, 9], dtype=np.int8))
+    old = old.astype({"Q": "Int8"} | {column: "float32" for column in RESULT_COLUMNS[1:7]})
+    schema = pa.schema([RESULT_SCHEMA.field(column) for column in RESULT_COLUMNS])
+    part = os.path.join(store.partition(days[2]), store.PART)
+    os.makedirs(os.path.dirname(part))
+    pq.write_table(pa.Table.from_pandas(old, schema=schema, preserve_index=True), part)
+
+    save_as = str(tmp_path / "onrj.parquet")
+    assert store.compact(days, save_as) == 9
+    df = pd.read_parquet(save_as)
+    assert df.index.name == "datetime"
+    assert (df.dtypes[["Q", "ns"]] == "Int8").all()
+    assert (df.dtypes[RESULT_COLUMNS[1:7]] == np.float32).all()
+    assert df["ns"].isna().sum() == 1
+    pd.testing.assert_frame_equal(df, read_results(save_as, RESULT_COLUMNS[1:]))
@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+import pytest
+
+from rinex import filter_obs, iter_obs, read_obs, read_obs_header
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def epochs(path, systems=None):
+    with open(path, "r") as f:
+        header = read_obs_header(f)
+        return list(iter_obs(f, header, systems))
+
+
+@pytest.mark.parametrize("name", ["flag6.15o", "flag6.rnx"])
+def test_cycle_slip_and_event_epochs(name):
+    read = epochs(os.path.join(DATA, name))
+    assert [epoch.flag for epoch in read] == [0, 6, 4, 0]
+    # Cycle slips are read as observations, the event as a header record
+    assert read[1].sats[0] == "G01"
+    assert read[1].fields[0][0] == "      1100.0001 "
+    assert read[2].special_lines[0].startswith("marker moved")
+    assert read[3].sats == ["G01", "G03"]
+
+
+@pytest.mark.parametrize("name", ["flag6.15o", "flag6.rnx"])
+def test_read_obs_skips_cycle_slips(name):
+    obs = read_obs(os.path.join(DATA, name), ["C1", "L1"])
+    np.testing.assert_array_equal(obs["time"] - obs["time"][0], [0.0, 30.0, 30.0])
+    np.testing.assert_array_equal(obs["prn"], [1, 1, 3])
+    np.testing.assert_array_equal(obs["C1"], [1000.0, 1200.0, 3200.0])
+    np.testing.assert_array_equal(obs["L1"], [1001.0, 1201.0, 3201.0])
+
+
+@pytest.mark.parametrize("name", ["flag6.15o", "flag6.rnx"])
+def test_filter_obs_keeps_cycle_slips(name, tmp_path):
+    out_file = str(tmp_path / name)
+    assert filter_obs(os.path.join(DATA, name), out_file, "G", ["C1", "L1"]) == 4
+    written = epochs(out_file)
+    assert [epoch.flag for epoch in written] == [0, 6, 4, 0]
+    assert [epoch.sats for epoch in written] == [["G01"], ["G01"], [], ["G01", "G03"]]
+    assert written[1].fields[0] == ["      1100.0001 ", "      1101.0001 "]